@@ -25,6 +25,42 @@ from db.models import Base
 
 target_metadata = [Base.metadata]
 
+# tables only accessed by the gateway with plain sql, they have no model in db.models
+# without this autogenerate would emit drops for them
+GATEWAY_TABLES = {
+    "job_queue",
+    "payload_run_state",
+    "payload_record_state",
+    "source_record_state",
+    "record_content_version",
+    "payload_result_cache",
+    "knowledge_base_version",
+    "search_data_change",
+    "search_data_version",
+    "search_index",
+    "record_label_summary",
+    "record_label_summary_pending",
+    "record_label_summary_refresh",
+    "data_slice_materialization",
+    "user_session_window",
+}
+# indexes created at runtime for the search, see service/search/search_index.py
+GATEWAY_INDEX_PREFIX = "search_"
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == "table" and name in GATEWAY_TABLES:
+        return False
+    if (
+        type_ == "index"
+        and reflected
+        and compare_to is None
+        and name.startswith(GATEWAY_INDEX_PREFIX)
+    ):
+        return False
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -47,6 +83,7 @@ def run_migrations_offline():
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -69,7 +106,11 @@ def run_migrations_online():
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
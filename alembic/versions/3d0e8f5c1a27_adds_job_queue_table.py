@@ -0,0 +1,55 @@
+"""Adds job queue table
+
+Revision ID: 3d0e8f5c1a27
+Revises: 05b2a9bb6c3e
+Create Date: 2022-10-27 10:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "3d0e8f5c1a27"
+down_revision = "05b2a9bb6c3e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "job_queue",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("job_class", sa.String(), nullable=False),
+        sa.Column("function", sa.String(), nullable=False),
+        sa.Column("args", sa.JSON(), nullable=True),
+        sa.Column("priority", sa.Integer(), nullable=False),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("locked_by", sa.String(), nullable=True),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("on_failure", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_job_queue_claim",
+        "job_queue",
+        ["job_class", "state", "priority", "available_at"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_job_queue_locked_by"), "job_queue", ["locked_by"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_job_queue_locked_by"), table_name="job_queue")
+    op.drop_index("ix_job_queue_claim", table_name="job_queue")
+    op.drop_table("job_queue")
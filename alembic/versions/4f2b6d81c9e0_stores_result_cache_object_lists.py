@@ -0,0 +1,46 @@
+"""Stores result cache object lists
+
+Revision ID: 4f2b6d81c9e0
+Revises: e5a09c3b7d18
+Create Date: 2022-11-07 11:26:52.640381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "4f2b6d81c9e0"
+down_revision = "e5a09c3b7d18"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # sharded runs have one result object per shard
+    op.add_column(
+        "payload_result_cache", sa.Column("object_names", sa.JSON(), nullable=True)
+    )
+    op.execute(
+        "UPDATE payload_result_cache SET object_names = json_build_array(object_name)"
+    )
+    op.drop_column("payload_result_cache", "payload_id")
+    op.drop_column("payload_result_cache", "object_name")
+
+
+def downgrade():
+    op.add_column(
+        "payload_result_cache",
+        sa.Column("object_name", sa.String(), nullable=True),
+    )
+    op.add_column(
+        "payload_result_cache",
+        sa.Column("payload_id", postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    # entries of sharded runs can't be represented by a single object
+    op.execute(
+        "DELETE FROM payload_result_cache WHERE json_array_length(object_names) != 1"
+    )
+    op.execute("UPDATE payload_result_cache SET object_name = object_names->>0")
+    op.drop_column("payload_result_cache", "object_names")
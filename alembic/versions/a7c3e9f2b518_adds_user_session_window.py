@@ -0,0 +1,38 @@
+"""Adds user session window
+
+Revision ID: a7c3e9f2b518
+Revises: f3a5c8d1e940
+Create Date: 2022-11-24 10:12:36.514027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "a7c3e9f2b518"
+down_revision = "f3a5c8d1e940"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "user_session_window",
+        sa.Column("session_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("window_index", sa.Integer(), nullable=False),
+        sa.Column("cursor", sa.String(), nullable=True),
+        sa.Column("record_ids", sa.JSON(), nullable=True),
+        sa.Column("next_cursor", sa.String(), nullable=True),
+        sa.Column("has_next", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["session_id"], ["user_sessions.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("session_id", "window_index"),
+    )
+
+
+def downgrade():
+    op.drop_table("user_session_window")
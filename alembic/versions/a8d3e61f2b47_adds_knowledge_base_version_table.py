@@ -0,0 +1,34 @@
+"""Adds knowledge base version table
+
+Revision ID: a8d3e61f2b47
+Revises: 4f2b6d81c9e0
+Create Date: 2022-11-09 10:12:41.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "a8d3e61f2b47"
+down_revision = "4f2b6d81c9e0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "knowledge_base_version",
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("uploaded_version", sa.Integer(), nullable=True),
+        sa.Column("previous_uploaded_version", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("project_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("knowledge_base_version")
@@ -0,0 +1,213 @@
+"""Adds payload run state tables
+
+Revision ID: b7c41e2d9a3f
+Revises: 3d0e8f5c1a27
+Create Date: 2022-10-31 09:41:07.302118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "b7c41e2d9a3f"
+down_revision = "3d0e8f5c1a27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "payload_run_state",
+        sa.Column("payload_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("source_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("source_code_hash", sa.String(), nullable=True),
+        sa.Column("knowledge_base_hash", sa.String(), nullable=True),
+        sa.Column("labels_hash", sa.String(), nullable=True),
+        sa.Column("tokenizer", sa.String(), nullable=True),
+        sa.Column("record_count", sa.Integer(), nullable=True),
+        sa.Column("delta_count", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["payload_id"], ["information_source_payload.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["source_id"], ["information_source.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("payload_id"),
+    )
+    op.create_index(
+        op.f("ix_payload_run_state_project_id"),
+        "payload_run_state",
+        ["project_id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_payload_run_state_source_id"),
+        "payload_run_state",
+        ["source_id"],
+        unique=False,
+    )
+    op.create_table(
+        "payload_record_state",
+        sa.Column("payload_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("record_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("record_hash", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["payload_id"], ["payload_run_state.payload_id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["record_id"], ["record.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("payload_id", "record_id"),
+    )
+    op.create_index(
+        op.f("ix_payload_record_state_record_id"),
+        "payload_record_state",
+        ["record_id"],
+        unique=False,
+    )
+    op.create_table(
+        "source_record_state",
+        sa.Column("source_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("record_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("record_hash", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["source_id"], ["information_source.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["record_id"], ["record.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("source_id", "record_id"),
+    )
+    op.create_index(
+        op.f("ix_source_record_state_record_id"),
+        "source_record_state",
+        ["record_id"],
+        unique=False,
+    )
+    # content hashes of record data and docbin, kept up to date on write so a run
+    # only compares them instead of hashing all records of the project
+    op.create_table(
+        "record_content_version",
+        sa.Column("record_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("data_hash", sa.String(), nullable=True),
+        sa.Column("docbin_hash", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["record_id"], ["record.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("record_id"),
+    )
+    op.create_index(
+        op.f("ix_record_content_version_project_id"),
+        "record_content_version",
+        ["project_id"],
+        unique=False,
+    )
+    op.execute(
+        """
+        CREATE FUNCTION update_record_content_version_by_record() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO record_content_version (record_id, project_id, data_hash)
+            SELECT n.id, n.project_id, md5(n.data::TEXT)
+            FROM changed_new n
+            ON CONFLICT (record_id) DO UPDATE
+            SET data_hash = EXCLUDED.data_hash
+            WHERE record_content_version.data_hash IS DISTINCT FROM EXCLUDED.data_hash;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # retokenization deletes the docbins first, records without one aren't run
+    op.execute(
+        """
+        CREATE FUNCTION update_record_content_version_by_docbin() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                UPDATE record_content_version v
+                SET docbin_hash = NULL
+                FROM changed_old o
+                WHERE v.record_id = o.record_id;
+            ELSE
+                INSERT INTO record_content_version (record_id, project_id, docbin_hash)
+                SELECT n.record_id, n.project_id, md5(n.bytes)
+                FROM changed_new n
+                ON CONFLICT (record_id) DO UPDATE
+                SET docbin_hash = EXCLUDED.docbin_hash
+                WHERE record_content_version.docbin_hash IS DISTINCT FROM EXCLUDED.docbin_hash;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # transition tables are only allowed for triggers with a single event
+    for table, function in [
+        ("record", "update_record_content_version_by_record"),
+        ("record_tokenized", "update_record_content_version_by_docbin"),
+    ]:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_content_version_insert
+            AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS changed_new
+            FOR EACH STATEMENT EXECUTE PROCEDURE {function}()
+            """
+        )
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_content_version_update
+            AFTER UPDATE ON {table}
+            REFERENCING NEW TABLE AS changed_new
+            FOR EACH STATEMENT EXECUTE PROCEDURE {function}()
+            """
+        )
+    op.execute(
+        """
+        CREATE TRIGGER record_tokenized_content_version_delete
+        AFTER DELETE ON record_tokenized
+        REFERENCING OLD TABLE AS changed_old
+        FOR EACH STATEMENT EXECUTE PROCEDURE update_record_content_version_by_docbin()
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO record_content_version (record_id, project_id, data_hash, docbin_hash)
+        SELECT r.id, r.project_id, md5(r.data::TEXT), md5(rt.bytes)
+        FROM record r
+        LEFT JOIN record_tokenized rt
+            ON rt.project_id = r.project_id AND rt.record_id = r.id
+        ON CONFLICT (record_id) DO NOTHING
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        "DROP TRIGGER record_tokenized_content_version_delete ON record_tokenized"
+    )
+    for table in ["record", "record_tokenized"]:
+        for event in ["insert", "update"]:
+            op.execute(f"DROP TRIGGER {table}_content_version_{event} ON {table}")
+    op.execute("DROP FUNCTION update_record_content_version_by_docbin()")
+    op.execute("DROP FUNCTION update_record_content_version_by_record()")
+    op.drop_index(
+        op.f("ix_record_content_version_project_id"),
+        table_name="record_content_version",
+    )
+    op.drop_table("record_content_version")
+    op.drop_index(
+        op.f("ix_source_record_state_record_id"), table_name="source_record_state"
+    )
+    op.drop_table("source_record_state")
+    op.drop_index(
+        op.f("ix_payload_record_state_record_id"), table_name="payload_record_state"
+    )
+    op.drop_table("payload_record_state")
+    op.drop_index(
+        op.f("ix_payload_run_state_source_id"), table_name="payload_run_state"
+    )
+    op.drop_index(
+        op.f("ix_payload_run_state_project_id"), table_name="payload_run_state"
+    )
+    op.drop_table("payload_run_state")
@@ -0,0 +1,100 @@
+"""Adds search data version
+
+Revision ID: c91e4d7a3b58
+Revises: a8d3e61f2b47
+Create Date: 2022-11-14 09:41:27.118904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "c91e4d7a3b58"
+down_revision = "a8d3e61f2b47"
+branch_labels = None
+depends_on = None
+
+TABLES = ["record", "record_label_association", "attribute"]
+
+
+def upgrade():
+    # changes are appended, nextval doesn't lock and isn't rolled back, so concurrent
+    # writers of a project don't wait on each other
+    op.execute("CREATE SEQUENCE search_data_version_seq")
+    op.create_table(
+        "search_data_change",
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("project_id", "version"),
+    )
+    # pending changes are compacted into the version by a scheduled job, so searches read
+    # one row and the change rows don't grow without bound
+    op.create_table(
+        "search_data_version",
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("project_id"),
+    )
+    # triggers also cover the writes of other services, e.g. weak supervision results.
+    # projects deleted in the same statement aren't visible anymore and are skipped
+    op.execute(
+        """
+        CREATE FUNCTION bump_search_data_version() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                INSERT INTO search_data_change (project_id, version, created_at)
+                SELECT p.id, nextval('search_data_version_seq'), now()
+                FROM project p
+                WHERE p.id IN (SELECT c.project_id FROM changed_old c);
+            ELSE
+                INSERT INTO search_data_change (project_id, version, created_at)
+                SELECT p.id, nextval('search_data_version_seq'), now()
+                FROM project p
+                WHERE p.id IN (SELECT c.project_id FROM changed_new c);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # transition tables are only allowed for triggers with a single event
+    for table in TABLES:
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_search_data_version_insert
+            AFTER INSERT ON {table}
+            REFERENCING NEW TABLE AS changed_new
+            FOR EACH STATEMENT EXECUTE PROCEDURE bump_search_data_version()
+            """
+        )
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_search_data_version_update
+            AFTER UPDATE ON {table}
+            REFERENCING NEW TABLE AS changed_new
+            FOR EACH STATEMENT EXECUTE PROCEDURE bump_search_data_version()
+            """
+        )
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_search_data_version_delete
+            AFTER DELETE ON {table}
+            REFERENCING OLD TABLE AS changed_old
+            FOR EACH STATEMENT EXECUTE PROCEDURE bump_search_data_version()
+            """
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        for event in ["insert", "update", "delete"]:
+            op.execute(f"DROP TRIGGER {table}_search_data_version_{event} ON {table}")
+    op.execute("DROP FUNCTION bump_search_data_version()")
+    op.drop_table("search_data_version")
+    op.drop_table("search_data_change")
+    op.execute("DROP SEQUENCE search_data_version_seq")
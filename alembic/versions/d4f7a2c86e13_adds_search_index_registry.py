@@ -0,0 +1,63 @@
+"""Adds search index registry
+
+Revision ID: d4f7a2c86e13
+Revises: c91e4d7a3b58
+Create Date: 2022-11-16 14:05:12.734190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "d4f7a2c86e13"
+down_revision = "c91e4d7a3b58"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # the trigram indexes lead with the project id
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    # one row per project using an index, the indexes are shared by the projects.
+    # no foreign keys, the indexes of deleted projects and attributes still need to be dropped
+    op.create_table(
+        "search_index",
+        sa.Column("index_name", sa.String(), nullable=False),
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("attribute_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("attribute_name", sa.String(), nullable=True),
+        sa.Column("index_type", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("index_name", "project_id"),
+    )
+    op.create_index(
+        op.f("ix_search_index_project_id"),
+        "search_index",
+        ["project_id"],
+        unique=False,
+    )
+    # the indexes of existing projects are built by the job queue, not within the migration
+    op.execute(
+        """
+        INSERT INTO job_queue (id, job_class, function, args, priority, state, attempts, max_attempts, created_at, available_at)
+        SELECT md5(random()::TEXT || p.id::TEXT)::UUID, 'SEARCH_INDEX', 'service.search.search_index:sync_project',
+            json_build_array(p.id::TEXT), 0, 'QUEUED', 0, 3, now(), now()
+        FROM project p
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        "DELETE FROM job_queue WHERE job_class = 'SEARCH_INDEX' AND state = 'QUEUED'"
+    )
+    connection = op.get_bind()
+    for (index_name,) in connection.execute(
+        sa.text("SELECT DISTINCT index_name FROM search_index")
+    ):
+        op.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+    op.drop_index(op.f("ix_search_index_project_id"), table_name="search_index")
+    op.drop_table("search_index")
@@ -0,0 +1,319 @@
+"""Adds record label summary
+
+Revision ID: e2b94c1f7d60
+Revises: d4f7a2c86e13
+Create Date: 2022-11-18 11:22:09.451876
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "e2b94c1f7d60"
+down_revision = "d4f7a2c86e13"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "record_label_summary",
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("record_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("labeling_task_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("ws_min_confidence", sa.Float(), nullable=True),
+        sa.Column("ws_max_confidence", sa.Float(), nullable=True),
+        sa.Column("ws_confidences", postgresql.ARRAY(sa.Float()), nullable=True),
+        sa.Column("mc_min_confidence", sa.Float(), nullable=True),
+        sa.Column("mc_max_confidence", sa.Float(), nullable=True),
+        sa.Column("mc_confidences", postgresql.ARRAY(sa.Float()), nullable=True),
+        sa.Column(
+            "manual_label_ids", postgresql.ARRAY(postgresql.UUID()), nullable=True
+        ),
+        sa.Column("is_label_count", sa.Integer(), nullable=False),
+        sa.Column("is_label_versions", sa.Integer(), nullable=False),
+        sa.Column("is_label_signatures", postgresql.ARRAY(sa.String()), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["record_id"], ["record.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["labeling_task_id"], ["labeling_task.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("record_id", "labeling_task_id"),
+    )
+    op.create_index(
+        op.f("ix_record_label_summary_project_id_labeling_task_id"),
+        "record_label_summary",
+        ["project_id", "labeling_task_id"],
+        unique=False,
+    )
+    # records touched by the open transactions, their summary is refreshed once at commit.
+    # unlogged, the rows only live until the end of their transaction
+    op.create_table(
+        "record_label_summary_pending",
+        sa.Column("txid", sa.BigInteger(), nullable=False),
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("record_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.PrimaryKeyConstraint("txid", "record_id"),
+        prefixes=["UNLOGGED"],
+    )
+    # one row per transaction with pending records, its deferred trigger runs the refresh
+    op.create_table(
+        "record_label_summary_refresh",
+        sa.Column("txid", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("txid"),
+        prefixes=["UNLOGGED"],
+    )
+    # the summary rows of the records are computed again from their label associations.
+    # extractions without tokens have no signature and aren't counted as versions.
+    # refreshes of a project run one after another, so the later one sees the committed
+    # associations of the earlier one
+    op.execute(
+        """
+        CREATE FUNCTION refresh_record_label_summary(refreshed_project_id UUID, record_ids UUID[]) RETURNS void AS $$
+        BEGIN
+            IF record_ids IS NULL OR cardinality(record_ids) = 0 THEN
+                RETURN;
+            END IF;
+            PERFORM pg_advisory_xact_lock(hashtext('record_label_summary'), hashtext(refreshed_project_id::TEXT));
+
+            DELETE FROM record_label_summary s
+            WHERE s.record_id = ANY(record_ids)
+            AND NOT EXISTS (
+                SELECT 1
+                FROM record_label_association rla
+                INNER JOIN labeling_task_label ltl
+                    ON rla.labeling_task_label_id = ltl.id
+                WHERE rla.record_id = s.record_id AND ltl.labeling_task_id = s.labeling_task_id
+            );
+
+            INSERT INTO record_label_summary (
+                project_id, record_id, labeling_task_id,
+                ws_min_confidence, ws_max_confidence, ws_confidences,
+                mc_min_confidence, mc_max_confidence, mc_confidences,
+                manual_label_ids, is_label_count, is_label_versions, is_label_signatures, updated_at
+            )
+            SELECT
+                rla.project_id, rla.record_id, ltl.labeling_task_id,
+                MIN(rla.confidence) FILTER (WHERE rla.source_type = 'WEAK_SUPERVISION'),
+                MAX(rla.confidence) FILTER (WHERE rla.source_type = 'WEAK_SUPERVISION'),
+                array_agg(rla.confidence) FILTER (WHERE rla.source_type = 'WEAK_SUPERVISION' AND rla.confidence IS NOT NULL),
+                MIN(rla.confidence) FILTER (WHERE rla.source_type = 'MODEL_CALLBACK'),
+                MAX(rla.confidence) FILTER (WHERE rla.source_type = 'MODEL_CALLBACK'),
+                array_agg(rla.confidence) FILTER (WHERE rla.source_type = 'MODEL_CALLBACK' AND rla.confidence IS NOT NULL),
+                array_agg(DISTINCT rla.labeling_task_label_id) FILTER (WHERE rla.source_type = 'MANUAL'),
+                COUNT(signature.label) FILTER (WHERE rla.source_type = 'INFORMATION_SOURCE' AND rla.return_type IN ('RETURN', 'YIELD')),
+                COUNT(DISTINCT signature.label) FILTER (WHERE rla.source_type = 'INFORMATION_SOURCE' AND rla.return_type IN ('RETURN', 'YIELD')),
+                array_agg(DISTINCT signature.label) FILTER (WHERE rla.source_type = 'INFORMATION_SOURCE' AND rla.return_type = 'YIELD'),
+                now()
+            FROM record_label_association rla
+            INNER JOIN labeling_task_label ltl
+                ON rla.labeling_task_label_id = ltl.id
+            LEFT JOIN (
+                SELECT rlat.record_label_association_id, array_agg(rlat.token_index ORDER BY rlat.token_index)::TEXT tokens
+                FROM record_label_association_token rlat
+                INNER JOIN record_label_association token_rla
+                    ON rlat.record_label_association_id = token_rla.id
+                WHERE token_rla.record_id = ANY(record_ids)
+                GROUP BY rlat.record_label_association_id
+            ) rlat
+                ON rla.id = rlat.record_label_association_id
+            CROSS JOIN LATERAL (
+                SELECT CASE
+                    WHEN rla.return_type = 'YIELD' THEN rla.labeling_task_label_id || '-' || rlat.tokens
+                    ELSE rla.labeling_task_label_id::TEXT
+                END label
+            ) signature
+            WHERE rla.record_id = ANY(record_ids)
+            GROUP BY rla.project_id, rla.record_id, ltl.labeling_task_id
+            ON CONFLICT (record_id, labeling_task_id) DO UPDATE
+            SET ws_min_confidence = EXCLUDED.ws_min_confidence,
+                ws_max_confidence = EXCLUDED.ws_max_confidence,
+                ws_confidences = EXCLUDED.ws_confidences,
+                mc_min_confidence = EXCLUDED.mc_min_confidence,
+                mc_max_confidence = EXCLUDED.mc_max_confidence,
+                mc_confidences = EXCLUDED.mc_confidences,
+                manual_label_ids = EXCLUDED.manual_label_ids,
+                is_label_count = EXCLUDED.is_label_count,
+                is_label_versions = EXCLUDED.is_label_versions,
+                is_label_signatures = EXCLUDED.is_label_signatures,
+                updated_at = EXCLUDED.updated_at;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # runs once per transaction at commit, projects are locked in order
+    op.execute(
+        """
+        CREATE FUNCTION flush_record_label_summary() RETURNS trigger AS $$
+        DECLARE
+            pending_project_id UUID;
+        BEGIN
+            FOR pending_project_id IN
+                SELECT DISTINCT project_id FROM record_label_summary_pending WHERE txid = NEW.txid ORDER BY project_id
+            LOOP
+                PERFORM refresh_record_label_summary(pending_project_id, ARRAY(
+                    SELECT record_id FROM record_label_summary_pending
+                    WHERE txid = NEW.txid AND project_id = pending_project_id
+                ));
+            END LOOP;
+            DELETE FROM record_label_summary_pending WHERE txid = NEW.txid;
+            DELETE FROM record_label_summary_refresh WHERE txid = NEW.txid;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE CONSTRAINT TRIGGER record_label_summary_refresh_flush
+        AFTER INSERT ON record_label_summary_refresh
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW EXECUTE PROCEDURE flush_record_label_summary()
+        """
+    )
+    # statements only collect the touched records, the first one of a transaction
+    # registers the refresh
+    op.execute(
+        """
+        CREATE FUNCTION stage_record_label_summary_by_association() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO record_label_summary_pending (txid, project_id, record_id)
+                SELECT DISTINCT txid_current(), project_id, record_id FROM changed_new
+                ON CONFLICT (txid, record_id) DO NOTHING;
+            ELSIF TG_OP = 'UPDATE' THEN
+                INSERT INTO record_label_summary_pending (txid, project_id, record_id)
+                SELECT txid_current(), c.project_id, c.record_id
+                FROM (
+                    SELECT project_id, record_id FROM changed_old
+                    UNION SELECT project_id, record_id FROM changed_new
+                ) c
+                ON CONFLICT (txid, record_id) DO NOTHING;
+            ELSE
+                INSERT INTO record_label_summary_pending (txid, project_id, record_id)
+                SELECT DISTINCT txid_current(), project_id, record_id FROM changed_old
+                ON CONFLICT (txid, record_id) DO NOTHING;
+            END IF;
+            INSERT INTO record_label_summary_refresh (txid)
+            VALUES (txid_current())
+            ON CONFLICT (txid) DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # tokens of extractions are written after their association, the signature changes with them
+    op.execute(
+        """
+        CREATE FUNCTION stage_record_label_summary_by_token() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO record_label_summary_pending (txid, project_id, record_id)
+                SELECT DISTINCT txid_current(), rla.project_id, rla.record_id
+                FROM changed_new t
+                INNER JOIN record_label_association rla
+                    ON t.record_label_association_id = rla.id
+                ON CONFLICT (txid, record_id) DO NOTHING;
+            ELSE
+                INSERT INTO record_label_summary_pending (txid, project_id, record_id)
+                SELECT DISTINCT txid_current(), rla.project_id, rla.record_id
+                FROM changed_old t
+                INNER JOIN record_label_association rla
+                    ON t.record_label_association_id = rla.id
+                ON CONFLICT (txid, record_id) DO NOTHING;
+            END IF;
+            INSERT INTO record_label_summary_refresh (txid)
+            VALUES (txid_current())
+            ON CONFLICT (txid) DO NOTHING;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER record_label_association_summary_insert
+        AFTER INSERT ON record_label_association
+        REFERENCING NEW TABLE AS changed_new
+        FOR EACH STATEMENT EXECUTE PROCEDURE stage_record_label_summary_by_association()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER record_label_association_summary_update
+        AFTER UPDATE ON record_label_association
+        REFERENCING OLD TABLE AS changed_old NEW TABLE AS changed_new
+        FOR EACH STATEMENT EXECUTE PROCEDURE stage_record_label_summary_by_association()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER record_label_association_summary_delete
+        AFTER DELETE ON record_label_association
+        REFERENCING OLD TABLE AS changed_old
+        FOR EACH STATEMENT EXECUTE PROCEDURE stage_record_label_summary_by_association()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER record_label_association_token_summary_insert
+        AFTER INSERT ON record_label_association_token
+        REFERENCING NEW TABLE AS changed_new
+        FOR EACH STATEMENT EXECUTE PROCEDURE stage_record_label_summary_by_token()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER record_label_association_token_summary_delete
+        AFTER DELETE ON record_label_association_token
+        REFERENCING OLD TABLE AS changed_old
+        FOR EACH STATEMENT EXECUTE PROCEDURE stage_record_label_summary_by_token()
+        """
+    )
+    # existing projects are summarized by the job queue, not within the migration
+    op.execute(
+        """
+        INSERT INTO job_queue (id, job_class, function, args, priority, state, attempts, max_attempts, created_at, available_at)
+        SELECT md5(random()::TEXT || p.id::TEXT)::UUID, 'SEARCH_INDEX', 'service.search.search_summary:refresh_project',
+            json_build_array(p.id::TEXT), 0, 'QUEUED', 0, 3, now(), now()
+        FROM project p
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        "DELETE FROM job_queue WHERE function = 'service.search.search_summary:refresh_project' AND state = 'QUEUED'"
+    )
+    op.execute(
+        "DROP TRIGGER record_label_association_token_summary_delete ON record_label_association_token"
+    )
+    op.execute(
+        "DROP TRIGGER record_label_association_token_summary_insert ON record_label_association_token"
+    )
+    op.execute(
+        "DROP TRIGGER record_label_association_summary_delete ON record_label_association"
+    )
+    op.execute(
+        "DROP TRIGGER record_label_association_summary_update ON record_label_association"
+    )
+    op.execute(
+        "DROP TRIGGER record_label_association_summary_insert ON record_label_association"
+    )
+    op.execute("DROP FUNCTION stage_record_label_summary_by_token()")
+    op.execute("DROP FUNCTION stage_record_label_summary_by_association()")
+    op.execute(
+        "DROP TRIGGER record_label_summary_refresh_flush ON record_label_summary_refresh"
+    )
+    op.execute("DROP FUNCTION flush_record_label_summary()")
+    op.execute("DROP FUNCTION refresh_record_label_summary(UUID, UUID[])")
+    op.drop_index(
+        op.f("ix_record_label_summary_project_id_labeling_task_id"),
+        table_name="record_label_summary",
+    )
+    op.drop_table("record_label_summary")
+    op.drop_table("record_label_summary_refresh")
+    op.drop_table("record_label_summary_pending")
@@ -0,0 +1,46 @@
+"""Adds payload result cache table
+
+Revision ID: e5a09c3b7d18
+Revises: b7c41e2d9a3f
+Create Date: 2022-11-02 14:05:33.871920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "e5a09c3b7d18"
+down_revision = "b7c41e2d9a3f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "payload_result_cache",
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("cache_key", sa.String(), nullable=False),
+        sa.Column("object_name", sa.String(), nullable=True),
+        sa.Column("payload_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("hits", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("last_used_at", sa.DateTime(), nullable=True),
+        sa.Column("read_by_payload_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["read_by_payload_id"],
+            ["information_source_payload.id"],
+            ondelete="SET NULL",
+        ),
+        sa.PrimaryKeyConstraint("project_id", "cache_key"),
+    )
+    op.add_column(
+        "payload_run_state", sa.Column("docbin_version", sa.String(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("payload_run_state", "docbin_version")
+    op.drop_table("payload_result_cache")
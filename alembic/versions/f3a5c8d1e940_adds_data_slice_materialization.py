@@ -0,0 +1,105 @@
+"""Adds data slice materialization
+
+Revision ID: f3a5c8d1e940
+Revises: e2b94c1f7d60
+Create Date: 2022-11-21 15:37:44.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "f3a5c8d1e940"
+down_revision = "e2b94c1f7d60"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "data_slice_materialization",
+        sa.Column("data_slice_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("project_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("run_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("state", sa.String(), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=True),
+        sa.Column("materialized", sa.Integer(), nullable=False),
+        sa.Column("error", sa.String(), nullable=True),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["data_slice_id"], ["data_slice.id"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["project_id"], ["project.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("data_slice_id"),
+    )
+    # the count of static slices follows their associations, also for records deleted later on
+    op.execute(
+        """
+        CREATE FUNCTION maintain_data_slice_count() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE data_slice ds
+                SET count = COALESCE(ds.count, 0) + c.amount
+                FROM (
+                    SELECT data_slice_id, COUNT(*) amount
+                    FROM changed_new
+                    GROUP BY data_slice_id
+                ) c
+                WHERE ds.id = c.data_slice_id;
+            ELSE
+                UPDATE data_slice ds
+                SET count = GREATEST(COALESCE(ds.count, 0) - c.amount, 0)
+                FROM (
+                    SELECT data_slice_id, COUNT(*) amount
+                    FROM changed_old
+                    GROUP BY data_slice_id
+                ) c
+                WHERE ds.id = c.data_slice_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER data_slice_record_association_count_insert
+        AFTER INSERT ON data_slice_record_association
+        REFERENCING NEW TABLE AS changed_new
+        FOR EACH STATEMENT EXECUTE PROCEDURE maintain_data_slice_count()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER data_slice_record_association_count_delete
+        AFTER DELETE ON data_slice_record_association
+        REFERENCING OLD TABLE AS changed_old
+        FOR EACH STATEMENT EXECUTE PROCEDURE maintain_data_slice_count()
+        """
+    )
+    op.execute(
+        """
+        UPDATE data_slice ds
+        SET count = (
+            SELECT COUNT(*)
+            FROM data_slice_record_association dsra
+            WHERE dsra.data_slice_id = ds.id
+        )
+        WHERE ds.static
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        "DROP TRIGGER data_slice_record_association_count_delete ON data_slice_record_association"
+    )
+    op.execute(
+        "DROP TRIGGER data_slice_record_association_count_insert ON data_slice_record_association"
+    )
+    op.execute("DROP FUNCTION maintain_data_slice_count()")
+    op.drop_table("data_slice_materialization")
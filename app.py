@@ -17,6 +17,8 @@ from starlette.middleware import Middleware
 from starlette.routing import Route
 
 from graphql_api import schema
+from service.job_queue import worker as job_worker
+from util import exec_env_pool, user_activity
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -44,7 +46,12 @@ routes = [
 
 middleware = [Middleware(DatabaseSessionHandler)]
 
-app = Starlette(routes=routes, middleware=middleware)
+app = Starlette(
+    routes=routes,
+    middleware=middleware,
+    on_startup=[exec_env_pool.start, job_worker.start, user_activity.flush],
+    on_shutdown=[user_activity.flush, job_worker.stop, exec_env_pool.shutdown],
+)
 
 if __name__ == "__main__":
     import uvicorn
@@ -4,6 +4,9 @@ from controller.tokenization.tokenization_service import request_tokenize_projec
 from db.business_objects import attribute, record, tokenization
 from db.models import Attribute
 from db.enums import AttributeState, DataTypes
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass, JobPriority
+from service.search import search_index
 from util import daemon, notification
 
 from . import util
@@ -101,6 +104,7 @@ def update_attribute(
     notification.send_organization_update(
         project_id=project_id, message=f"calculate_attribute:updated:{str(attribute_item.id)}"
     )
+    update_search_indexes(project_id)
 
 
 def delete_attribute(project_id: str, attribute_id: str) -> None:
@@ -116,6 +120,7 @@ def delete_attribute(project_id: str, attribute_id: str) -> None:
             project_id=project_id, message=f"calculate_attribute:deleted:{attribute_id}"
         )
         if is_usable:
+            update_search_indexes(project_id)
             notification.send_organization_update(
                 project_id=project_id, message="attributes_updated"
             )
@@ -123,6 +128,26 @@ def delete_attribute(project_id: str, attribute_id: str) -> None:
         raise ValueError("Attribute is not user created")
 
 
+def update_search_indexes(project_id: str) -> None:
+    # text attributes get trigram indexes for the substring filters, sortable ones order indexes
+    job_queue.enqueue(
+        JobClass.SEARCH_INDEX,
+        search_index.sync_project,
+        project_id,
+        priority=JobPriority.LOW,
+    )
+
+
+def drop_search_indexes(project_id: str) -> None:
+    # the registry has no foreign keys, shared indexes are dropped once no project uses them
+    job_queue.enqueue(
+        JobClass.SEARCH_INDEX,
+        search_index.drop_project,
+        project_id,
+        priority=JobPriority.LOW,
+    )
+
+
 def add_running_id(
     user_id: str, project_id: str, attribute_name: str, for_retokenization: bool = True
 ) -> None:
@@ -133,8 +158,8 @@ def add_running_id(
         project_id, attribute_name, for_retokenization, with_commit=True
     )
     if for_retokenization:
-
-        daemon.run(
+        job_queue.enqueue(
+            JobClass.TOKENIZATION,
             request_tokenize_project,
             project_id,
             user_id,
@@ -199,48 +224,50 @@ def __calculate_user_attribute_all_records(
     project_id: str, user_id: str, attribute_id: str
 ) -> None:
 
+    calculated_count = 0
+    writing = False
     try:
-        calculated_attributes = util.run_attribute_calculation_exec_env(
+        # results are streamed in batches and written as they arrive
+        for calculated_attributes in util.iter_attribute_calculation_exec_env(
             attribute_id=attribute_id, project_id=project_id, doc_bin="docbin_full"
-        )
-        if not calculated_attributes:
-            __notify_attribute_calculation_failed(
+        ):
+            if not calculated_count:
+                util.add_log_to_attribute_logs(
+                    project_id, attribute_id, "Writing results to the database."
+                )
+            writing = True
+            record.update_add_user_created_attribute(
                 project_id=project_id,
                 attribute_id=attribute_id,
-                log="Calculation of attribute failed.",
+                calculated_attributes=calculated_attributes,
+                with_commit=True,
             )
-            return
+            writing = False
+            calculated_count += len(calculated_attributes)
     except Exception:
+        if calculated_count or writing:
+            record.delete_user_created_attribute(
+                project_id=project_id,
+                attribute_id=attribute_id,
+                with_commit=True,
+            )
         __notify_attribute_calculation_failed(
             project_id=project_id,
             attribute_id=attribute_id,
-            log="Attribute calculation failed",
+            log="Writing to the database failed."
+            if writing
+            else "Attribute calculation failed",
         )
         return
 
-    util.add_log_to_attribute_logs(
-        project_id, attribute_id, "Writing results to the database."
-    )
-    # add calculated attributes to database
-    try:
-        record.update_add_user_created_attribute(
-            project_id=project_id,
-            attribute_id=attribute_id,
-            calculated_attributes=calculated_attributes,
-            with_commit=True,
-        )
-    except Exception:
-        record.delete_user_created_attribute(
-            project_id=project_id,
-            attribute_id=attribute_id,
-            with_commit=True,
-        )
+    if not calculated_count:
         __notify_attribute_calculation_failed(
             project_id=project_id,
             attribute_id=attribute_id,
-            log="Writing to the database failed.",
+            log="Calculation of attribute failed.",
         )
         return
+
     util.add_log_to_attribute_logs(project_id, attribute_id, "Finished writing.")
 
     util.add_log_to_attribute_logs(project_id, attribute_id, "Triggering tokenization.")
@@ -258,6 +285,7 @@ def __calculate_user_attribute_all_records(
         state=AttributeState.USABLE.value,
         with_commit=True,
     )
+    update_search_indexes(project_id)
 
     notification.send_organization_update(
         project_id, f"calculate_attribute:finished:{attribute_id}"
@@ -1,14 +1,14 @@
-import docker
-import json
 import os
 import pytz
 import re
 from datetime import datetime
+from typing import Any, Dict, Iterator, List
 from db.business_objects import attribute, record, project, tokenization
 from db.enums import DataTypes
 from s3 import controller as s3
-
-client = docker.from_env()
+from util import exec_env_pool, json_stream
+from util.log_stream import LogStream
+from util.miscellaneous_functions import chunk_items
 
 
 def find_free_name(project_id: str) -> str:
@@ -68,7 +68,16 @@ def prepare_sample_records_doc_bin(attribute_id: str, project_id: str) -> str:
 
 def run_attribute_calculation_exec_env(
     attribute_id: str, project_id: str, doc_bin: str
-) -> None:
+) -> Dict[str, Any]:
+    calculated_attributes = {}
+    for batch in iter_attribute_calculation_exec_env(attribute_id, project_id, doc_bin):
+        calculated_attributes.update(batch)
+    return calculated_attributes
+
+
+def iter_attribute_calculation_exec_env(
+    attribute_id: str, project_id: str, doc_bin: str, batch_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
 
     attribute_item = attribute.get(project_id, attribute_id)
 
@@ -89,36 +98,34 @@ def run_attribute_calculation_exec_env(
         s3.create_file_upload_link(org_id, project_id + "/" + prefixed_payload),
     ]
 
-    container = client.containers.run(
-        image=os.getenv("AC_EXEC_ENV_IMAGE"),
-        command=command,
-        remove=True,
-        detach=True,
-        network=os.getenv("LF_NETWORK"),
-    )
-
-    logs = [
-        line.decode("utf-8").strip("\n")
-        for line in container.logs(
-            stream=True, stdout=True, stderr=True, timestamps=True
+    def persist_logs(logs: List[str]) -> None:
+        attribute.update(
+            project_id=project_id,
+            attribute_id=attribute_id,
+            logs=logs,
+            with_commit=True,
         )
-    ]
 
-    attribute.update(
-        project_id=project_id, attribute_id=attribute_id, logs=logs, with_commit=True
+    log_stream = LogStream(
+        project_id, f"calculate_attribute:logs:{attribute_id}", persist_logs
+    )
+    log_stream.consume(
+        exec_env_pool.run(os.getenv("AC_EXEC_ENV_IMAGE"), command, project_id)
     )
 
     try:
-        payload = s3.get_object(org_id, project_id + "/" + prefixed_payload)
-        calculated_attributes = json.loads(payload)
-    except Exception:
-        print("Could not grab data from s3 -- attribute calculation")
-        calculated_attributes = {}
-
-    if not doc_bin == "docbin_full":
-        # sample records docbin should be deleted after calculation
-        s3.delete_object(org_id, project_id + "/" + doc_bin)
-    s3.delete_object(org_id, project_id + "/" + prefixed_function_name)
-    s3.delete_object(org_id, project_id + "/" + prefixed_payload)
-
-    return calculated_attributes
+        try:
+            calculated_items = json_stream.iter_object_items(
+                org_id, project_id + "/" + prefixed_payload
+            )
+        except Exception:
+            print("Could not grab data from s3 -- attribute calculation")
+            calculated_items = []
+        # results are handed over in batches so the full output is never held in memory
+        yield from chunk_items(calculated_items, batch_size)
+    finally:
+        if not doc_bin == "docbin_full":
+            # sample records docbin should be deleted after calculation
+            s3.delete_object(org_id, project_id + "/" + doc_bin)
+        s3.delete_object(org_id, project_id + "/" + prefixed_function_name)
+        s3.delete_object(org_id, project_id + "/" + prefixed_payload)
@@ -1,14 +1,17 @@
+import os
 from typing import Dict, Any, List, Optional
 
 from db import DataSlice
 from db import enums
-from db.business_objects import general, data_slice, embedding
+from db.business_objects import data_slice, embedding
 import uuid
-from service.search import search
+from service.search import search, search_slice, search_statement
 from controller.data_slice import neural_search_connector
 from db.enums import SliceTypes
 from controller.labeling_access_link import manager as link_manager
 
+OUTLIER_SLICE_LIMIT = int(os.getenv("OUTLIER_SLICE_LIMIT", 1000))
+
 
 def get_all_data_slices(
     project_id: str, slice_type: Optional[str] = None
@@ -28,33 +31,32 @@ def count_items(project_id: str, data_slice_id: str) -> int:
         raise ValueError(f"unkown slice id {data_slice_id}")
     if not data_slice_item.static:
         raise ValueError(f"Slice {data_slice_id} - {data_slice_item.name} isn't static")
-    return general.execute_distinct_count(data_slice_item.count_sql)
+    # maintained by database triggers on the record associations
+    return data_slice_item.count or 0
 
 
-def __create_data_slice_record_associations(
-    project_id: str, data_slice_id: str, filter_data: List[Dict[str, Any]]
-) -> None:
-    count_sql: str = search.generate_count_sql(project_id, filter_data)
-    count: int = general.execute_distinct_count(count_sql)
+def get_materialization_state(
+    project_id: str, data_slice_id: str
+) -> Optional[Dict[str, Any]]:
+    return search_slice.get_state(project_id, data_slice_id)
 
-    if count > 10000:
-        raise Exception("Too many records for static slice.")
 
-    data_slice.delete_associations(project_id, data_slice_id, with_commit=True)
-    insert_statement: str = (
-        search.generate_data_slice_record_associations_insert_statement(
-            project_id, filter_data, data_slice_id
-        )
-    )
-    general.execute(insert_statement)
+def __create_data_slice_record_associations(
+    project_id: str,
+    data_slice_id: str,
+    filter_data: List[Dict[str, Any]],
+    in_background: bool = True,
+) -> None:
+    count_sql, count_params = search.generate_count_sql(project_id, filter_data)
     data_slice.update_data_slice(
         project_id,
         data_slice_id,
         filter_data=filter_data,
-        count=count,
-        count_sql=count_sql,
+        # stored and executed later on, so the values are inlined
+        count_sql=search_statement.render(count_sql, count_params),
         with_commit=True,
     )
+    search_slice.materialize(project_id, data_slice_id, in_background)
 
 
 def create_data_slice(
@@ -66,6 +68,7 @@ def create_data_slice(
     static: bool,
     slice_type: Optional[str] = None,
     info: Optional[Dict[str, Any]] = None,
+    in_background: bool = True,
 ) -> DataSlice:
 
     if slice_type is None:
@@ -86,7 +89,7 @@ def create_data_slice(
     )
     if static:
         __create_data_slice_record_associations(
-            project_id, data_slice_item.id, filter_data
+            project_id, data_slice_item.id, filter_data, in_background
         )
         link_manager.generate_data_slice_access_link(
             project_id, user_id, data_slice_item.id
@@ -123,7 +126,7 @@ def delete_data_slice(project_id: str, data_slice_id: str) -> None:
 
 def create_outlier_slice(project_id: str, user_id: str, embedding_id: str) -> DataSlice:
     outlier_ids, outlier_scores = neural_search_connector.request_outlier_detection(
-        project_id, embedding_id, 100
+        project_id, embedding_id, OUTLIER_SLICE_LIMIT
     )
     filter_data = [
         {
@@ -149,6 +152,8 @@ def create_outlier_slice(project_id: str, user_id: str, embedding_id: str) -> Da
         static=True,
         slice_type=SliceTypes.STATIC_OUTLIER.value,
         info=info,
+        # the outlier scores are written to the associations right away
+        in_background=False,
     )
     data_slice.update_data_slice_record_association_outlier_scores(
         project_id, data_slice_item.id, outlier_ids, outlier_scores, with_commit=True
@@ -2,7 +2,9 @@ import time
 from typing import Any, Dict, List
 
 from db import enums
-from util import daemon
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass
+from util import db_connection
 from . import util
 from . import connector
 
@@ -14,24 +16,28 @@ def get_recommended_encoders() -> List[Any]:
 def create_attribute_level_embedding(
     project_id: str, user_id: str, attribute_id: str, embedding_handle: str
 ) -> None:
-    daemon.run(
+    job_queue.enqueue(
+        JobClass.EMBEDDING,
         connector.request_creating_attribute_level_embedding,
         project_id,
         attribute_id,
-        user_id,
+        str(user_id),
         embedding_handle,
+        on_failure=__fail_attribute_level_embedding,
     )
 
 
 def create_token_level_embedding(
     project_id: str, user_id: str, attribute_id: str, embedding_handle: str
 ) -> None:
-    daemon.run(
+    job_queue.enqueue(
+        JobClass.EMBEDDING,
         connector.request_creating_token_level_embedding,
         project_id,
         attribute_id,
-        user_id,
+        str(user_id),
         embedding_handle,
+        on_failure=__fail_token_level_embedding,
     )
 
 
@@ -41,12 +47,14 @@ def create_embeddings_one_by_one(
     embedding_data: Dict[str, Any],
     attribute_names: Dict[str, str],
 ) -> None:
-    daemon.run(
+    job_queue.enqueue(
+        JobClass.EMBEDDING,
         __embed_one_by_one_helper,
         project_id,
-        user_id,
+        str(user_id),
         embedding_data,
-        attribute_names,
+        {name: str(attribute_id) for name, attribute_id in attribute_names.items()},
+        on_failure=__fail_embeddings_one_by_one,
     )
 
 
@@ -83,3 +91,61 @@ def __embed_one_by_one_helper(
         time.sleep(10)
         while util.has_encoder_running(project_id):
             time.sleep(10)
+
+
+def __fail_attribute_level_embedding(
+    project_id: str, attribute_id: str, user_id: str, config_string: str
+) -> None:
+    __fail_unfinished_embeddings(
+        project_id, attribute_id, enums.EmbeddingType.ON_ATTRIBUTE.value, config_string
+    )
+
+
+def __fail_token_level_embedding(
+    project_id: str, attribute_id: str, user_id: str, config_string: str
+) -> None:
+    __fail_unfinished_embeddings(
+        project_id, attribute_id, enums.EmbeddingType.ON_TOKEN.value, config_string
+    )
+
+
+def __fail_embeddings_one_by_one(
+    project_id: str,
+    user_id: str,
+    embedding_data: List[Dict[str, Any]],
+    attribute_names: Dict[str, str],
+) -> None:
+    for embedding_item in embedding_data:
+        splitted = embedding_item.get("name").split("-", 2)
+        __fail_unfinished_embeddings(
+            project_id,
+            attribute_names[splitted[0]],
+            embedding_item.get("type"),
+            splitted[2],
+        )
+
+
+def __fail_unfinished_embeddings(
+    project_id: str, attribute_id: str, embedding_type: str, config_string: str
+) -> None:
+    # the job failed for good, e.g. since the replica requesting the embedding died
+    # names are built as <attribute name>-<type>-<config string> by the embedder
+    db_connection.execute(
+        """
+        UPDATE embedding
+        SET state = %s
+        WHERE project_id = %s AND attribute_id = %s AND type = %s
+        AND right(name, length(%s) + 1) = '-' || %s
+        AND state NOT IN (%s, %s)
+        """,
+        (
+            enums.EmbeddingState.FAILED.value,
+            project_id,
+            attribute_id,
+            embedding_type,
+            config_string,
+            config_string,
+            enums.EmbeddingState.FINISHED.value,
+            enums.EmbeddingState.FAILED.value,
+        ),
+    )
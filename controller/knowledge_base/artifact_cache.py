@@ -0,0 +1,131 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from s3 import controller as s3
+from util import db_connection
+from . import util
+
+# rendered sources kept in memory, least recently used projects are dropped first
+MAX_CACHED_SOURCES = int(os.getenv("KNOWLEDGE_BASE_CACHE_MAX_PROJECTS", 16))
+
+__sources = OrderedDict()
+__sources_lock = threading.Lock()
+
+
+def bump_version(project_id: str) -> None:
+    """
+    Needs to be called after every committed change of knowledge bases or terms of the project,
+    cached sources and uploaded artifacts of older versions aren't used anymore afterwards.
+    """
+    db_connection.execute(
+        """
+        INSERT INTO knowledge_base_version (project_id, version, updated_at)
+        VALUES (%s, 1, now())
+        ON CONFLICT (project_id) DO UPDATE
+        SET version = knowledge_base_version.version + 1, updated_at = now()
+        """,
+        (project_id,),
+    )
+
+
+def get_version(project_id: str) -> int:
+    rows = db_connection.execute(
+        "SELECT version FROM knowledge_base_version WHERE project_id = %s",
+        (project_id,),
+        fetch=True,
+    )
+    return rows[0][0] if rows else 0
+
+
+def get_source(project_id: str) -> str:
+    return __get_source(project_id, get_version(project_id))
+
+
+def get_artifact(project_id: str, org_id: str) -> Tuple[str, str]:
+    """
+    Returns the rendered source and the s3 object name it is stored under.
+    The object is only uploaded once per version and must not be deleted by the caller.
+    """
+    rows = db_connection.execute(
+        "SELECT version, uploaded_version FROM knowledge_base_version WHERE project_id = %s",
+        (project_id,),
+        fetch=True,
+    )
+    version, uploaded_version = rows[0] if rows else (0, None)
+    source = __get_source(project_id, version)
+    object_name = __object_name(project_id, version)
+    if uploaded_version == version and s3.object_exists(org_id, object_name):
+        return source, object_name
+
+    s3.put_object(org_id, object_name, source)
+    stale_version = __mark_uploaded(project_id, version)
+    if stale_version is not None:
+        s3.delete_object(org_id, __object_name(project_id, stale_version))
+    return source, object_name
+
+
+def __get_source(project_id: str, version: int) -> str:
+    # the version is read before building so a concurrent change can only lead to a rebuild
+    with __sources_lock:
+        cached = __sources.get(project_id)
+        if cached and cached[0] == version:
+            __sources.move_to_end(project_id)
+            return cached[1]
+
+    source = util.build_knowledge_base_from_project(project_id)
+    with __sources_lock:
+        cached = __sources.get(project_id)
+        if not cached or cached[0] <= version:
+            __sources[project_id] = (version, source)
+            __sources.move_to_end(project_id)
+        while len(__sources) > MAX_CACHED_SOURCES:
+            __sources.popitem(last=False)
+    return source
+
+
+def __mark_uploaded(project_id: str, version: int) -> Optional[int]:
+    """
+    Returns the version whose object isn't needed anymore. The previous upload is kept
+    since running executions might still download it.
+    """
+    with db_connection.transaction() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO knowledge_base_version (project_id, version, updated_at)
+            VALUES (%s, 0, now())
+            ON CONFLICT (project_id) DO NOTHING
+            """,
+            (project_id,),
+        )
+        cursor.execute(
+            """
+            SELECT uploaded_version, previous_uploaded_version
+            FROM knowledge_base_version
+            WHERE project_id = %s
+            FOR UPDATE
+            """,
+            (project_id,),
+        )
+        uploaded_version, previous_uploaded_version = cursor.fetchone()
+        stale_version = None
+        if uploaded_version is not None and uploaded_version > version:
+            # a newer version was uploaded concurrently
+            if version != previous_uploaded_version:
+                stale_version = version
+        elif uploaded_version != version:
+            cursor.execute(
+                """
+                UPDATE knowledge_base_version
+                SET uploaded_version = %s, previous_uploaded_version = %s
+                WHERE project_id = %s
+                """,
+                (version, uploaded_version, project_id),
+            )
+            stale_version = previous_uploaded_version
+        return stale_version
+
+
+def __object_name(project_id: str, version: int) -> str:
+    return f"{project_id}/knowledge_base_{version}"
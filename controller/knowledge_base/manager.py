@@ -5,7 +5,7 @@ from db.enums import NotificationType
 from db.exceptions import EntityAlreadyExistsException
 from db.business_objects import knowledge_base, general
 from util.notification import create_notification
-from . import util
+from . import artifact_cache, util
 
 
 def get_knowledge_base(project_id: str, knowledge_base_id: str) -> KnowledgeBase:
@@ -25,6 +25,7 @@ def get_knowledge_base_by_term(
 def create_knowledge_base(project_id: str) -> KnowledgeBase:
     name: str = util.find_free_name(project_id)
     base_item: KnowledgeBase = knowledge_base.create(project_id, name, with_commit=True)
+    artifact_cache.bump_version(project_id)
     return base_item
 
 
@@ -35,6 +36,7 @@ def update_knowledge_base(
         knowledge_base.update(
             project_id, knowledge_base_id, name, description, with_commit=True
         )
+        artifact_cache.bump_version(project_id)
     except EntityAlreadyExistsException:
         create_notification(
             NotificationType.KNOWLEDGE_BASE_ALREADY_EXISTS,
@@ -46,3 +48,4 @@ def update_knowledge_base(
 
 def delete_knowledge_base(project_id: str, knowledge_base_id: str) -> None:
     knowledge_base.delete(project_id, knowledge_base_id, with_commit=True)
+    artifact_cache.bump_version(project_id)
@@ -7,6 +7,7 @@ from db.exceptions import (
     EntityNotFoundException,
 )
 from db.business_objects import general, knowledge_term, knowledge_base
+from controller.knowledge_base import artifact_cache
 from util.notification import create_notification
 
 
@@ -33,6 +34,7 @@ def create_term(
         knowledge_term.create(
             project_id, knowledge_base_id, value, comment, with_commit=True
         )
+        artifact_cache.bump_version(project_id)
     except EntityAlreadyExistsException:
         base = knowledge_base.get(project_id, knowledge_base_id)
         create_notification(
@@ -65,6 +67,7 @@ def paste_knowledge_terms(
         knowledge_term.create_by_value_list(
             project_id, knowledge_base_id, to_add, with_commit=True
         )
+    artifact_cache.bump_version(project_id)
 
 
 def create_term_in_named_knowledge_base(project_id: str, name: str, value: str) -> None:
@@ -75,6 +78,7 @@ def create_term_in_named_knowledge_base(project_id: str, name: str, value: str)
         knowledge_term.create(project_id, base.id, value, None, with_commit=True)
     except EntityAlreadyExistsException:
         pass  # TODO EXCEPTION HANDLING
+    artifact_cache.bump_version(project_id)
 
 
 def update_term(
@@ -93,6 +97,7 @@ def update_term(
         knowledge_term.update(
             knowledge_base_item.id, term_id, value, comment, with_commit=True
         )
+        artifact_cache.bump_version(project_id)
     except EntityAlreadyExistsException:
         create_notification(
             NotificationType.TERM_ALREADY_EXISTS,
@@ -109,7 +114,9 @@ def delete_term(project_id: str, term_id: str) -> None:
         raise EntityNotFoundException
 
     knowledge_term.delete(term_id, with_commit=True)
+    artifact_cache.bump_version(project_id)
 
 
-def blacklist_term(term_id: str) -> None:
+def blacklist_term(project_id: str, term_id: str) -> None:
     knowledge_term.blacklist(term_id, with_commit=True)
+    artifact_cache.bump_version(project_id)
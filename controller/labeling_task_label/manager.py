@@ -4,6 +4,7 @@ from db.business_objects import (
     labeling_task,
     general,
 )
+from controller.knowledge_base import artifact_cache
 from controller.knowledge_base.util import create_knowledge_base_if_not_existing
 from db.enums import LabelingTaskType
 
@@ -34,6 +35,8 @@ def create_label(
         create_knowledge_base_if_not_existing(name, project_id)
 
     general.commit()
+    if task.task_type == LabelingTaskType.INFORMATION_EXTRACTION.value:
+        artifact_cache.bump_version(project_id)
     return label
 
 
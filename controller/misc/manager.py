@@ -1,10 +1,12 @@
 from typing import Any, Dict, List
 from controller.misc import config_service
 from controller.misc import black_white_demo
-from graphql_api.types import ServiceVersionResult
+from graphql_api.types import JobQueueStats, ServiceVersionResult
 from datetime import datetime
 import os
 
+from service.job_queue import job_queue
+from service.search import search_cache, search_profile
 from util import service_requests
 
 
@@ -24,6 +26,17 @@ def get_black_white_demo() -> Dict[str, List[str]]:
     return black_white_demo.get_black_white_demo()
 
 
+def get_job_queue_stats() -> List[JobQueueStats]:
+    return [JobQueueStats(**stats) for stats in job_queue.get_stats()]
+
+
+def get_search_statistics() -> Dict[str, Any]:
+    return {
+        "shapes": search_profile.get_statistics(),
+        "cache": search_cache.get_statistics(),
+    }
+
+
 def get_version_overview() -> List[ServiceVersionResult]:
     updater_version_overview = __updater_version_overview()
     date_format = "%Y-%m-%dT%H:%M:%S.%f"  # 2022-09-06T12:10:39.167397
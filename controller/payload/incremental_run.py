@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple
+
+from db import enums
+from db.business_objects.labeling_task_label import get_label_ids_by_names
+from db.business_objects.tokenization import get_doc_bin_progress
+from db.models import InformationSourcePayload
+from util import db_connection
+
+# above this share of changed records a full run is about as fast and avoids the merge
+MAX_DELTA_SHARE = float(os.getenv("INCREMENTAL_RUN_MAX_DELTA_SHARE", 0.5))
+
+
+def prepare_run(
+    information_source_payload: InformationSourcePayload,
+    project_id: str,
+    labeling_task_id: str,
+    knowledge_base_content: str,
+    tokenizer: str,
+) -> Tuple[Optional[List[str]], str]:
+    """
+    Compares the content hashes of all records (record data and docbin, kept up to date on
+    write) with the state of the last finished run of the source, only the records that
+    differ are written for the payload.
+    Returns the ids of added or changed records if only those need to be executed (None if
+    a full run is needed) and the record version, a hash over the state of all records.
+    """
+    payload_id = str(information_source_payload.id)
+    source_id = str(information_source_payload.source_id)
+    fingerprint = (
+        __hash(information_source_payload.source_code),
+        __hash(knowledge_base_content),
+        __hash(
+            json.dumps(
+                sorted(get_label_ids_by_names(labeling_task_id, project_id).items()),
+                default=str,
+            )
+        ),
+        tokenizer,
+    )
+    # checked up front, a running tokenization means docbins are about to change
+    tokenization_running = bool(get_doc_bin_progress(project_id))
+
+    with db_connection.transaction() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO payload_run_state (payload_id, project_id, source_id, source_code_hash, knowledge_base_hash, labels_hash, tokenizer, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, now())
+            """,
+            (payload_id, project_id, source_id, *fingerprint),
+        )
+        # labeling functions read all record data, not only the tokenized text attributes.
+        # records without docbin aren't run
+        cursor.execute(
+            """
+            WITH current_state AS (
+                SELECT record_id, data_hash || docbin_hash record_hash
+                FROM record_content_version
+                WHERE project_id = %(project_id)s AND docbin_hash IS NOT NULL
+            ), changed AS (
+                INSERT INTO payload_record_state (payload_id, record_id, record_hash)
+                SELECT %(payload_id)s, c.record_id, c.record_hash
+                FROM current_state c
+                LEFT JOIN source_record_state s
+                    ON s.source_id = %(source_id)s AND s.record_id = c.record_id
+                WHERE s.record_hash IS DISTINCT FROM c.record_hash
+                RETURNING record_id
+            )
+            SELECT
+                (SELECT COUNT(*) FROM current_state),
+                (SELECT md5(COALESCE(string_agg(record_id::text || record_hash, ',' ORDER BY record_id), '')) FROM current_state),
+                (SELECT COUNT(*) FROM changed)
+            """,
+            {
+                "project_id": project_id,
+                "payload_id": payload_id,
+                "source_id": source_id,
+            },
+        )
+        record_count, record_version, changed_count = cursor.fetchone()
+        cursor.execute(
+            """
+            SELECT p.id, rs.source_code_hash, rs.knowledge_base_hash, rs.labels_hash, rs.tokenizer
+            FROM information_source_payload p
+            LEFT JOIN payload_run_state rs
+                ON rs.payload_id = p.id
+            WHERE p.source_id = %s AND p.state = %s AND p.id != %s
+            ORDER BY p.created_at DESC
+            LIMIT 1
+            """,
+            (source_id, enums.PayloadState.FINISHED.value, payload_id),
+        )
+        previous = cursor.fetchone()
+
+        record_ids = None
+        # previous results are only reusable if everything besides the records is unchanged
+        if (
+            previous
+            and tuple(previous[1:]) == fingerprint
+            and not tokenization_running
+            and changed_count <= MAX_DELTA_SHARE * record_count
+        ):
+            cursor.execute(
+                "SELECT record_id FROM payload_record_state WHERE payload_id = %s",
+                (payload_id,),
+            )
+            record_ids = [str(row[0]) for row in cursor.fetchall()]
+
+        cursor.execute(
+            """
+            UPDATE payload_run_state
+            SET record_count = %s, delta_count = %s, docbin_version = %s
+            WHERE payload_id = %s
+            """,
+            (
+                record_count,
+                len(record_ids) if record_ids is not None else None,
+                record_version,
+                payload_id,
+            ),
+        )
+    return record_ids, record_version
+
+
+def finish_run(information_source_payload: InformationSourcePayload) -> None:
+    # the state of the source is updated with the records this run changed, the others are still valid
+    payload_id = str(information_source_payload.id)
+    source_id = str(information_source_payload.source_id)
+    with db_connection.transaction() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO source_record_state (source_id, record_id, record_hash)
+            SELECT %s, record_id, record_hash
+            FROM payload_record_state
+            WHERE payload_id = %s
+            ON CONFLICT (source_id, record_id) DO UPDATE SET record_hash = EXCLUDED.record_hash
+            """,
+            (source_id, payload_id),
+        )
+        cursor.execute(
+            "DELETE FROM payload_record_state WHERE payload_id = %s", (payload_id,)
+        )
+        # only the fingerprint of the latest run is needed for the next comparison
+        cursor.execute(
+            "DELETE FROM payload_run_state WHERE source_id = %s AND payload_id != %s",
+            (source_id, payload_id),
+        )
+
+
+def discard_run(information_source_payload: InformationSourcePayload) -> None:
+    db_connection.execute(
+        "DELETE FROM payload_run_state WHERE payload_id = %s",
+        (str(information_source_payload.id),),
+    )
+
+
+def __hash(content: Optional[str]) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
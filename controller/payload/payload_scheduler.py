@@ -1,11 +1,11 @@
 import os
 import re
 from sqlalchemy.orm.attributes import flag_modified
-from typing import Any, Tuple, Dict, List
+from typing import Any, Iterator, Optional, Set, Tuple, Dict, List
 
+import itertools
 import pytz
 import json
-import docker
 import timeit
 import traceback
 from datetime import datetime
@@ -17,7 +17,6 @@ from db.business_objects import (
     information_source,
     embedding,
     labeling_task,
-    labeling_task_label,
     record,
     record_label_association,
     general,
@@ -31,10 +30,9 @@ from db.business_objects.information_source import (
 from db.business_objects.labeling_task_label import (
     get_classification_labels_manual,
     get_extraction_labels_manual,
-    get_label_ids_by_names,
 )
 from controller.embedding import manager
-from db.business_objects.payload import get_max_token, get
+from db.business_objects.payload import get
 from db.business_objects.tokenization import (
     get_doc_bin_progress,
     get_doc_bin_table_to_json,
@@ -42,22 +40,29 @@ from db.business_objects.tokenization import (
 from db.models import (
     InformationSource,
     InformationSourceStatisticsExclusion,
-    RecordLabelAssociation,
     InformationSourcePayload,
-    User,
 )
-from controller.auth.manager import get_user_by_info
-from util import daemon, doc_ock, notification
+from controller.user import manager as user_manager
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass
+from util import doc_ock, exec_env_pool, json_stream, notification
+from util.log_stream import LogStream
 from s3 import controller as s3
-from controller.knowledge_base import util as knowledge_base
+from controller.knowledge_base import artifact_cache
 from util.notification import create_notification
-from util.miscellaneous_functions import chunk_dict
+from util.miscellaneous_functions import chunk_items
 from controller.weak_supervision import weak_supervision_service as weak_supervision
+from controller.payload import (
+    incremental_run,
+    result_cache,
+    result_ingestion,
+    sharded_run,
+)
 
 # lf container is run in frankfurt, graphql-gateway is utc --> german time zone needs to be used to match
 
-client = docker.from_env()
 __tz = pytz.timezone("Europe/Berlin")
+RESULT_BATCH_SIZE = 1000
 
 
 def create_payload(
@@ -69,11 +74,6 @@ def create_payload(
 ) -> InformationSourcePayload:
     information_source_item = information_source.get(project_id, information_source_id)
     count = len(information_source_item.payloads) + 1
-    # remove session connection to prevent timeout errors, caution no update possible!
-    # timeouts can occur if the data collection takes longer than the session stays active
-    # TODO outsource in general file maybe
-    general.expunge(information_source_item)
-    general.make_transient(information_source_item)
     payload = information_source.create_payload(
         project_id=project_id,
         created_by=user_id,
@@ -87,249 +87,372 @@ def create_payload(
         project_id, f"payload_created:{information_source_item.id}:{payload.id}"
     )
 
-    def prepare_and_run_execution_pipeline(
-        user: User,
-        payload_id: str,
-        project_id: str,
-        information_source_item: InformationSource,
-    ) -> None:
-        ctx_token = general.get_ctx_token()
-        try:
-            add_file_name, input_data = prepare_input_data_for_payload(
-                information_source_item
-            )
-            execution_pipeline(
-                user,
-                payload_id,
-                project_id,
-                information_source_item,
-                add_file_name,
-                input_data,
-            )
-        except:
-            general.rollback()
-            print(traceback.format_exc(), flush=True)
-            payload_item = get(project_id, payload_id)
-            payload_item.state = enums.PayloadState.FAILED.value
-            general.commit()
-            create_notification(
-                enums.NotificationType.INFORMATION_SOURCE_FAILED,
+    if asynchronous:
+        job_queue.enqueue(
+            JobClass.PAYLOAD,
+            prepare_and_run_execution_pipeline,
+            str(user_id),
+            str(payload.id),
+            str(project_id),
+            str(information_source_id),
+            on_failure=fail_execution_pipeline,
+        )
+    else:
+        prepare_and_run_execution_pipeline(
+            user_id,
+            str(payload.id),
+            project_id,
+            information_source_id,
+        )
+    return payload
+
+
+def prepare_and_run_execution_pipeline(
+    user_id: str,
+    payload_id: str,
+    project_id: str,
+    information_source_id: str,
+) -> None:
+    information_source_item = information_source.get(project_id, information_source_id)
+    # remove session connection to prevent timeout errors, caution no update possible!
+    # timeouts can occur if the data collection takes longer than the session stays active
+    # TODO outsource in general file maybe
+    general.expunge(information_source_item)
+    general.make_transient(information_source_item)
+    ctx_token = general.get_ctx_token()
+    try:
+        add_file_name, input_data = __prepare_input_data_for_payload(
+            user_id, project_id, information_source_item
+        )
+        __execution_pipeline(
+            user_id,
+            payload_id,
+            project_id,
+            information_source_item,
+            add_file_name,
+            input_data,
+        )
+    except:
+        general.rollback()
+        print(traceback.format_exc(), flush=True)
+        payload_item = get(project_id, payload_id)
+        payload_item.state = enums.PayloadState.FAILED.value
+        general.commit()
+        create_notification(
+            enums.NotificationType.INFORMATION_SOURCE_FAILED,
+            user_id,
+            project_id,
+            information_source_item.name,
+        )
+    finally:
+        general.reset_ctx_token(ctx_token, True)
+
+
+def fail_execution_pipeline(
+    user_id: str,
+    payload_id: str,
+    project_id: str,
+    information_source_id: str,
+) -> None:
+    # the pipeline job failed for good, e.g. since the replica running it died
+    payload_item = get(project_id, payload_id)
+    if not payload_item or payload_item.state in [
+        enums.PayloadState.FINISHED.value,
+        enums.PayloadState.FAILED.value,
+    ]:
+        return
+    payload_item.state = enums.PayloadState.FAILED.value
+    payload_item.logs = (payload_item.logs or []) + [
+        datetime.now(__tz).strftime("%Y-%m-%dT%H:%M:%S")
+        + " Execution was interrupted, please run the heuristic again."
+    ]
+    general.commit()
+    information_source_item = information_source.get(project_id, information_source_id)
+    create_notification(
+        enums.NotificationType.INFORMATION_SOURCE_FAILED,
+        user_id,
+        project_id,
+        information_source_item.name,
+    )
+    notification.send_organization_update(
+        project_id, f"payload_failed:{information_source_id}:{payload_id}"
+    )
+
+
+def __prepare_input_data_for_payload(
+    user_id: str,
+    project_id: str,
+    information_source_item: InformationSource,
+) -> Tuple[str, Dict[str, Any]]:
+    if (
+        information_source_item.type
+        == enums.InformationSourceType.LABELING_FUNCTION.value
+    ):
+        # isn't collected every time but rather whenever tokenization needs to run again --> accesslink to the docbin file on s3
+        return None, None
+
+    elif (
+        information_source_item.type
+        == enums.InformationSourceType.ACTIVE_LEARNING.value
+    ):
+
+        # for active learning, we can not evaluate on all records that are used for training
+        # as otherwise, we would retrieve a false understanding of the accuracy!
+        add_information_source_statistics_exclusion(
+            project_id,
+            str(information_source_item.labeling_task_id),
+            str(information_source_item.id),
+        )
+
+        # now, collect the data
+        embedding_id = __get_embedding_id_from_function(
+            user_id, project_id, information_source_item
+        )
+
+        # Update embedding file in s3
+        manager.request_tensor_upload(project_id, embedding_id)
+        embedding_file_name = f"embedding_tensors_{embedding_id}.csv.bz2"
+        embedding_item = embedding.get(project_id, embedding_id)
+        org_id = organization.get_id_by_project_id(project_id)
+        if not s3.object_exists(org_id, project_id + "/" + embedding_file_name):
+            notification = create_notification(
+                enums.NotificationType.INFORMATION_SOURCE_S3_EMBEDDING_MISSING,
                 user_id,
                 project_id,
-                information_source_item.name,
+                embedding_item.name,
             )
-        finally:
-            general.reset_ctx_token(ctx_token, True)
-
-    def prepare_input_data_for_payload(
-        information_source_item: InformationSource,
-    ) -> Tuple[str, Dict[str, Any]]:
+            raise ValueError(notification.message)
+        labels_manual = None
         if (
-            information_source_item.type
-            == enums.InformationSourceType.LABELING_FUNCTION.value
+            information_source_item.return_type
+            == enums.InformationSourceReturnType.RETURN.value
         ):
-            # isn't collected every time but rather whenever tokenization needs to run again --> accesslink to the docbin file on s3
-            return None, None
+            labels_manual = get_classification_labels_manual(
+                project_id, information_source_item.labeling_task_id
+            )
 
         elif (
-            information_source_item.type
-            == enums.InformationSourceType.ACTIVE_LEARNING.value
+            information_source_item.return_type
+            == enums.InformationSourceReturnType.YIELD.value
         ):
-
-            # for active learning, we can not evaluate on all records that are used for training
-            # as otherwise, we would retrieve a false understanding of the accuracy!
-            add_information_source_statistics_exclusion(
-                project_id,
-                str(information_source_item.labeling_task_id),
-                information_source_id,
+            labels_manual = get_extraction_labels_manual(
+                project_id, information_source_item.labeling_task_id
             )
 
-            # now, collect the data
-            embedding_id = __get_embedding_id_from_function(
-                user_id, project_id, information_source_item
-            )
-
-            # Update embedding file in s3
-            manager.request_tensor_upload(project_id, embedding_id)
-            embedding_file_name = f"embedding_tensors_{embedding_id}.csv.bz2"
-            embedding_item = embedding.get(project_id, embedding_id)
-            org_id = organization.get_id_by_project_id(project_id)
-            if not s3.object_exists(org_id, project_id + "/" + embedding_file_name):
-                notification = create_notification(
-                    enums.NotificationType.INFORMATION_SOURCE_S3_EMBEDDING_MISSING,
-                    user_id,
-                    project_id,
-                    embedding_item.name,
-                )
-                raise ValueError(notification.message)
-            labels_manual = None
-            if (
-                information_source_item.return_type
-                == enums.InformationSourceReturnType.RETURN.value
-            ):
-                labels_manual = get_classification_labels_manual(
-                    project_id, information_source_item.labeling_task_id
-                )
+        # records that are excluded for stats calculation can be used to train
+        # active learning modules
+        training_record_ids = get_exclusion_record_ids(str(information_source_item.id))
+        input_data = json.dumps(
+            {
+                "embedding_type": embedding_item.type,
+                "embedding_name": embedding_item.name,
+                "labels": {"manual": labels_manual},
+                "ids": get_embedding_record_ids(project_id),
+                "active_learning_ids": training_record_ids,
+            }
+        )
+        return embedding_file_name, input_data
 
-            elif (
-                information_source_item.return_type
-                == enums.InformationSourceReturnType.YIELD.value
-            ):
-                labels_manual = get_extraction_labels_manual(
-                    project_id, information_source_item.labeling_task_id
-                )
 
-            # records that are excluded for stats calculation can be used to train
-            # active learning modules
-            training_record_ids = get_exclusion_record_ids(information_source_id)
-            input_data = json.dumps(
-                {
-                    "embedding_type": embedding_item.type,
-                    "embedding_name": embedding_item.name,
-                    "labels": {"manual": labels_manual},
-                    "ids": get_embedding_record_ids(project_id),
-                    "active_learning_ids": training_record_ids,
-                }
-            )
-            return embedding_file_name, input_data
+def __execution_pipeline(
+    user_id: str,
+    payload_id: str,
+    project_id: str,
+    information_source_item: InformationSource,
+    add_file_name: str,
+    input_data: Dict[str, Any],
+) -> None:
 
-    def execution_pipeline(
-        user: User,
-        payload_id: str,
-        project_id: str,
-        information_source_item: InformationSource,
-        add_file_name: str,
-        input_data: Dict[str, Any],
-    ) -> None:
+    if (
+        information_source_item.type
+        == enums.InformationSourceType.LABELING_FUNCTION.value
+    ):
+        image = os.getenv("LF_EXEC_ENV_IMAGE")
+    elif (
+        information_source_item.type
+        == enums.InformationSourceType.ACTIVE_LEARNING.value
+    ):
+        image = os.getenv("ML_EXEC_ENV_IMAGE")
+    else:
+        raise GraphQLError(
+            f"unknown information source type: {information_source_item.type}"
+        )
 
+    payload_item = information_source.get_payload(project_id, payload_id)
+    org_id = organization.get_id_by_project_id(project_id)
+    record_ids = None
+    cache_key = None
+    cached_object_names = None
+    result_object_names = [project_id + "/" + str(payload_id)]
+    changed_record_ids = None
+    try:
+        create_notification(
+            enums.NotificationType.INFORMATION_SOURCE_STARTED,
+            user_id,
+            project_id,
+            information_source_item.name,
+        )
+        start = timeit.default_timer()
+        knowledge_base_object = None
         if (
             information_source_item.type
             == enums.InformationSourceType.LABELING_FUNCTION.value
         ):
-            image = os.getenv("LF_EXEC_ENV_IMAGE")
-        elif (
-            information_source_item.type
-            == enums.InformationSourceType.ACTIVE_LEARNING.value
-        ):
-            image = os.getenv("ML_EXEC_ENV_IMAGE")
-        else:
-            raise GraphQLError(
-                f"unknown information source type: {information_source_item.type}"
-            )
-
-        payload_item = information_source.get_payload(project_id, payload_id)
-        try:
-            create_notification(
-                enums.NotificationType.INFORMATION_SOURCE_STARTED,
-                user_id,
+            # the executed artifact and the hashed content have to be of the same version
+            (
+                knowledge_base_content,
+                knowledge_base_object,
+            ) = artifact_cache.get_artifact(project_id, org_id)
+            tokenizer = project.get(project_id).tokenizer
+            record_ids, record_version = incremental_run.prepare_run(
+                payload_item,
                 project_id,
-                information_source_item.name,
+                str(information_source_item.labeling_task_id),
+                knowledge_base_content,
+                tokenizer,
+            )
+            if record_ids is None:
+                # incremental runs only produce partial results, so only full runs use the cache
+                cache_key = result_cache.build_key(
+                    payload_item.source_code,
+                    record_version,
+                    knowledge_base_content,
+                    tokenizer,
+                )
+                cached_object_names = result_cache.lookup(
+                    org_id, project_id, cache_key, payload_id
+                )
+        if record_ids is not None and len(record_ids) == 0:
+            berlin_now = datetime.now(__tz)
+            payload_item.logs = [
+                berlin_now.strftime("%Y-%m-%dT%H:%M:%S")
+                + " No records changed since the last run, results are kept."
+            ]
+            payload_item.finished_at = datetime.now()
+            general.commit()
+            has_error, changed_record_ids = False, set()
+        elif cached_object_names:
+            berlin_now = datetime.now(__tz)
+            payload_item.logs = [
+                berlin_now.strftime("%Y-%m-%dT%H:%M:%S")
+                + " Result cache hit, results of an identical run are used."
+            ]
+            payload_item.finished_at = datetime.now()
+            general.commit()
+            # only the cached results are reused, the container is not started
+            cache_key = None
+            has_error, changed_record_ids = update_records(
+                payload_item, project_id, result_object_names=cached_object_names
             )
-            start = timeit.default_timer()
-            run_container(
+        else:
+            result_object_names = run_container(
                 payload_item,
                 project_id,
                 image,
                 information_source_item.type,
                 add_file_name,
                 input_data,
+                record_ids,
+                knowledge_base_object,
             )
-            has_error = update_records(payload_item, project_id)
-            if has_error:
-                payload_item = information_source.get_payload(project_id, payload_id)
-                tmp_log_store = payload_item.logs
+            if cache_key:
                 berlin_now = datetime.now(__tz)
-                tmp_log_store.append(
-                    " ".join(
-                        [
-                            berlin_now.strftime("%Y-%m-%dT%H:%M:%S"),
-                            "If existing, results of previous run are kept.",
-                        ]
-                    )
-                )
-                payload_item.logs = tmp_log_store
-                flag_modified(payload_item, "logs")
+                payload_item.logs = payload_item.logs + [
+                    berlin_now.strftime("%Y-%m-%dT%H:%M:%S") + " Result cache miss."
+                ]
                 general.commit()
-                raise ValueError(
-                    "update_records resulted in errors -- see log for details"
-                )
-
-            payload_item.state = enums.PayloadState.FINISHED.value
-            general.commit()
-            create_notification(
-                enums.NotificationType.INFORMATION_SOURCE_COMPLETED,
-                user_id,
-                project_id,
-                information_source_item.name,
+            has_error, changed_record_ids = update_records(
+                payload_item, project_id, record_ids, result_object_names
             )
-            notification.send_organization_update(
-                project_id,
-                f"payload_finished:{information_source_item.id}:{payload.id}",
+        if has_error:
+            payload_item = information_source.get_payload(project_id, payload_id)
+            tmp_log_store = payload_item.logs
+            berlin_now = datetime.now(__tz)
+            tmp_log_store.append(
+                " ".join(
+                    [
+                        berlin_now.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "If existing, results of previous run are kept.",
+                    ]
+                )
             )
-        except Exception as e:
-            general.rollback()
-            if not type(e) == ValueError:
-                print(traceback.format_exc())
-            payload_item.state = enums.PayloadState.FAILED.value
+            payload_item.logs = tmp_log_store
+            flag_modified(payload_item, "logs")
             general.commit()
-            create_notification(
-                enums.NotificationType.INFORMATION_SOURCE_FAILED,
-                user_id,
-                project_id,
-                information_source_item.name,
-            )
-            notification.send_organization_update(
-                project_id,
-                f"payload_failed:{information_source_item.id}:{payload_item.id}",
-            )
-        stop = timeit.default_timer()
-        general.commit()
-
-        org_id = organization.get_id_by_project_id(project_id)
-        s3.delete_object(org_id, project_id + "/" + str(payload_id))
+            raise ValueError("update_records resulted in errors -- see log for details")
 
-        if payload_item.state == enums.PayloadState.FINISHED.value:
-            try:
-                weak_supervision.calculate_stats_after_source_run(
-                    project_id, payload.source_id, user_id
-                )
-                notification.send_organization_update(
-                    project_id,
-                    f"payload_update_statistics:{information_source_item.id}:{payload.id}",
-                )
-                general.commit()
-            except:
-                print(traceback.format_exc())
-
-        project_item = project.get(project_id)
-        doc_ock.post_event(
-            user,
-            events.AddInformationSourceRun(
-                ProjectName=f"{project_item.name}-{project_item.id}",
-                Type=information_source_item.type,
-                Code=information_source_item.source_code,
-                Logs=payload_item.logs,
-                RunTime=stop - start,
-            ),
+        payload_item.state = enums.PayloadState.FINISHED.value
+        general.commit()
+        create_notification(
+            enums.NotificationType.INFORMATION_SOURCE_COMPLETED,
+            user_id,
+            project_id,
+            information_source_item.name,
         )
-
-    user = get_user_by_info(info)
-    if asynchronous:
-        daemon.run(
-            prepare_and_run_execution_pipeline,
-            user,
-            payload.id,
+        notification.send_organization_update(
             project_id,
-            information_source_item,
+            f"payload_finished:{information_source_item.id}:{payload_id}",
         )
-    else:
-        prepare_and_run_execution_pipeline(
-            user,
-            payload.id,
+    except Exception as e:
+        general.rollback()
+        if not type(e) == ValueError:
+            print(traceback.format_exc())
+        payload_item.state = enums.PayloadState.FAILED.value
+        general.commit()
+        create_notification(
+            enums.NotificationType.INFORMATION_SOURCE_FAILED,
+            user_id,
             project_id,
-            information_source_item,
+            information_source_item.name,
         )
-    return payload
+        notification.send_organization_update(
+            project_id,
+            f"payload_failed:{information_source_item.id}:{payload_item.id}",
+        )
+    stop = timeit.default_timer()
+    general.commit()
+
+    if not (
+        cache_key
+        and payload_item.state == enums.PayloadState.FINISHED.value
+        and result_cache.store(org_id, project_id, cache_key, result_object_names)
+    ):
+        for result_object_name in result_object_names:
+            s3.delete_object(org_id, result_object_name)
+    try:
+        if payload_item.state == enums.PayloadState.FINISHED.value:
+            incremental_run.finish_run(payload_item)
+        else:
+            incremental_run.discard_run(payload_item)
+    except Exception:
+        print(traceback.format_exc())
+
+    if payload_item.state == enums.PayloadState.FINISHED.value:
+        try:
+            # manual label changes trigger their own recalculation, so unchanged results need none
+            if changed_record_ids is None or len(changed_record_ids) > 0:
+                weak_supervision.calculate_stats_after_source_run(
+                    project_id, payload_item.source_id, user_id
+                )
+            notification.send_organization_update(
+                project_id,
+                f"payload_update_statistics:{information_source_item.id}:{payload_id}",
+            )
+            general.commit()
+        except:
+            print(traceback.format_exc())
+
+    project_item = project.get(project_id)
+    doc_ock.post_event(
+        user_manager.get_user(user_id),
+        events.AddInformationSourceRun(
+            ProjectName=f"{project_item.name}-{project_item.id}",
+            Type=information_source_item.type,
+            Code=information_source_item.source_code,
+            Logs=payload_item.logs,
+            RunTime=stop - start,
+        ),
+    )
 
 
 def run_container(
@@ -339,13 +462,19 @@ def run_container(
     information_source_type: str,
     add_file_name: str,
     input_data: Dict[str, Any],
-) -> None:
+    record_ids: Optional[List[str]] = None,
+    knowledge_base_object: Optional[str] = None,
+) -> List[str]:
+    """
+    Runs the exec env and returns the s3 object names the results were uploaded to.
+    """
     project_item = project.get(project_id)
     payload_id = str(information_source_payload.id)
     prefixed_input_name = f"{payload_id}_input"
     prefixed_function_name = f"{payload_id}_fn"
-    prefixed_knowledge_base = f"{payload_id}_knowledge"
+    prefixed_doc_bin = f"{payload_id}_doc_bin.json"
     org_id = organization.get_id_by_project_id(project_id)
+    log_stream = __create_payload_log_stream(information_source_payload, project_id)
     s3.put_object(
         org_id,
         project_id + "/" + prefixed_function_name,
@@ -360,36 +489,60 @@ def run_container(
             s3.create_access_link(org_id, project_id + "/" + add_file_name),
             s3.create_file_upload_link(org_id, project_id + "/" + payload_id),
         ]
-    else:
-        s3.put_object(
-            org_id,
-            project_id + "/" + prefixed_knowledge_base,
-            knowledge_base.build_knowledge_base_from_project(project_id),
+        information_source_payload.logs = log_stream.consume(
+            exec_env_pool.run(image, command, project_id)
         )
+        result_object_names = [project_id + "/" + payload_id]
+    else:
+        if knowledge_base_object is None:
+            # uploaded once per knowledge base version and shared by all runs of the project
+            _, knowledge_base_object = artifact_cache.get_artifact(project_id, org_id)
         progress = get_doc_bin_progress(project_id)
-        command = [
-            s3.create_access_link(org_id, project_id + "/" + "docbin_full"),
-            s3.create_access_link(org_id, project_id + "/" + prefixed_function_name),
-            s3.create_access_link(org_id, project_id + "/" + prefixed_knowledge_base),
-            progress,
-            project_item.tokenizer_blank,
-            s3.create_file_upload_link(org_id, project_id + "/" + payload_id),
-        ]
 
-    container = client.containers.run(
-        image=image,
-        command=command,
-        remove=True,
-        detach=True,
-        network=os.getenv("LF_NETWORK"),
-    )
-
-    information_source_payload.logs = [
-        line.decode("utf-8").strip("\n")
-        for line in container.logs(
-            stream=True, stdout=True, stderr=True, timestamps=True
-        )
-    ]
+        def build_command(doc_bin: str, result_name: str) -> List[str]:
+            return [
+                s3.create_access_link(org_id, project_id + "/" + doc_bin),
+                s3.create_access_link(
+                    org_id, project_id + "/" + prefixed_function_name
+                ),
+                s3.create_access_link(org_id, knowledge_base_object),
+                progress,
+                project_item.tokenizer_blank,
+                s3.create_file_upload_link(org_id, project_id + "/" + result_name),
+            ]
+
+        shards = sharded_run.split_records(project_id, record_ids)
+        if shards:
+            (
+                information_source_payload.logs,
+                result_object_names,
+            ) = sharded_run.run_shards(
+                information_source_payload,
+                project_id,
+                org_id,
+                image,
+                shards,
+                build_command,
+                log_stream,
+            )
+        else:
+            doc_bin = "docbin_full"
+            if record_ids is not None:
+                # incremental run, only the changed records are executed
+                s3.put_object(
+                    org_id,
+                    project_id + "/" + prefixed_doc_bin,
+                    get_doc_bin_table_to_json(
+                        project_id=project_id,
+                        missing_columns=record.get_missing_columns_str(project_id),
+                        record_ids=record_ids,
+                    ),
+                )
+                doc_bin = prefixed_doc_bin
+            information_source_payload.logs = log_stream.consume(
+                exec_env_pool.run(image, build_command(doc_bin, payload_id), project_id)
+            )
+            result_object_names = [project_id + "/" + payload_id]
 
     print("\nContainer logs:")
     for log in information_source_payload.logs:
@@ -401,19 +554,52 @@ def run_container(
 
     s3.delete_object(org_id, project_id + "/" + prefixed_input_name)
     s3.delete_object(org_id, project_id + "/" + prefixed_function_name)
-    s3.delete_object(org_id, project_id + "/" + prefixed_knowledge_base)
+    if record_ids is not None:
+        s3.delete_object(org_id, project_id + "/" + prefixed_doc_bin)
+    return result_object_names
 
 
-def update_records(
+def __create_payload_log_stream(
     information_source_payload: InformationSourcePayload, project_id: str
-) -> bool:
+) -> LogStream:
+    def persist(lines: List[str]) -> None:
+        information_source_payload.logs = lines
+        general.commit()
+
+    return LogStream(
+        project_id,
+        f"payload_logs:{information_source_payload.source_id}:{information_source_payload.id}",
+        persist,
+    )
+
+
+def update_records(
+    information_source_payload: InformationSourcePayload,
+    project_id: str,
+    record_ids: Optional[List[str]] = None,
+    result_object_names: Optional[List[str]] = None,
+) -> Tuple[bool, Optional[Set[str]]]:
+    """
+    Merges the results into the associations of the source. Returns if errors occurred
+    and the ids of records whose results changed (None if too many to collect).
+    """
     org_id = organization.get_id_by_project_id(project_id)
     tmp_log_store = information_source_payload.logs
+    if not result_object_names:
+        result_object_names = [
+            str(project_id) + "/" + str(information_source_payload.id)
+        ]
     try:
-        output_data = json.loads(
-            s3.get_object(
-                org_id, str(project_id) + "/" + str(information_source_payload.id)
-            )
+        # results are decoded incrementally so memory is bounded by the batch size, not the output size
+        # sharded runs have one result object per shard, they are read one after another
+        # the first stream is opened here so a missing result object is reported right away
+        # the streams of later shards are only opened once they are reached
+        output_data = itertools.chain(
+            json_stream.iter_object_items(org_id, result_object_names[0]),
+            itertools.chain.from_iterable(
+                json_stream.iter_object_items(org_id, result_object_name)
+                for result_object_name in result_object_names[1:]
+            ),
         )
     except Exception:
         berlin_now = datetime.now(__tz)
@@ -428,9 +614,14 @@ def update_records(
         information_source_payload.logs = tmp_log_store
         flag_modified(information_source_payload, "logs")
         general.commit()
-        return True
+        return True, None
 
     berlin_now = datetime.now(__tz)
+    if record_ids is not None:
+        tmp_log_store.append(
+            berlin_now.strftime("%Y-%m-%dT%H:%M:%S")
+            + f" Incremental run on {len(record_ids)} added or changed records, results of the other records are kept."
+        )
     tmp_log_store.append(
         berlin_now.strftime("%Y-%m-%dT%H:%M:%S") + " Writing results to the database."
     )
@@ -438,22 +629,36 @@ def update_records(
     information_source: InformationSource = (
         information_source_payload.informationSource  # backref resolves in camelCase
     )
-    if information_source.return_type == enums.InformationSourceReturnType.YIELD.value:
-        has_errors = add_data_extraction(
-            information_source_payload,
-            project_id,
-            information_source.labeling_task_id,
-            tmp_log_store,
-            output_data,
-        )
-    else:
-        has_errors = add_data_classification(
-            information_source_payload,
-            project_id,
-            information_source.labeling_task_id,
-            tmp_log_store,
-            output_data,
+    try:
+        if (
+            information_source.return_type
+            == enums.InformationSourceReturnType.YIELD.value
+        ):
+            has_errors, changed_record_ids = add_data_extraction(
+                information_source_payload,
+                project_id,
+                information_source.labeling_task_id,
+                tmp_log_store,
+                output_data,
+                record_ids,
+            )
+        else:
+            has_errors, changed_record_ids = add_data_classification(
+                information_source_payload,
+                project_id,
+                information_source.labeling_task_id,
+                tmp_log_store,
+                output_data,
+                record_ids,
+            )
+    except (ValueError, FileNotFoundError) as e:
+        # the output is decoded while it's ingested, so malformed results and missing
+        # result objects of later shards only surface here
+        tmp_log_store.append(
+            datetime.now(__tz).strftime("%Y-%m-%dT%H:%M:%S")
+            + f" Results of the code execution couldn't be read: {e}"
         )
+        has_errors, changed_record_ids = True, None
     berlin_now = datetime.now(__tz)
     if has_errors:
         tmp_log_store.append(
@@ -467,7 +672,7 @@ def update_records(
     information_source_payload.logs = tmp_log_store
     flag_modified(information_source_payload, "logs")
     general.commit()
-    return has_errors
+    return has_errors, changed_record_ids
 
 
 def add_data_classification(
@@ -475,57 +680,17 @@ def add_data_classification(
     project_id: str,
     labeling_task_id: str,
     tmp_log_store: List[str],
-    output_data: Any,
-) -> bool:
-    record_label_associations = []
-    labels_valid = {}
-    labels_in_task = get_label_ids_by_names(labeling_task_id, project_id)
-    my_chunks = chunk_dict(output_data)
-    has_errors = False
-    for chunk in my_chunks:
-        valid_record_ids = record.get_ids_by_keys(chunk)
-        valid_record_ids = set([x[0] for x in valid_record_ids])
-        for idx, (record_id, lf_result) in enumerate(chunk.items()):
-            if record_id not in valid_record_ids:
-                # not an error since this is a failsaive to prevend deleted records from erroring out
-                continue
-            confidence, label_name = lf_result
-            if __check_label_errors(
-                label_name, labels_in_task, tmp_log_store, labels_valid
-            ):
-                has_errors = True
-                continue
-            if not isinstance(label_name, str):
-                raise TypeError(
-                    f"Expected String, but Label name is of type {type(label_name)}"
-                )
-
-            label = labeling_task_label.get_by_name(
-                project_id, labeling_task_id, label_name
-            )
-
-            if label is not None:
-                record_label_associations.append(
-                    RecordLabelAssociation(
-                        project_id=project_id,
-                        record_id=record_id,
-                        labeling_task_label_id=label.id,
-                        source_type=enums.LabelSource.INFORMATION_SOURCE.value,
-                        source_id=information_source_payload.source_id,
-                        return_type=enums.InformationSourceReturnType.RETURN.value,
-                        confidence=confidence,
-                        created_by=information_source_payload.created_by,
-                    )
-                )
-
-    record_label_association.delete_by_source_id(
-        project_id, information_source_payload.source_id
+    output_data: Iterator[Tuple[str, Any]],
+    record_ids: Optional[List[str]] = None,
+) -> Tuple[bool, Optional[Set[str]]]:
+    return result_ingestion.ingest_classification_results(
+        information_source_payload,
+        project_id,
+        labeling_task_id,
+        tmp_log_store,
+        chunk_items(output_data, RESULT_BATCH_SIZE),
+        record_ids,
     )
-    if not has_errors:
-        general.add_all(record_label_associations, with_commit=True)
-    else:
-        general.commit()
-    return has_errors
 
 
 def add_data_extraction(
@@ -533,121 +698,19 @@ def add_data_extraction(
     project_id: str,
     labeling_task_id: str,
     tmp_log_store: List[str],
-    output_data: Any,
-) -> bool:
-    record_label_associations = []
-    labels_valid = {}
-    labels_in_task = get_label_ids_by_names(labeling_task_id, project_id)
-    has_errors = False
-    my_chunks = chunk_dict(output_data)
-    for chunk in my_chunks:
-        max_token_num = get_max_token(chunk.keys(), labeling_task_id, project_id)
-        for idx, (record_id, lf_results) in enumerate(chunk.items()):
-            if record_id not in max_token_num:
-                # not an error since this is a failsaive to prevend deleted records from erroring out
-                continue
-            for lf_result in lf_results:
-                if __check_extraction_errors(
-                    max_token_num,
-                    record_id,
-                    lf_result,
-                    labels_in_task,
-                    tmp_log_store,
-                    labels_valid,
-                ):
-                    has_errors = True
-                    continue
-                confidence, label_name, token_idx_start, token_idx_end = lf_result
-
-                tokens = record_label_association.create_token_objects(
-                    project_id, token_idx_start, token_idx_end
-                )
-
-                label = labeling_task_label.get_by_name(
-                    project_id, labeling_task_id, label_name
-                )
-
-                record_label_associations.append(
-                    RecordLabelAssociation(
-                        project_id=project_id,
-                        record_id=record_id,
-                        source_type=enums.LabelSource.INFORMATION_SOURCE.value,
-                        source_id=information_source_payload.source_id,
-                        labeling_task_label_id=label.id,
-                        return_type=enums.InformationSourceReturnType.YIELD.value,
-                        tokens=tokens,
-                        confidence=confidence,
-                        created_by=information_source_payload.created_by,
-                    )
-                )
-
-    record_label_association.delete_by_source_id(
-        project_id, information_source_payload.source_id
-    )
-    if not has_errors:
-        general.add_all(record_label_associations, with_commit=True)
-    else:
-        general.commit()
-    return has_errors
-
-
-def __check_extraction_errors(
-    max_token_num: Dict[str, int],
-    record_id: str,
-    lf_result,
-    labels_in_task,
-    tmp_log_store,
-    labels_valid,
-) -> bool:
-    has_error = False
-    confidence, label_name, token_idx_start, token_idx_end = lf_result
-    max_token = max_token_num[record_id]
-    if token_idx_start > max_token:
-        berlin_now = datetime.now(__tz)
-        tmp_log_store.append(
-            berlin_now.strftime("%Y-%m-%dT%H:%M:%S")
-            + f" token start {{{token_idx_start}}} exceeds record {{{record_id}}} max token {{{max_token}}}"
-        )
-        has_error = True
-    if token_idx_end > max_token:
-        berlin_now = datetime.now(__tz)
-        tmp_log_store.append(
-            berlin_now.strftime("%Y-%m-%dT%H:%M:%S")
-            + f" token end {{{token_idx_end}}} exceeds record {{{record_id}}} max token {{{max_token}}}"
-        )
-        has_error = True
-    if token_idx_end - token_idx_start < 1:
-        berlin_now = datetime.now(__tz)
-        tmp_log_store.append(
-            berlin_now.strftime("%Y-%m-%dT%H:%M:%S")
-            + f" token span without length detected. start {{{token_idx_start}}}, end {{{token_idx_end}}} -> length {token_idx_start - token_idx_end} record {{{record_id}}}"
-        )
-        has_error = True
-
-    return has_error or __check_label_errors(
-        label_name, labels_in_task, tmp_log_store, labels_valid
+    output_data: Iterator[Tuple[str, Any]],
+    record_ids: Optional[List[str]] = None,
+) -> Tuple[bool, Optional[Set[str]]]:
+    return result_ingestion.ingest_extraction_results(
+        information_source_payload,
+        project_id,
+        labeling_task_id,
+        tmp_log_store,
+        chunk_items(output_data, RESULT_BATCH_SIZE),
+        record_ids,
     )
 
 
-def __check_label_errors(
-    label_name: str,
-    labels_in_task: List[str],
-    tmp_log_store: List[Any],
-    labels_valid: Dict[str, bool],
-) -> bool:
-    if label_name not in labels_valid:
-        if label_name not in labels_in_task:
-            berlin_now = datetime.now(__tz)
-            tmp_log_store.append(
-                berlin_now.strftime("%Y-%m-%dT%H:%M:%S")
-                + f" Provided label {{{label_name}}} couldn't be found for this task"
-            )
-            labels_valid[label_name] = False
-        else:
-            labels_valid[label_name] = True
-    return not labels_valid[label_name]
-
-
 def __get_embedding_id_from_function(
     user_id: str, project_id: str, source_item: InformationSource
 ) -> str:
@@ -737,7 +800,6 @@ def run_labeling_function_exec_env(
 
     prefixed_function_name = f"{information_source_id}_fn"
     prefixed_payload = f"{information_source_id}_payload.json"
-    prefixed_knowledge_base = f"{information_source_id}_knowledge"
     project_item = project.get(project_id)
     org_id = str(project_item.organization_id)
 
@@ -747,43 +809,29 @@ def run_labeling_function_exec_env(
         information_source_item.source_code,
     )
 
-    s3.put_object(
-        org_id,
-        project_id + "/" + prefixed_knowledge_base,
-        knowledge_base.build_knowledge_base_from_project(project_id),
-    )
+    _, knowledge_base_object = artifact_cache.get_artifact(project_id, org_id)
 
     tokenization_progress = get_doc_bin_progress(project_id)
 
     command = [
         s3.create_access_link(org_id, project_id + "/" + prefixed_doc_bin),
         s3.create_access_link(org_id, project_id + "/" + prefixed_function_name),
-        s3.create_access_link(org_id, project_id + "/" + prefixed_knowledge_base),
+        s3.create_access_link(org_id, knowledge_base_object),
         tokenization_progress,
         project_item.tokenizer_blank,
         s3.create_file_upload_link(org_id, project_id + "/" + prefixed_payload),
     ]
 
-    container = client.containers.run(
-        image=os.getenv("LF_EXEC_ENV_IMAGE"),
-        command=command,
-        remove=True,
-        detach=True,
-        network=os.getenv("LF_NETWORK"),
+    container_logs = list(
+        exec_env_pool.run(os.getenv("LF_EXEC_ENV_IMAGE"), command, project_id)
     )
 
-    container_logs = [
-        line.decode("utf-8").strip("\n")
-        for line in container.logs(
-            stream=True, stdout=True, stderr=True, timestamps=True
-        )
-    ]
-
     code_has_errors = False
 
     try:
-        payload = s3.get_object(org_id, project_id + "/" + prefixed_payload)
-        calculated_labels = json.loads(payload)
+        calculated_labels = dict(
+            json_stream.iter_object_items(org_id, project_id + "/" + prefixed_payload)
+        )
     except Exception:
         print("Could not grab data from s3 -- labeling function")
         code_has_errors = True
@@ -794,6 +842,5 @@ def run_labeling_function_exec_env(
         s3.delete_object(org_id, project_id + "/" + prefixed_doc_bin)
     s3.delete_object(org_id, project_id + "/" + prefixed_function_name)
     s3.delete_object(org_id, project_id + "/" + prefixed_payload)
-    s3.delete_object(org_id, project_id + "/" + prefixed_knowledge_base)
 
     return calculated_labels, container_logs, code_has_errors
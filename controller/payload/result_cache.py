@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import traceback
+from typing import List, Optional
+
+from db import enums
+from s3 import controller as s3
+from util import db_connection
+
+# per project, least recently used results are evicted first
+MAX_ENTRIES_PER_PROJECT = int(os.getenv("PAYLOAD_RESULT_CACHE_MAX_ENTRIES", 20))
+
+
+def build_key(
+    source_code: str,
+    record_version: str,
+    knowledge_base_content: str,
+    tokenizer: str,
+) -> str:
+    # record_version hashes the data and docbin hashes of all records, see incremental_run.prepare_run
+    # the exec env image is part of the key since a new image can produce other results
+    key_parts = [
+        source_code,
+        record_version,
+        knowledge_base_content,
+        tokenizer,
+        os.getenv("LF_EXEC_ENV_IMAGE"),
+    ]
+    sha = hashlib.sha256()
+    for part in key_parts:
+        sha.update((part or "").encode("utf-8"))
+        sha.update(b"\0")
+    return sha.hexdigest()
+
+
+def lookup(
+    org_id: str, project_id: str, cache_key: str, payload_id: str
+) -> Optional[List[str]]:
+    """
+    Returns the s3 object names of the cached results or None on a miss.
+    The objects aren't evicted while the payload reading them is running.
+    """
+    rows = db_connection.execute(
+        """
+        UPDATE payload_result_cache
+        SET hits = hits + 1, last_used_at = now(), read_by_payload_id = %s
+        WHERE project_id = %s AND cache_key = %s
+        RETURNING object_names
+        """,
+        (payload_id, project_id, cache_key),
+        fetch=True,
+    )
+    if not rows:
+        return None
+    object_names = rows[0][0]
+    if not all(s3.object_exists(org_id, object_name) for object_name in object_names):
+        db_connection.execute(
+            "DELETE FROM payload_result_cache WHERE project_id = %s AND cache_key = %s",
+            (project_id, cache_key),
+        )
+        return None
+    return object_names
+
+
+def store(
+    org_id: str, project_id: str, cache_key: str, object_names: List[str]
+) -> bool:
+    """
+    Takes over the result objects of a finished full run into the cache, the objects aren't
+    copied so they must not be deleted by the caller if True is returned.
+    """
+    try:
+        # a concurrent run with the same key might have stored its result already
+        rows = db_connection.execute(
+            """
+            INSERT INTO payload_result_cache (project_id, cache_key, object_names, hits, created_at, last_used_at)
+            VALUES (%s, %s, %s, 0, now(), now())
+            ON CONFLICT (project_id, cache_key) DO NOTHING
+            RETURNING cache_key
+            """,
+            (project_id, cache_key, json.dumps(object_names)),
+            fetch=True,
+        )
+        if not rows:
+            return False
+        __evict(org_id, project_id)
+    except Exception:
+        print(traceback.format_exc(), flush=True)
+        return False
+    return True
+
+
+def __evict(org_id: str, project_id: str) -> None:
+    # entries read by a running payload are kept, they are evicted by a later store
+    rows = db_connection.execute(
+        """
+        DELETE FROM payload_result_cache c
+        WHERE c.project_id = %s AND c.cache_key IN (
+            SELECT cache_key
+            FROM payload_result_cache
+            WHERE project_id = %s
+            ORDER BY last_used_at DESC
+            OFFSET %s
+        )
+        AND NOT EXISTS (
+            SELECT 1
+            FROM information_source_payload p
+            WHERE p.id = c.read_by_payload_id AND p.state NOT IN (%s, %s)
+        )
+        RETURNING c.object_names
+        """,
+        (
+            project_id,
+            project_id,
+            MAX_ENTRIES_PER_PROJECT,
+            enums.PayloadState.FINISHED.value,
+            enums.PayloadState.FAILED.value,
+        ),
+        fetch=True,
+    )
+    for (object_names,) in rows:
+        for object_name in object_names:
+            s3.delete_object(org_id, object_name)
@@ -0,0 +1,287 @@
+import timeit
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import pytz
+
+from db import enums
+from db.business_objects import record
+from db.business_objects.labeling_task_label import get_label_ids_by_names
+from db.business_objects.payload import get_max_token
+from db.models import InformationSourcePayload
+from controller.record_label_association import merge_writer
+from util import db_connection
+
+# lf container is run in frankfurt, graphql-gateway is utc --> german time zone needs to be used to match
+__tz = pytz.timezone("Europe/Berlin")
+
+
+def ingest_classification_results(
+    information_source_payload: InformationSourcePayload,
+    project_id: str,
+    labeling_task_id: str,
+    tmp_log_store: List[str],
+    chunks: Iterator[Dict[str, Any]],
+    record_ids: Optional[List[str]] = None,
+) -> Tuple[bool, Optional[Set[str]]]:
+    labels_in_task = get_label_ids_by_names(labeling_task_id, project_id)
+    labels_valid = {}
+
+    def build_rows(
+        chunk: Dict[str, Any]
+    ) -> Tuple[List[List[Any]], List[List[Any]], bool]:
+        valid_record_ids = {str(x[0]) for x in record.get_ids_by_keys(chunk)}
+        # not an error since this is a failsave to prevent deleted records from erroring out
+        chunk = {
+            record_id: lf_result
+            for record_id, lf_result in chunk.items()
+            if record_id in valid_record_ids
+        }
+        if not chunk:
+            return [], [], False
+        confidences, label_names = zip(*chunk.values())
+        for label_name in label_names:
+            if not isinstance(label_name, str):
+                raise TypeError(
+                    f"Expected String, but Label name is of type {type(label_name)}"
+                )
+        invalid_labels = __check_label_errors(
+            set(label_names), labels_in_task, tmp_log_store, labels_valid
+        )
+        if invalid_labels:
+            return [], [], True
+
+        created_at = datetime.now()
+        rla_rows = [
+            [
+                uuid.uuid4(),
+                project_id,
+                record_id,
+                labels_in_task[label_name],
+                information_source_payload.source_id,
+                enums.LabelSource.INFORMATION_SOURCE.value,
+                enums.InformationSourceReturnType.RETURN.value,
+                confidence,
+                created_at,
+                information_source_payload.created_by,
+            ]
+            for record_id, confidence, label_name in zip(
+                chunk.keys(), confidences, label_names
+            )
+        ]
+        return rla_rows, [], False
+
+    return __ingest(
+        information_source_payload,
+        project_id,
+        tmp_log_store,
+        chunks,
+        build_rows,
+        record_ids,
+        False,
+    )
+
+
+def ingest_extraction_results(
+    information_source_payload: InformationSourcePayload,
+    project_id: str,
+    labeling_task_id: str,
+    tmp_log_store: List[str],
+    chunks: Iterator[Dict[str, Any]],
+    record_ids: Optional[List[str]] = None,
+) -> Tuple[bool, Optional[Set[str]]]:
+    labels_in_task = get_label_ids_by_names(labeling_task_id, project_id)
+    labels_valid = {}
+
+    def build_rows(
+        chunk: Dict[str, Any]
+    ) -> Tuple[List[List[Any]], List[List[Any]], bool]:
+        max_token_num = get_max_token(chunk.keys(), labeling_task_id, project_id)
+        record_ids, confidences, label_names, starts, ends = [], [], [], [], []
+        for record_id, lf_results in chunk.items():
+            if record_id not in max_token_num:
+                # not an error since this is a failsave to prevent deleted records from erroring out
+                continue
+            for confidence, label_name, token_idx_start, token_idx_end in lf_results:
+                record_ids.append(record_id)
+                confidences.append(confidence)
+                label_names.append(label_name)
+                starts.append(token_idx_start)
+                ends.append(token_idx_end)
+        if not record_ids:
+            return [], [], False
+
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        max_tokens = np.fromiter(
+            (max_token_num[record_id] for record_id in record_ids),
+            dtype=np.int64,
+            count=len(record_ids),
+        )
+        start_exceeds = starts > max_tokens
+        end_exceeds = ends > max_tokens
+        no_length = (ends - starts) < 1
+        has_errors = __log_span_errors(
+            tmp_log_store,
+            record_ids,
+            starts,
+            ends,
+            max_tokens,
+            start_exceeds,
+            end_exceeds,
+            no_length,
+        )
+        if __check_label_errors(
+            set(label_names), labels_in_task, tmp_log_store, labels_valid
+        ):
+            has_errors = True
+        if has_errors:
+            return [], [], True
+
+        created_at = datetime.now()
+        rla_rows = []
+        token_rows = []
+        for idx, record_id in enumerate(record_ids):
+            rla_id = uuid.uuid4()
+            rla_rows.append(
+                [
+                    rla_id,
+                    project_id,
+                    record_id,
+                    labels_in_task[label_names[idx]],
+                    information_source_payload.source_id,
+                    enums.LabelSource.INFORMATION_SOURCE.value,
+                    enums.InformationSourceReturnType.YIELD.value,
+                    confidences[idx],
+                    created_at,
+                    information_source_payload.created_by,
+                ]
+            )
+            start = int(starts[idx])
+            token_rows.extend(
+                [uuid.uuid4(), project_id, rla_id, token_index, token_index == start]
+                for token_index in range(start, int(ends[idx]))
+            )
+        return rla_rows, token_rows, False
+
+    return __ingest(
+        information_source_payload,
+        project_id,
+        tmp_log_store,
+        chunks,
+        build_rows,
+        record_ids,
+        True,
+    )
+
+
+def __ingest(
+    information_source_payload: InformationSourcePayload,
+    project_id: str,
+    tmp_log_store: List[str],
+    chunks: Iterator[Dict[str, Any]],
+    build_rows: Any,
+    record_ids: Optional[List[str]],
+    with_tokens: bool,
+) -> Tuple[bool, Optional[Set[str]]]:
+    # results are only visible once every chunk is merged
+    # if any chunk has errors the transaction is rolled back and previous results are kept
+    # for incremental runs only the results of the given records are replaced
+    start = timeit.default_timer()
+    has_errors = False
+    changed_record_ids = None
+    rla_count = 0
+    token_count = 0
+    with db_connection.transaction() as cursor:
+        merge_writer.create_staging(cursor)
+        for chunk in chunks:
+            rla_rows, token_rows, chunk_has_errors = build_rows(chunk)
+            if chunk_has_errors:
+                has_errors = True
+            if has_errors:
+                # keep validating to collect all errors in the log
+                continue
+            merge_writer.stage(cursor, rla_rows, token_rows)
+            rla_count += len(rla_rows)
+            token_count += len(token_rows)
+        if has_errors:
+            cursor.connection.rollback()
+        else:
+            changed_record_ids = merge_writer.merge_source(
+                cursor,
+                project_id,
+                str(information_source_payload.source_id),
+                record_ids,
+                with_tokens,
+            )
+
+    if not has_errors:
+        duration = timeit.default_timer() - start
+        rows = rla_count + token_count
+        changed = (
+            f"{len(changed_record_ids)} records"
+            if changed_record_ids is not None
+            else "most records"
+        )
+        tmp_log_store.append(
+            __log_prefix()
+            + f" Merged {rla_count} associations and {token_count} tokens in {duration:.2f}s ({rows / max(duration, 1e-6):.0f} rows/s), results of {changed} changed."
+        )
+    return has_errors, changed_record_ids
+
+
+def __log_span_errors(
+    tmp_log_store: List[str],
+    record_ids: List[str],
+    starts: np.ndarray,
+    ends: np.ndarray,
+    max_tokens: np.ndarray,
+    start_exceeds: np.ndarray,
+    end_exceeds: np.ndarray,
+    no_length: np.ndarray,
+) -> bool:
+    error_idx = np.flatnonzero(start_exceeds | end_exceeds | no_length)
+    for idx in error_idx:
+        record_id = record_ids[idx]
+        start, end, max_token = starts[idx], ends[idx], max_tokens[idx]
+        if start_exceeds[idx]:
+            tmp_log_store.append(
+                __log_prefix()
+                + f" token start {{{start}}} exceeds record {{{record_id}}} max token {{{max_token}}}"
+            )
+        if end_exceeds[idx]:
+            tmp_log_store.append(
+                __log_prefix()
+                + f" token end {{{end}}} exceeds record {{{record_id}}} max token {{{max_token}}}"
+            )
+        if no_length[idx]:
+            tmp_log_store.append(
+                __log_prefix()
+                + f" token span without length detected. start {{{start}}}, end {{{end}}} -> length {start - end} record {{{record_id}}}"
+            )
+    return len(error_idx) > 0
+
+
+def __check_label_errors(
+    label_names: Set[str],
+    labels_in_task: Dict[str, str],
+    tmp_log_store: List[str],
+    labels_valid: Dict[str, bool],
+) -> bool:
+    for label_name in label_names:
+        if label_name not in labels_valid:
+            if label_name not in labels_in_task:
+                tmp_log_store.append(
+                    __log_prefix()
+                    + f" Provided label {{{label_name}}} couldn't be found for this task"
+                )
+                labels_valid[label_name] = False
+            else:
+                labels_valid[label_name] = True
+    return not all(labels_valid[label_name] for label_name in label_names)
+
+
+def __log_prefix() -> str:
+    return datetime.now(__tz).strftime("%Y-%m-%dT%H:%M:%S")
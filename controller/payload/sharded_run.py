@@ -0,0 +1,130 @@
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+import pytz
+
+from db.business_objects import general, record
+from db.business_objects.payload import update_progress
+from db.business_objects.tokenization import get_doc_bin_table_to_json
+from db.models import InformationSourcePayload
+from s3 import controller as s3
+from util import db_connection, exec_env_pool, notification
+from util.log_stream import NOTIFY_INTERVAL, LogStream
+
+# containers per labeling function run, 1 disables sharding
+SHARD_COUNT = int(os.getenv("PAYLOAD_SHARDS", 1))
+# small runs aren't split since every shard pays for a container start and its own docbin
+MIN_RECORDS_PER_SHARD = int(os.getenv("PAYLOAD_SHARD_MIN_RECORDS", 5000))
+
+__tz = pytz.timezone("Europe/Berlin")
+
+
+def split_records(
+    project_id: str, record_ids: Optional[List[str]] = None
+) -> List[List[str]]:
+    """
+    Splits the records of a run into ranges of record ids, one per shard.
+    An empty list means the run isn't sharded.
+    """
+    if SHARD_COUNT <= 1:
+        return []
+    if record_ids is None:
+        record_ids = __get_tokenized_record_ids(project_id)
+    else:
+        record_ids = sorted(record_ids)
+    shard_count = min(SHARD_COUNT, len(record_ids) // MIN_RECORDS_PER_SHARD)
+    if shard_count <= 1:
+        return []
+    shard_size = math.ceil(len(record_ids) / shard_count)
+    return [
+        record_ids[idx : idx + shard_size]
+        for idx in range(0, len(record_ids), shard_size)
+    ]
+
+
+def run_shards(
+    information_source_payload: InformationSourcePayload,
+    project_id: str,
+    org_id: str,
+    image: str,
+    shards: List[List[str]],
+    build_command: Callable[[str, str], List[str]],
+    log_stream: LogStream,
+) -> Tuple[List[str], List[str]]:
+    """
+    Runs one exec env container per shard concurrently. build_command receives the
+    object names of the shard docbin and the shard result and returns the container command.
+    The logs of all shards go to log_stream in the order they are written.
+    Returns the container logs and the result object names of all shards.
+    """
+    payload_id = str(information_source_payload.id)
+    source_id = str(information_source_payload.source_id)
+    missing_columns = record.get_missing_columns_str(project_id)
+    shard_count = len(shards)
+    doc_bin_names = [f"{payload_id}_doc_bin_{idx}.json" for idx in range(shard_count)]
+    result_names = [f"{payload_id}_shard_{idx}" for idx in range(shard_count)]
+
+    def run_shard(idx: int) -> None:
+        command = build_command(doc_bin_names[idx], result_names[idx])
+        for line in exec_env_pool.run(image, command, project_id):
+            log_stream.add(line)
+
+    try:
+        with ThreadPoolExecutor(max_workers=shard_count) as executor:
+            futures = {}
+            for idx, shard_record_ids in enumerate(shards):
+                # docbins are built one after another while earlier shards already run
+                s3.put_object(
+                    org_id,
+                    project_id + "/" + doc_bin_names[idx],
+                    get_doc_bin_table_to_json(
+                        project_id=project_id,
+                        missing_columns=missing_columns,
+                        record_ids=shard_record_ids,
+                    ),
+                )
+                futures[executor.submit(run_shard, idx)] = idx
+
+            finished = 0
+            pending = set(futures)
+            while pending:
+                # shards only collect their lines, persisting happens in this thread
+                done, pending = wait(
+                    pending, timeout=NOTIFY_INTERVAL, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    idx = futures[future]
+                    future.result()
+                    finished += 1
+                    log_stream.add(
+                        datetime.now(__tz).strftime("%Y-%m-%dT%H:%M:%S")
+                        + f" Shard {idx + 1}/{shard_count} finished on {len(shards[idx])} records."
+                    )
+                    progress = finished / shard_count
+                    update_progress(project_id, payload_id, progress)
+                    general.commit()
+                    notification.send_organization_update(
+                        project_id,
+                        f"payload_progress:{source_id}:{payload_id}:{progress}",
+                    )
+                log_stream.flush()
+    finally:
+        for doc_bin_name in doc_bin_names:
+            s3.delete_object(org_id, project_id + "/" + doc_bin_name)
+
+    log_stream.flush(force=True)
+    return log_stream.get_lines(), [
+        project_id + "/" + result_name for result_name in result_names
+    ]
+
+
+def __get_tokenized_record_ids(project_id: str) -> List[str]:
+    rows = db_connection.execute(
+        "SELECT record_id::text FROM record_tokenized WHERE project_id = %s ORDER BY record_id",
+        (project_id,),
+        fetch=True,
+    )
+    return [row[0] for row in rows]
@@ -2,6 +2,7 @@ import json
 from typing import Dict, List, Optional
 
 from controller.transfer import project_transfer_manager as handler
+from controller.attribute import manager as attribute_manager
 from controller.labeling_access_link import manager as link_manager
 from db import Project, enums
 from db.business_objects import (
@@ -81,6 +82,7 @@ def update_project(
 def delete_project(project_id: str) -> None:
     org_id = organization.get_id_by_project_id(project_id)
     project.delete_by_id(project_id, with_commit=True)
+    attribute_manager.drop_search_indexes(project_id)
     daemon.run(s3.archive_bucket, org_id, project_id + "/")
 
 
@@ -93,6 +95,7 @@ def import_sample_project(user_id: str, organization_id: str, name: str) -> Proj
     data_slice.update_slice_type_manual_for_project(
         str(project_item.id), with_commit=True
     )
+    attribute_manager.update_search_indexes(str(project_item.id))
 
     return project_item
 
@@ -1,12 +1,16 @@
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Optional
 
 from graphql_api.types import ExtendedSearch
 from db import Record, Attribute
-from db.business_objects import general, record, user_session
+from db.business_objects import general, record
 from service.search import search
 
 from controller.record import neural_search_connector
 
+# large id lists are bound as one array, so thousands of neighbours are fine
+SIMILARITY_SEARCH_LIMIT = int(os.getenv("SIMILARITY_SEARCH_LIMIT", 1000))
+
 
 def get_record(project_id: str, record_id: str) -> Record:
     return record.get(project_id, record_id)
@@ -17,35 +21,20 @@ def get_records_by_similarity_search(
     user_id: str,
     embedding_id: str,
     record_id: str,
+    limit: int = 100,
+    offset: int = 0,
+    cursor: Optional[str] = None,
 ) -> ExtendedSearch:
     record_ids = neural_search_connector.request_most_similar_record_ids(
-        project_id, embedding_id, record_id, 100
+        project_id, embedding_id, record_id, SIMILARITY_SEARCH_LIMIT
     )
     if not len(record_ids):
         record_ids = [record_id]
-    filter_data = [
-        {
-            "RELATION": "NONE",
-            "NEGATION": False,
-            "TARGET_TABLE": "RECORD",
-            "TARGET_COLUMN": "ID",
-            "OPERATOR": "IN",
-            "VALUES": record_ids,
-        }
-    ]
-    extended_search = get_records_by_extended_search(
-        project_id, user_id, filter_data, 100, 0
-    )
-    # sort record list in extended search in the same ordes as the record_ids returned by the neural search
-    extended_search.record_list.sort(key=lambda x: record_ids.index(str(x["id"])))
-
-    # to ensure the same order of the labeling session
-    user_session.set_record_ids(
-        project_id, extended_search.session_id, record_ids, with_commit=True
+    # ordered like the neural search results, the labeling session uses the same order
+    return search.resolve_records_by_id_list(
+        user_id, project_id, record_ids, limit, offset, cursor
     )
 
-    return extended_search
-
 
 def get_records_by_composite_keys(
     project_id: str,
@@ -69,9 +58,11 @@ def get_records_by_static_slice(
     order_by: Dict[str, str],
     limit: int,
     offset: int,
+    cursor: Optional[str] = None,
+    profile: bool = False,
 ) -> ExtendedSearch:
     return search.resolve_records_by_static_slice(
-        user_id, project_id, slice_id, order_by, limit, offset
+        user_id, project_id, slice_id, order_by, limit, offset, cursor, profile
     )
 
 
@@ -81,9 +72,21 @@ def get_records_by_extended_search(
     filter_data: List[Dict[str, Any]],
     limit: int,
     offset: int,
+    cursor: Optional[str] = None,
+    count_mode: Optional[str] = None,
+    profile: bool = False,
+    facets: bool = False,
 ) -> ExtendedSearch:
     return search.resolve_extended_search(
-        project_id, user_id, filter_data, limit, offset
+        project_id,
+        user_id,
+        filter_data,
+        limit,
+        offset,
+        cursor,
+        count_mode,
+        profile,
+        facets,
     )
 
 
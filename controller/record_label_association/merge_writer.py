@@ -0,0 +1,172 @@
+import csv
+import io
+from typing import Any, List, Optional, Set
+
+RLA_COLUMNS = [
+    "id",
+    "project_id",
+    "record_id",
+    "labeling_task_label_id",
+    "source_id",
+    "source_type",
+    "return_type",
+    "confidence",
+    "created_at",
+    "created_by",
+]
+RLA_TOKEN_COLUMNS = [
+    "id",
+    "project_id",
+    "record_label_association_id",
+    "token_index",
+    "is_beginning_token",
+]
+# above this the changed records aren't collected and consumers treat every record as changed
+MAX_CHANGED_RECORDS = 100000
+
+
+def create_staging(cursor: Any) -> None:
+    """
+    The merge writer works on a raw psycopg2 cursor inside the transaction of the caller.
+    New associations are staged first, merge_source then diffs them against the existing
+    associations of the source so unchanged rows aren't touched.
+    """
+    cursor.execute(
+        """
+        CREATE TEMP TABLE tmp_rla_stage (LIKE record_label_association INCLUDING DEFAULTS) ON COMMIT DROP;
+        CREATE TEMP TABLE tmp_rla_token_stage (LIKE record_label_association_token INCLUDING DEFAULTS) ON COMMIT DROP;
+        """
+    )
+
+
+def stage(cursor: Any, rla_rows: List[List[Any]], token_rows: List[List[Any]]) -> None:
+    __copy_rows(cursor, "tmp_rla_stage", RLA_COLUMNS, rla_rows)
+    __copy_rows(cursor, "tmp_rla_token_stage", RLA_TOKEN_COLUMNS, token_rows)
+
+
+def merge_source(
+    cursor: Any,
+    project_id: str,
+    source_id: str,
+    record_ids: Optional[List[str]] = None,
+    with_tokens: bool = False,
+) -> Optional[Set[str]]:
+    """
+    Replaces the associations of the source (limited to record_ids if given) with the staged ones.
+    Associations are matched by record, label and token span. Matches only get their confidence
+    updated, unmatched existing ones are deleted and unmatched staged ones inserted.
+    Returns the ids of records whose associations changed or None if there are too many to collect.
+    """
+    span_select = (
+        "MIN(t.token_index) AS token_start, MAX(t.token_index) AS token_end"
+        if with_tokens
+        else "NULL::integer AS token_start, NULL::integer AS token_end"
+    )
+    span_group = (
+        "MIN(t.token_index), MAX(t.token_index)" if with_tokens else "NULL, NULL"
+    )
+    record_filter = (
+        "AND r.record_id = ANY(%s::uuid[])" if record_ids is not None else ""
+    )
+    params = [project_id, source_id]
+    if record_ids is not None:
+        params.append(record_ids)
+
+    cursor.execute(
+        f"""
+        CREATE TEMP TABLE tmp_rla_existing ON COMMIT DROP AS
+        SELECT
+            r.id,
+            r.record_id,
+            r.labeling_task_label_id,
+            {span_select},
+            ROW_NUMBER() OVER (PARTITION BY r.record_id, r.labeling_task_label_id, {span_group} ORDER BY r.id) AS rn
+        FROM record_label_association r
+        {"LEFT JOIN record_label_association_token t ON t.record_label_association_id = r.id" if with_tokens else ""}
+        WHERE r.project_id = %s AND r.source_id = %s {record_filter}
+        GROUP BY r.id, r.record_id, r.labeling_task_label_id;
+
+        CREATE TEMP TABLE tmp_rla_staged ON COMMIT DROP AS
+        SELECT
+            r.id,
+            r.record_id,
+            r.labeling_task_label_id,
+            r.confidence,
+            {span_select},
+            ROW_NUMBER() OVER (PARTITION BY r.record_id, r.labeling_task_label_id, {span_group} ORDER BY r.id) AS rn
+        FROM tmp_rla_stage r
+        {"LEFT JOIN tmp_rla_token_stage t ON t.record_label_association_id = r.id" if with_tokens else ""}
+        GROUP BY r.id, r.record_id, r.labeling_task_label_id, r.confidence;
+
+        CREATE TEMP TABLE tmp_rla_match ON COMMIT DROP AS
+        SELECT e.id AS existing_id, s.id AS staged_id, s.confidence
+        FROM tmp_rla_existing e
+        INNER JOIN tmp_rla_staged s
+            ON e.record_id = s.record_id
+            AND e.labeling_task_label_id = s.labeling_task_label_id
+            AND COALESCE(e.token_start, -1) = COALESCE(s.token_start, -1)
+            AND COALESCE(e.token_end, -1) = COALESCE(s.token_end, -1)
+            AND e.rn = s.rn;
+
+        CREATE TEMP TABLE tmp_rla_changed (record_id UUID) ON COMMIT DROP;
+
+        WITH updated AS (
+            UPDATE record_label_association r
+            SET confidence = m.confidence
+            FROM tmp_rla_match m
+            WHERE r.id = m.existing_id AND r.confidence IS DISTINCT FROM m.confidence
+            RETURNING r.record_id
+        )
+        INSERT INTO tmp_rla_changed SELECT record_id FROM updated;
+
+        WITH deleted AS (
+            DELETE FROM record_label_association r
+            USING tmp_rla_existing e
+            WHERE r.id = e.id
+            AND NOT EXISTS (SELECT 1 FROM tmp_rla_match m WHERE m.existing_id = e.id)
+            RETURNING r.record_id
+        )
+        INSERT INTO tmp_rla_changed SELECT record_id FROM deleted;
+
+        WITH inserted AS (
+            INSERT INTO record_label_association ({", ".join(RLA_COLUMNS)})
+            SELECT {", ".join("s." + c for c in RLA_COLUMNS)}
+            FROM tmp_rla_stage s
+            WHERE NOT EXISTS (SELECT 1 FROM tmp_rla_match m WHERE m.staged_id = s.id)
+            RETURNING record_id
+        )
+        INSERT INTO tmp_rla_changed SELECT record_id FROM inserted;
+        """,
+        params,
+    )
+    if with_tokens:
+        cursor.execute(
+            f"""
+            INSERT INTO record_label_association_token ({", ".join(RLA_TOKEN_COLUMNS)})
+            SELECT {", ".join("t." + c for c in RLA_TOKEN_COLUMNS)}
+            FROM tmp_rla_token_stage t
+            WHERE NOT EXISTS (SELECT 1 FROM tmp_rla_match m WHERE m.staged_id = t.record_label_association_id)
+            """
+        )
+    cursor.execute(
+        "SELECT DISTINCT record_id::text FROM tmp_rla_changed LIMIT %s",
+        (MAX_CHANGED_RECORDS + 1,),
+    )
+    changed_record_ids = {row[0] for row in cursor.fetchall()}
+    if len(changed_record_ids) > MAX_CHANGED_RECORDS:
+        return None
+    return changed_record_ids
+
+
+def __copy_rows(
+    cursor: Any, table_name: str, columns: List[str], rows: List[List[Any]]
+) -> None:
+    if not rows:
+        return
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+        buffer,
+    )
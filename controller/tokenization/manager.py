@@ -7,7 +7,8 @@ from graphql_api.types import TokenizedRecord, TokenizedAttribute, TokenWrapper
 from db import enums, Record
 from db.business_objects import tokenization, attribute
 from db.business_objects.record import __get_tokenized_record
-from util import daemon
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass, JobPriority
 from controller.tokenization import tokenization_service
 from controller.tokenization.tokenization_service import (
     request_tokenize_project,
@@ -81,15 +82,18 @@ def delete_docbins(project_id: str, records: List[Record]) -> None:
 
 
 def start_record_tokenization(project_id: str, record_id: str) -> None:
-    daemon.run(
+    job_queue.enqueue(
+        JobClass.TOKENIZATION,
         request_tokenize_record,
         project_id,
         record_id,
+        priority=JobPriority.HIGH,
     )
 
 
 def start_project_tokenization(project_id: str, user_id: str) -> None:
-    daemon.run(
+    job_queue.enqueue(
+        JobClass.TOKENIZATION,
         request_tokenize_project,
         project_id,
         user_id,
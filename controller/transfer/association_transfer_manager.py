@@ -1,19 +1,17 @@
 import traceback
+import uuid
+from datetime import datetime
 from typing import Dict, Any, List
 from controller.labeling_task import manager as labeling_task_manager
 from controller.attribute import manager as attribute_manager
 from controller.record import manager as record_manager
-from util import notification
+from util import db_connection, notification
 
 
 from controller.information_source import manager as information_source_manager
 from db import enums
-from db.business_objects import (
-    general,
-    labeling_task_label,
-    record_label_association,
-)
-from db.models import RecordLabelAssociation
+from db.business_objects import labeling_task_label
+from controller.record_label_association import merge_writer
 from controller.weak_supervision import weak_supervision_service as weak_supervision
 
 
@@ -69,38 +67,43 @@ def import_associations(
         attribute_list,
         enums.RecordCategory.SCALE.value,  # we currently don't use TEST any more
     )
-    record_ids = [record.id for record in list(records.values())]
-
-    record_label_associations = []
+    record_ids = [str(record.id) for record in list(records.values())]
 
     label_options = labeling_task_label.get_all_by_task_id(project_id, labeling_task.id)
     label_id_by_name_dict = {label.name: label.id for label in label_options}
+    created_at = datetime.now()
+    rla_rows = []
     for record_id, association in zip(record_ids, associations):
         label_name, confidence = association
-        record_label_associations.append(
-            RecordLabelAssociation(
-                project_id=project_id,
-                record_id=record_id,
-                labeling_task_label_id=label_id_by_name_dict[label_name],
-                source_type=enums.LabelSource.MODEL_CALLBACK.value,
-                source_id=information_source.id,
-                return_type=enums.InformationSourceReturnType.RETURN.value,
-                confidence=confidence,
-                created_by=user_id,
-            )
+        rla_rows.append(
+            [
+                uuid.uuid4(),
+                project_id,
+                record_id,
+                label_id_by_name_dict[label_name],
+                information_source.id,
+                enums.LabelSource.MODEL_CALLBACK.value,
+                enums.InformationSourceReturnType.RETURN.value,
+                confidence,
+                created_at,
+                user_id,
+            ]
         )
 
-    record_label_association.delete_by_source_id_and_record_ids(
-        project_id, information_source.id, record_ids
-    )
-    general.add_all(record_label_associations, with_commit=True)
-    general.commit()
-
-    try:
-        weak_supervision.calculate_stats_after_source_run_with_debounce(
-            project_id, information_source.id, user_id
+    # only associations that differ from the existing ones of the given records are written
+    with db_connection.transaction() as cursor:
+        merge_writer.create_staging(cursor)
+        merge_writer.stage(cursor, rla_rows, [])
+        changed_record_ids = merge_writer.merge_source(
+            cursor, project_id, str(information_source.id), record_ids
         )
-    except:
-        print(traceback.format_exc())
 
-    return len(record_label_associations)
+    if changed_record_ids is None or len(changed_record_ids) > 0:
+        try:
+            weak_supervision.calculate_stats_after_source_run_with_debounce(
+                project_id, information_source.id, user_id
+            )
+        except:
+            print(traceback.format_exc())
+
+    return len(rla_rows)
@@ -1,4 +1,4 @@
-from typing import Tuple, List, Union, Dict
+from typing import Tuple, List, Optional, Union, Dict
 from controller.misc.config_service import get_config_value
 
 from controller.transfer import util as transfer_util
@@ -14,176 +14,218 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
-def run_checks(df: pd.DataFrame, project_id, user_id) -> None:
-    guard = False
-    errors = {}
-    columns = df.columns
+class ImportChecks:
+    """
+    Checks an import chunk by chunk, so the file never needs to be loaded as a whole.
+    The column checks run with the first chunk, row counts and composite keys are
+    carried over to the following ones.
+    """
 
-    # check if columns are unique
-    columns_duplicated = columns.duplicated()
-    duplicated_columns = [
-        column for idx, column in enumerate(columns) if columns_duplicated[idx]
-    ]
-    if duplicated_columns:
-        guard = True
+    def __init__(self, project_id: str, user_id: str) -> None:
+        self.project_id = project_id
+        self.user_id = user_id
+        self.limits = get_config_value("limit_checks")
+        self.row_count = 0
+        self.update_count = 0
+        self.current_count = None
+        self.existing_keys = None
+        self.typed_existing_keys = {}
+        self.primary_key_names = None
+        self.seen_keys = set()
 
-        notification = create_notification(
-            NotificationType.DUPLICATED_COLUMNS,
-            user_id,
-            project_id,
-            duplicated_columns,
-        )
+    def check(self, df: pd.DataFrame) -> None:
+        errors = {}
+        if self.current_count is None:
+            self.current_count = record.count(self.project_id) or 0
+            self.existing_keys = (
+                load_existing_keys(self.project_id)
+                if self.current_count
+                else (None, None)
+            )
+            errors.update(self.__check_columns(df))
+        errors.update(self.__check_limits(df))
+        if not errors:
+            errors.update(self.__check_composite_keys(df))
+        if errors:
+            logger.error(errors)
+            raise Exception(str(errors))
 
-        errors["DuplicatedKey"] = notification.message
-    # split columns into categories
-    attributes = []
-    target_attributes = []
-    task_names = []
-    for column in columns:
-        if column.startswith("__"):
-            task_names.append(infer_labeling_task_name(column))
-        elif "__" in column:
-            target_attributes.append(transfer_util.infer_attribute(column))
-            task_names.append(infer_labeling_task_name(column))
-        else:
-            attributes.append(transfer_util.infer_attribute(column))
-
-    # check duplicated task names
-    duplicated_task_names = set()
-    task_names_set = set()
-    for task_name in task_names:
-
-        if task_name in task_names_set:
-            duplicated_task_names.add(task_name)
-        else:
-            task_names_set.add(task_name)
-
-    if duplicated_task_names != set():
-        guard = True
-        notification = create_notification(
-            NotificationType.DUPLICATED_TASK_NAMES,
-            user_id,
-            project_id,
-            list(duplicated_task_names),
-        )
-        errors["DuplicatedTaskNames"] = notification.message
-
-    # check attribute equality
-    attribute_entities = attribute.get_all(project_id)
-    attribute_names = [attribute_item.name for attribute_item in attribute_entities]
-    differences = set(attribute_names).difference(set(attributes))
-    if differences:
-        guard = True
-        notification = create_notification(
-            NotificationType.DIFFERENTIAL_ATTRIBUTES,
-            user_id,
-            project_id,
-            list(differences),
-        )
-        errors["DifferentialAttributes"] = notification.message
+    def __check_columns(self, df: pd.DataFrame) -> Dict[str, str]:
+        errors = {}
+        columns = df.columns
 
-    # check target attributes exists or are in file
-    non_existing_targets = (
-        set(target_attributes)
-        .difference(set(attributes))
-        .difference(set(attribute_names))
-    )
+        # check if columns are unique
+        columns_duplicated = columns.duplicated()
+        duplicated_columns = [
+            column for idx, column in enumerate(columns) if columns_duplicated[idx]
+        ]
+        if duplicated_columns:
+            notification = create_notification(
+                NotificationType.DUPLICATED_COLUMNS,
+                self.user_id,
+                self.project_id,
+                duplicated_columns,
+            )
+            errors["DuplicatedKey"] = notification.message
+        # split columns into categories
+        attributes = []
+        target_attributes = []
+        task_names = []
+        for column in columns:
+            if column.startswith("__"):
+                task_names.append(infer_labeling_task_name(column))
+            elif "__" in column:
+                target_attributes.append(transfer_util.infer_attribute(column))
+                task_names.append(infer_labeling_task_name(column))
+            else:
+                attributes.append(transfer_util.infer_attribute(column))
 
-    if non_existing_targets != set():
-        guard = True
-        notification = create_notification(
-            NotificationType.NON_EXISTENT_TARGET_ATTRIBUTE,
-            user_id,
-            project_id,
-            list(non_existing_targets),
-        )
-        errors["NonExistentTargetAttributes"] = notification.message
-
-    # check if composite key constraint is not hurt
-    primary_key_names = [
-        attribute_item.name
-        for attribute_item in attribute_entities
-        if attribute_item.is_primary_key
-    ]
-    if primary_key_names:
-        concatenated_primary_keys = (
-            df[primary_key_names].astype(str).apply("-".join, axis=1)
-        )
-        duplicated_composite_keys = df.loc[concatenated_primary_keys.duplicated(), :]
-        if not duplicated_composite_keys.empty:
-            guard = True
+        # check duplicated task names
+        duplicated_task_names = set()
+        task_names_set = set()
+        for task_name in task_names:
+            if task_name in task_names_set:
+                duplicated_task_names.add(task_name)
+            else:
+                task_names_set.add(task_name)
+
+        if duplicated_task_names != set():
             notification = create_notification(
-                NotificationType.DUPLICATED_COMPOSITE_KEY, user_id, project_id
+                NotificationType.DUPLICATED_TASK_NAMES,
+                self.user_id,
+                self.project_id,
+                list(duplicated_task_names),
             )
-            errors["DuplicatedCompositeKeys"] = notification.message
-    if guard:
-        logger.error(errors)
-        raise Exception(str(errors))
-
-
-def run_limit_checks(df: pd.DataFrame, project_id, user_id) -> None:
-    limits = get_config_value("limit_checks")
-    guard = False
-    errors = {}
-    if df.shape[0] > limits["max_rows"]:
-        guard = True
-        notification = create_notification(
-            NotificationType.NEW_ROWS_EXCEED_MAXIMUM_LIMIT,
-            user_id,
-            project_id,
-            df.shape[0],
-            limits["max_rows"],
+            errors["DuplicatedTaskNames"] = notification.message
+
+        # check attribute equality
+        attribute_entities = attribute.get_all(self.project_id)
+        attribute_names = [attribute_item.name for attribute_item in attribute_entities]
+        differences = set(attribute_names).difference(set(attributes))
+        if differences:
+            notification = create_notification(
+                NotificationType.DIFFERENTIAL_ATTRIBUTES,
+                self.user_id,
+                self.project_id,
+                list(differences),
+            )
+            errors["DifferentialAttributes"] = notification.message
+
+        # check target attributes exists or are in file
+        non_existing_targets = (
+            set(target_attributes)
+            .difference(set(attributes))
+            .difference(set(attribute_names))
         )
-        errors["MaxRows"] = notification.message
-    else:
-        count_current_records = record.count(project_id)
-        if count_current_records:
-            updating = get_update_amount(df, project_id)
-            if count_current_records - updating + df.shape[0] > limits["max_rows"]:
-                guard = True
+
+        if non_existing_targets != set():
+            notification = create_notification(
+                NotificationType.NON_EXISTENT_TARGET_ATTRIBUTE,
+                self.user_id,
+                self.project_id,
+                list(non_existing_targets),
+            )
+            errors["NonExistentTargetAttributes"] = notification.message
+
+        self.primary_key_names = [
+            attribute_item.name
+            for attribute_item in attribute_entities
+            if attribute_item.is_primary_key
+        ]
+
+        if df.shape[1] > self.limits["max_cols"]:
+            notification = create_notification(
+                NotificationType.COLS_EXCEED_MAXIMUM_LIMIT,
+                self.user_id,
+                self.project_id,
+                df.shape[1],
+                self.limits["max_cols"],
+            )
+            errors["MaxCols"] = notification.message
+        return errors
+
+    def __check_limits(self, df: pd.DataFrame) -> Dict[str, str]:
+        errors = {}
+        self.row_count += df.shape[0]
+        if self.row_count > self.limits["max_rows"]:
+            notification = create_notification(
+                NotificationType.NEW_ROWS_EXCEED_MAXIMUM_LIMIT,
+                self.user_id,
+                self.project_id,
+                self.row_count,
+                self.limits["max_rows"],
+            )
+            errors["MaxRows"] = notification.message
+        elif self.current_count:
+            self.update_count += self.__count_updates(df)
+            total_count = self.current_count - self.update_count + self.row_count
+            if total_count > self.limits["max_rows"]:
                 notification = create_notification(
                     NotificationType.TOTAL_ROWS_EXCEED_MAXIMUM_LIMIT,
-                    user_id,
-                    project_id,
-                    count_current_records - updating + df.shape[0],
-                    limits["max_rows"],
+                    self.user_id,
+                    self.project_id,
+                    total_count,
+                    self.limits["max_rows"],
                 )
                 errors["MaxRows"] = notification.message
 
-    if df.shape[1] > limits["max_cols"]:
-        guard = True
-        notification = create_notification(
-            NotificationType.COLS_EXCEED_MAXIMUM_LIMIT,
-            user_id,
-            project_id,
-            df.shape[1],
-            limits["max_cols"],
+        max_length_dict = dict(
+            [
+                (v, df[v].apply(lambda r: len(str(r)) if r != None else 0).max())
+                for v in df.columns.values
+            ]
         )
-        errors["MaxCols"] = notification.message
-    max_length_dict = dict(
-        [
-            (v, df[v].apply(lambda r: len(str(r)) if r != None else 0).max())
-            for v in df.columns.values
-        ]
-    )
+        for key in max_length_dict:
+            if max_length_dict[key] > self.limits["max_char_count"]:
+                notification = create_notification(
+                    NotificationType.COL_EXCEED_MAXIMUM_LIMIT,
+                    self.user_id,
+                    self.project_id,
+                    key,
+                    max_length_dict[key],
+                    self.limits["max_char_count"],
+                )
+                errors["MaxLength"] = notification.message
+        return errors
 
-    for key in max_length_dict:
-        if max_length_dict[key] > limits["max_char_count"]:
-            guard = True
-            notification = create_notification(
-                NotificationType.COL_EXCEED_MAXIMUM_LIMIT,
-                user_id,
-                project_id,
-                key,
-                max_length_dict[key],
-                limits["max_char_count"],
-            )
-            errors["MaxLength"] = notification.message
+    def __count_updates(self, df: pd.DataFrame) -> int:
+        sql_df, keys = self.existing_keys
+        if sql_df is None:
+            return 0
+        for column in keys:
+            if not column in df.columns:
+                return 0
+        # the existing keys are converted once per combination of column types
+        type_names = tuple(df[column].dtype.name for column in keys)
+        typed_df = self.typed_existing_keys.get(type_names)
+        if typed_df is None:
+            typed_df = sql_df.copy()
+            for column, type_name in zip(keys, type_names):
+                if type_name in ["int64", "float64", "bool"]:
+                    typed_df[column] = typed_df[column].astype(type_name)
+            self.typed_existing_keys[type_names] = typed_df
+        return pd.merge(left=df[keys], right=typed_df, on=keys).shape[0]
 
-    if guard:
-        # no need to check further
-        logger.error(errors)
-        raise Exception(str(errors))
+    def __check_composite_keys(self, df: pd.DataFrame) -> Dict[str, str]:
+        # only hashes of the keys are kept, the row limit bounds their number
+        if not self.primary_key_names or df.empty:
+            return {}
+        concatenated_primary_keys = (
+            df[self.primary_key_names].astype(str).apply("-".join, axis=1)
+        )
+        duplicated = False
+        for key in concatenated_primary_keys:
+            key_hash = hash(key)
+            if key_hash in self.seen_keys:
+                duplicated = True
+                break
+            self.seen_keys.add(key_hash)
+        if not duplicated:
+            return {}
+        notification = create_notification(
+            NotificationType.DUPLICATED_COMPOSITE_KEY, self.user_id, self.project_id
+        )
+        return {"DuplicatedCompositeKeys": notification.message}
 
 
 def build_df_sql(project_id: str) -> Tuple[str, List[str]]:
@@ -226,17 +268,10 @@ def string_to_import_option_dict(
     return import_options
 
 
-def get_update_amount(df: pd.DataFrame, project_id: str) -> int:
-    updating = 0
+def load_existing_keys(
+    project_id: str,
+) -> Tuple[Optional[pd.DataFrame], Optional[List[str]]]:
     sql, keys = build_df_sql(project_id)
-    if sql:
-        sql_df = pd.read_sql(sql, con=general.get_bind())
-        for column in keys:
-            if not column in df.columns:
-                return 0
-            type_name = df[column].dtype.name
-            if type_name in ["int64", "float64", "bool"]:
-                sql_df[column] = sql_df[column].astype(type_name)
-
-        updating = pd.merge(left=df[keys], right=sql_df, on=keys).shape[0]
-    return updating
+    if not sql:
+        return None, None
+    return pd.read_sql(sql, con=general.get_bind()), keys
@@ -3,6 +3,7 @@ from db import UploadTask, enums
 from db.business_objects import knowledge_term, organization
 from db.business_objects import general
 from controller.upload_task import manager as upload_task_manager
+from controller.knowledge_base import artifact_cache
 from s3 import controller as s3
 import pandas as pd
 
@@ -50,6 +51,7 @@ def import_knowledge_base_file(project_id: str, task: UploadTask) -> None:
     )
     task.state = enums.UploadStates.DONE.value
     general.commit()
+    artifact_cache.bump_version(project_id)
 
 
 def import_exported_file(
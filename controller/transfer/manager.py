@@ -47,6 +47,7 @@ def get_upload_credentials_and_id(
 def import_records_from_file(project_id: str, task: UploadTask) -> None:
     import_file(project_id, task)
     __check_and_add_running_id(project_id, str(task.user_id))
+    attribute_manager.update_search_indexes(project_id)
 
 
 def import_records_from_json(
@@ -92,6 +93,7 @@ def import_project(project_id: str, task: UploadTask) -> None:
     import_file_by_task(project_id, task)
     record_label_association.update_is_valid_manual_label_for_project(project_id)
     data_slice.update_slice_type_manual_for_project(project_id, with_commit=True)
+    attribute_manager.update_search_indexes(project_id)
 
 
 def import_knowledge_base(project_id: str, task: UploadTask) -> None:
@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, Any, Optional, Tuple, List
+from typing import Dict, Any, Iterable, Optional, Tuple, List
 
 import pandas as pd
 
@@ -24,7 +24,7 @@ from s3 import controller as s3
 from db import enums, events, UploadTask, Attribute
 from util import category
 from util import notification
-from controller.transfer.util import convert_to_record_dict
+from controller.transfer.util import iterate_record_chunks
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -42,14 +42,16 @@ def extract_first_zip_file(local_file_name: str) -> Dict[str, Any]:
 def import_records_and_rlas(
     project_id: str,
     user_id: str,
-    data: List,
+    chunks: Iterable[Tuple[List[Dict[str, Any]], float]],
     upload_task: Optional[UploadTask] = None,
     record_category: str = enums.RecordCategory.SCALE.value,
-):
-    CHUNK_SIZE = 500
-    chunks = [data[x : x + CHUNK_SIZE] for x in range(0, len(data), CHUNK_SIZE)]
-    chunks_count = len(chunks)
-    for idx, chunk in enumerate(chunks):
+) -> int:
+    """
+    Writes every chunk before the next one is parsed, so only one chunk is held in memory.
+    Returns the number of imported records.
+    """
+    number_records = 0
+    for idx, (chunk, progress) in enumerate(chunks):
         if upload_task is not None:
             logger.debug(
                 upload_task_manager.get_upload_task_message(
@@ -63,7 +65,7 @@ def import_records_and_rlas(
             labels_data,
             tasks_data,
         ) = split_record_data_and_label_data(chunk)
-        
+
         if idx == 0:
             create_attributes_and_get_text_attributes(project_id, records_data)
             primary_keys = attribute.get_primary_keys(project_id)
@@ -79,12 +81,13 @@ def import_records_and_rlas(
             category=record_category,
             primary_keys=primary_keys,
         )
+        number_records += len(chunk)
 
         if upload_task is not None:
-            progress = ((idx + 1) / chunks_count) * 100
             upload_task_manager.update_task(
-                project_id, upload_task.id, progress=progress
+                project_id, upload_task.id, progress=min(progress, 100.0)
             )
+    return number_records
 
 
 def import_file(project_id: str, upload_task: UploadTask) -> None:
@@ -115,16 +118,15 @@ def import_file(project_id: str, upload_task: UploadTask) -> None:
     )
     record_category = category.infer_category(upload_task.file_name)
 
-    data = convert_to_record_dict(
+    chunks = iterate_record_chunks(
         file_type,
         tmp_file_name,
         upload_task.user_id,
         upload_task.file_import_options,
         project_id,
     )
-    number_records = len(data)
-    import_records_and_rlas(
-        project_id, upload_task.user_id, data, upload_task, record_category
+    number_records = import_records_and_rlas(
+        project_id, upload_task.user_id, chunks, upload_task, record_category
     )
 
     upload_task_manager.update_upload_task_to_finished(upload_task)
@@ -1,10 +1,11 @@
 import datetime
-from typing import List, Dict, Tuple, Union, Optional
+from typing import Any, Callable, Iterator, List, Dict, Tuple, Union, Optional
 
 from db import enums
-from .checks import check_argument_allowed, run_checks, run_limit_checks
+from .checks import check_argument_allowed, ImportChecks
 from db.models import UploadTask, Attribute
 import pandas as pd
+import numpy as np
 from util.notification import create_notification
 from db.enums import NotificationType
 import os
@@ -15,6 +16,9 @@ from db.business_objects import export
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# rows per chunk, every chunk is parsed, checked and written before the next one is read
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 500))
+
 
 def get_upload_task_message(
     task: UploadTask,
@@ -38,13 +42,18 @@ def get_upload_task_message(
     return message
 
 
-def convert_to_record_dict(
+def iterate_record_chunks(
     file_type: str,
     file_name: str,
     user_id: str,
     file_import_options: str,
     project_id: str,
-) -> List:
+) -> Iterator[Tuple[List[Dict[str, Any]], float]]:
+    """
+    Parses the upload chunk by chunk, so it is never held as a whole. The file is read twice,
+    first to check it, then to hand out the records of every chunk with the progress through
+    the file in percent.
+    """
     if not file_type:
         create_notification(
             NotificationType.FILE_TYPE_NOT_GIVEN,
@@ -58,31 +67,83 @@ def convert_to_record_dict(
     file_type = file_type.lower()
     if file_type in ["xls", "xlsm", "xlsb", "odf", "ods", "odt"]:
         file_type = "xlsx"
+    if file_type not in ["csv", "txt", "text", "xlsx", "html", "json"]:
+        create_notification(
+            NotificationType.INVALID_FILE_TYPE,
+            user_id,
+            project_id,
+            file_type,
+        )
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        raise Exception("Upload conversion error", "Upload ran into errors")
 
     file_import_options = (
         string_to_import_option_dict(file_import_options, user_id, project_id)
         if file_import_options
         else {}
     )
+    # the chunks are sized by the import
+    file_import_options.pop("chunksize", None)
+    file_import_options.pop("iterator", None)
+    checks = ImportChecks(project_id, user_id)
     try:
-        if file_type in ["csv", "txt", "text"]:
-            df = pd.read_csv(file_name, **file_import_options)
-        elif file_type == "xlsx":
-            df = pd.read_excel(file_name, **file_import_options)
-        elif file_type == "html":
-            df = pd.read_html(file_name, **file_import_options)
-        elif file_type == "json":
-            df = pd.read_json(file_name, **file_import_options)
+        # the whole file is checked before the first chunk is handed out, so a failing
+        # check leaves nothing written. the types of all chunks are collected on the way,
+        # otherwise the same column could be written e.g. as int in one chunk and as float
+        # in the next one
+        if __is_streamed(file_type, file_import_options):
+            read_chunks = lambda dtype: __read_file_chunks(
+                file_type, file_name, file_import_options, dtype
+            )
         else:
-            create_notification(
-                NotificationType.INVALID_FILE_TYPE,
+            df = __convert(
+                lambda: __read_whole(file_type, file_name, file_import_options),
                 user_id,
                 project_id,
-                file_type,
             )
-            raise Exception("Upload conversion error", "Upload ran into errors")
-        # ensure useable columns dont break the import
-        df.fillna(" ", inplace=True)
+            read_chunks = lambda dtype: __slice_chunks(df)
+
+        dtypes = {}
+        for df_chunk, _ in __iterate_converted(read_chunks(None), user_id, project_id):
+            __merge_dtypes(dtypes, df_chunk)
+            # ensure useable columns dont break the import
+            df_chunk.fillna(" ", inplace=True)
+            checks.check(df_chunk)
+
+        dtype = None
+        if "dtype" not in file_import_options:
+            dtype = {
+                column: column_dtype
+                for column, column_dtype in dtypes.items()
+                if not pd.api.types.is_datetime64_any_dtype(column_dtype)
+            }
+        for df_chunk, progress in __iterate_converted(
+            read_chunks(dtype), user_id, project_id
+        ):
+            df_chunk.fillna(" ", inplace=True)
+            yield df_chunk.to_dict(orient="records"), progress
+    finally:
+        if os.path.exists(file_name):
+            os.remove(file_name)
+
+
+def __iterate_converted(
+    chunks: Iterator[Tuple[pd.DataFrame, float]], user_id: str, project_id: str
+) -> Iterator[Tuple[pd.DataFrame, float]]:
+    while True:
+        try:
+            chunk = __convert(lambda: next(chunks), user_id, project_id)
+        except StopIteration:
+            return
+        yield chunk
+
+
+def __convert(read: Callable[[], Any], user_id: str, project_id: str) -> Any:
+    try:
+        return read()
+    except StopIteration:
+        raise
     except Exception as e:
         logger.error(traceback.format_exc())
         create_notification(
@@ -91,14 +152,69 @@ def convert_to_record_dict(
             project_id,
             str(e),
         )
-        if os.path.exists(file_name):
-            os.remove(file_name)
         raise Exception("Upload conversion error", "Upload ran into errors")
-    if os.path.exists(file_name):
-        os.remove(file_name)
-    run_limit_checks(df, project_id, user_id)
-    run_checks(df, project_id, user_id)
-    return df.to_dict(orient="records")
+
+
+def __merge_dtypes(dtypes: Dict[str, Any], df: pd.DataFrame) -> None:
+    # like for a file parsed as a whole, mixed numbers become float and anything else object
+    for column, dtype in df.dtypes.items():
+        known = dtypes.get(column)
+        if known is None or known == dtype:
+            dtypes[column] = dtype
+        elif (
+            pd.api.types.is_numeric_dtype(known)
+            and pd.api.types.is_numeric_dtype(dtype)
+            and not pd.api.types.is_bool_dtype(known)
+            and not pd.api.types.is_bool_dtype(dtype)
+        ):
+            dtypes[column] = np.dtype("float64")
+        else:
+            dtypes[column] = np.dtype("object")
+
+
+def __is_streamed(
+    file_type: str, file_import_options: Dict[str, Union[str, int]]
+) -> bool:
+    return file_type in ["csv", "txt", "text"] or (
+        file_type == "json" and bool(file_import_options.get("lines"))
+    )
+
+
+def __read_file_chunks(
+    file_type: str,
+    file_name: str,
+    file_import_options: Dict[str, Union[str, int]],
+    dtype: Optional[Dict[str, Any]],
+) -> Iterator[Tuple[pd.DataFrame, float]]:
+    if dtype is not None:
+        file_import_options = {**file_import_options, "dtype": dtype}
+    if file_type == "json":
+        read = pd.read_json
+    else:
+        read = pd.read_csv
+    # the position in the file is read ahead by the parser, good enough for the progress
+    file_size = os.path.getsize(file_name) or 1
+    with open(file_name, "rb") as file:
+        with read(file, chunksize=IMPORT_CHUNK_SIZE, **file_import_options) as reader:
+            for df in reader:
+                yield df, min(file.tell() / file_size * 100, 100.0)
+
+
+def __read_whole(
+    file_type: str, file_name: str, file_import_options: Dict[str, Union[str, int]]
+) -> pd.DataFrame:
+    # these formats can't be parsed in parts, only the records are created per chunk
+    if file_type == "xlsx":
+        return pd.read_excel(file_name, **file_import_options)
+    elif file_type == "html":
+        return pd.read_html(file_name, **file_import_options)[0]
+    return pd.read_json(file_name, **file_import_options)
+
+
+def __slice_chunks(df: pd.DataFrame) -> Iterator[Tuple[pd.DataFrame, float]]:
+    for start in range(0, df.shape[0], IMPORT_CHUNK_SIZE):
+        end = min(start + IMPORT_CHUNK_SIZE, df.shape[0])
+        yield df.iloc[start:end].copy(), end / df.shape[0] * 100
 
 
 def string_to_import_option_dict(
@@ -2,11 +2,15 @@ import timeit
 from typing import Any, Tuple, Optional
 
 from db import enums, WeakSupervisionTask
-from db.business_objects import labeling_task
+from db.business_objects import general, labeling_task
 from db.business_objects import weak_supervision
 from controller.weak_supervision.weak_supervision_service import (
     initiate_weak_supervision,
 )
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass
+from util import notification
+from util.notification import create_notification
 
 
 def create_task(
@@ -47,6 +51,64 @@ def start_weak_supervision_by_project_id(
         )
 
 
+def schedule_weak_supervision_by_project_id(
+    project_id: str, user_id: str, ws_task_id: str
+) -> None:
+    job_queue.enqueue(
+        JobClass.WEAK_SUPERVISION,
+        run_weak_supervision_by_project_id,
+        project_id,
+        user_id,
+        ws_task_id,
+        on_failure=fail_weak_supervision_by_project_id,
+    )
+
+
+def fail_weak_supervision_by_project_id(
+    project_id: str, user_id: str, ws_task_id: str
+) -> None:
+    # the job failed for good, e.g. since the replica running it died
+    current_run = weak_supervision.get_current_weak_supervision_run(project_id)
+    if (
+        current_run
+        and str(current_run.id) == str(ws_task_id)
+        and current_run.state == enums.PayloadState.FINISHED.value
+    ):
+        return
+    weak_supervision.update_state(
+        project_id,
+        ws_task_id,
+        enums.PayloadState.FAILED.value,
+        with_commit=True,
+    )
+    notification.send_organization_update(project_id, "weak_supervision_finished")
+
+
+def run_weak_supervision_by_project_id(
+    project_id: str, user_id: str, ws_task_id: str
+) -> None:
+    try:
+        start_weak_supervision_by_project_id(project_id, user_id, ws_task_id)
+        update_weak_supervision_task_stats(ws_task_id, project_id)
+        create_notification(
+            enums.NotificationType.WEAK_SUPERVISION_TASK_DONE,
+            user_id,
+            project_id,
+            "Weak Supervision Task",
+        )
+        notification.send_organization_update(project_id, "weak_supervision_finished")
+    except Exception:
+        general.rollback()
+        weak_supervision.update_state(
+            project_id,
+            ws_task_id,
+            enums.PayloadState.FAILED.value,
+            with_commit=True,
+        )
+        notification.send_organization_update(project_id, "weak_supervision_finished")
+        raise
+
+
 def start_weak_supervision_by_task_id(
     project_id: str, task_id: str, user_id: str, ws_task_id: str
 ) -> Tuple[float, float]:
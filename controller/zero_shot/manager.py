@@ -20,7 +20,8 @@ from db.business_objects import (
     payload,
     project,
 )
-from util import daemon
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass
 from controller.weak_supervision import weak_supervision_service as weak_supervision
 
 
@@ -136,14 +137,32 @@ def create_zero_shot_information_source(
 def start_zero_shot_for_project_thread(
     project_id: str, information_source_id: str, user_id: str
 ) -> None:
-    daemon.run(
+    job_queue.enqueue(
+        JobClass.ZERO_SHOT,
         __start_zero_shot_for_project,
         project_id,
         information_source_id,
         user_id,
+        on_failure=__fail_zero_shot_for_project,
     )
 
 
+def __fail_zero_shot_for_project(
+    project_id: str, information_source_id: str, user_id: str
+) -> None:
+    # the job failed for good, the payload it created would stay running otherwise
+    zero_shot_is = information_source.get(project_id, information_source_id)
+    if not zero_shot_is:
+        return
+    for payload_item in zero_shot_is.payloads:
+        if payload_item.state not in [
+            enums.PayloadState.FINISHED.value,
+            enums.PayloadState.FAILED.value,
+        ]:
+            payload_item.state = enums.PayloadState.FAILED.value
+    general.commit()
+
+
 def __start_zero_shot_for_project(
     project_id: str, information_source_id: str, user_id: str
 ) -> None:
@@ -6,10 +6,6 @@ class NotificationLevelException(Exception):
     pass
 
 
-class TooManyRecordsForStaticSliceException(Exception):
-    pass
-
-
 class NoSuchDataSliceFoundException(Exception):
     pass
 
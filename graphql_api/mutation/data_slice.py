@@ -1,7 +1,6 @@
 from typing import Any, Dict, List, Optional
 
 from controller.auth import manager as auth
-from exceptions.exceptions import TooManyRecordsForStaticSliceException
 import graphene
 from graphql import GraphQLError
 
@@ -130,10 +129,7 @@ class UpdateSliceTypeManual(graphene.Mutation):
 
 def handle_error(exception: Exception, user_id: str, project_id: str):
     general.rollback()
-    if exception.__class__ == TooManyRecordsForStaticSliceException.__class__:
-        error = "Too many records for a static slice"
-    else:
-        error = str(exception.__class__.__name__)
+    error = str(exception.__class__.__name__)
 
     notification.create_notification(
         NotificationType.DATA_SLICE_UPDATE_FAILED,
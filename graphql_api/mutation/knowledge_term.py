@@ -107,7 +107,7 @@ class BlacklistTerm(graphene.Mutation):
     def mutate(self, info, project_id: str, term_id: str):
         auth.check_demo_access(info)
         auth.check_project_access(info, project_id)
-        manager.blacklist_term(term_id)
+        manager.blacklist_term(project_id, term_id)
         return BlacklistTerm(ok=True)
 
 
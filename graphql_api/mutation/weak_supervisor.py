@@ -23,7 +23,7 @@ from db.business_objects.labeling_task import (
     get_selected_labeling_task_names,
 )
 from db.enums import NotificationType
-from util import daemon, doc_ock
+from util import doc_ock
 from util import notification
 from controller.weak_supervision.weak_supervision_service import (
     initiate_weak_supervision,
@@ -62,51 +62,8 @@ class InitiateWeakSupervisionByProjectId(graphene.Mutation):
             project_id, str(weak_supervision_task.id), with_commit=True
         )
 
-        def execution_pipeline(
-            project_id: str, user_id: str, weak_supervision_task_id: str
-        ):
-            ctx_token = general.get_ctx_token()
-            try:
-                labeling_tasks = labeling_task.get_labeling_tasks_by_selected_sources(
-                    project_id
-                )
-                for labeling_task_item in labeling_tasks:
-                    initiate_weak_supervision(
-                        project_id,
-                        labeling_task_item.id,
-                        user_id,
-                        weak_supervision_task_id,
-                    )
-                ws_manager.update_weak_supervision_task_stats(
-                    weak_supervision_task_id, project_id
-                )
-                create_notification(
-                    NotificationType.WEAK_SUPERVISION_TASK_DONE,
-                    user_id,
-                    project_id,
-                    "Weak Supervision Task",
-                )
-                notification.send_organization_update(
-                    project_id, f"weak_supervision_finished"
-                )
-            except Exception as e:
-                print(traceback.format_exc(), flush=True)
-                general.rollback()
-                weak_supervision.update_state(
-                    project_id,
-                    weak_supervision_task_id,
-                    enums.PayloadState.FAILED.value,
-                    with_commit=True,
-                )
-                notification.send_organization_update(
-                    project_id, f"weak_supervision_finished"
-                )
-                raise e
-            finally:
-                general.reset_ctx_token(ctx_token, True)
-
-        daemon.run(
-            execution_pipeline, project_id, str(user.id), str(weak_supervision_task.id)
+        ws_manager.schedule_weak_supervision_by_project_id(
+            project_id, str(user.id), str(weak_supervision_task.id)
         )
         return InitiateWeakSupervisionByProjectId(ok=True)
 
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 import graphene
 
@@ -21,6 +21,12 @@ class DataSliceQuery(graphene.ObjectType):
         slice_id=graphene.ID(required=True),
     )
 
+    static_data_slice_materialization = graphene.Field(
+        graphene.JSONString,
+        project_id=graphene.ID(required=True),
+        slice_id=graphene.ID(required=True),
+    )
+
     def resolve_data_slices(
         self, info, project_id: str, slice_type: Optional[str] = None
     ) -> List[DataSlice]:
@@ -34,3 +40,10 @@ class DataSliceQuery(graphene.ObjectType):
         auth.check_demo_access(info)
         auth.check_project_access(info, project_id)
         return manager.count_items(project_id, slice_id)
+
+    def resolve_static_data_slice_materialization(
+        self, info, project_id: str, slice_id: str
+    ) -> Optional[Dict[str, Any]]:
+        auth.check_demo_access(info)
+        auth.check_project_access(info, project_id)
+        return manager.get_materialization_state(project_id, slice_id)
@@ -1,9 +1,14 @@
-from typing import List
+from typing import Any, Dict, List
 
 import graphene
 import util.user_activity
 from controller.auth import manager as auth
-from graphql_api.types import ServiceVersionResult, ToolTip, UserActivityWrapper
+from graphql_api.types import (
+    JobQueueStats,
+    ServiceVersionResult,
+    ToolTip,
+    UserActivityWrapper,
+)
 from util import tooltip
 from controller.misc import config_service, manager
 
@@ -31,6 +36,10 @@ class MiscQuery(graphene.ObjectType):
 
     has_updates = graphene.Field(graphene.Boolean)
 
+    job_queue_stats = graphene.Field(graphene.List(JobQueueStats))
+
+    search_statistics = graphene.Field(graphene.JSONString)
+
     def resolve_tooltip(self, info, key: str) -> ToolTip:
         return tooltip.resolve_tooltip(key)
 
@@ -56,3 +65,11 @@ class MiscQuery(graphene.ObjectType):
 
     def resolve_has_updates(self, info) -> bool:
         return manager.has_updates()
+
+    def resolve_job_queue_stats(self, info) -> List[JobQueueStats]:
+        auth.check_admin_access(info)
+        return manager.get_job_queue_stats()
+
+    def resolve_search_statistics(self, info) -> Dict[str, Any]:
+        auth.check_admin_access(info)
+        return manager.get_search_statistics()
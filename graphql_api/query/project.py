@@ -10,6 +10,7 @@ from graphql_api.types import (
     ProjectSize,
     Project,
     UserSession,
+    UserSessionWindow,
 )
 from controller.auth import manager as auth
 from controller.project import manager
@@ -40,6 +41,13 @@ class ProjectQuery(graphene.ObjectType):
         session_id=graphene.ID(required=True),
     )
 
+    user_session_window = graphene.Field(
+        UserSessionWindow,
+        project_id=graphene.ID(required=True),
+        session_id=graphene.ID(required=True),
+        window_index=graphene.Int(required=True),
+    )
+
     inter_annotator_matrix = graphene.Field(
         InterAnnotatorMatrix,
         project_id=graphene.ID(required=True),
@@ -111,6 +119,23 @@ class ProjectQuery(graphene.ObjectType):
         user_id = auth.get_user_by_info(info).id
         return search.resolve_labeling_session(project_id, user_id, session_id)
 
+    def resolve_user_session_window(
+        self, info, project_id: str, session_id: str, window_index: int
+    ) -> Optional[UserSessionWindow]:
+        auth.check_demo_access(info)
+        auth.check_project_access(info, project_id)
+        user_id = auth.get_user_by_info(info).id
+        window = search.get_labeling_session_window(
+            project_id, user_id, session_id, window_index
+        )
+        if not window:
+            return None
+        return UserSessionWindow(
+            window_index=window["window_index"],
+            record_ids=window["record_ids"],
+            has_next=window["has_next"],
+        )
+
     def resolve_inter_annotator_matrix(
         self,
         info,
@@ -30,6 +30,8 @@ class RecordQuery(graphene.ObjectType):
         order_by=graphene.JSONString(),
         limit=graphene.Int(),
         offset=graphene.Int(),
+        cursor=graphene.String(),
+        profile=graphene.Boolean(),
     )
 
     search_records_extended = graphene.Field(
@@ -38,6 +40,10 @@ class RecordQuery(graphene.ObjectType):
         filter_data=graphene.List(graphene.JSONString, required=True),
         limit=graphene.Int(),
         offset=graphene.Int(),
+        cursor=graphene.String(),
+        count_mode=graphene.String(),
+        profile=graphene.Boolean(),
+        facets=graphene.Boolean(),
     )
 
     search_records_by_similarity = graphene.Field(
@@ -45,6 +51,9 @@ class RecordQuery(graphene.ObjectType):
         project_id=graphene.ID(required=True),
         embedding_id=graphene.ID(required=True),
         record_id=graphene.ID(required=True),
+        limit=graphene.Int(),
+        offset=graphene.Int(),
+        cursor=graphene.String(),
     )
 
     tokenize_record = graphene.Field(
@@ -71,12 +80,16 @@ class RecordQuery(graphene.ObjectType):
         order_by: Optional[Dict[str, str]] = None,
         limit: Optional[int] = 20,
         offset: Optional[int] = 0,
+        cursor: Optional[str] = None,
+        profile: Optional[bool] = False,
     ) -> ExtendedSearch:
         auth.check_demo_access(info)
         auth.check_project_access(info, project_id)
+        if profile:
+            auth.check_admin_access(info)
         user_id = auth.get_user_by_info(info).id
         return manager.get_records_by_static_slice(
-            user_id, project_id, slice_id, order_by, limit, offset
+            user_id, project_id, slice_id, order_by, limit, offset, cursor, profile
         )
 
     def resolve_search_records_extended(
@@ -86,22 +99,43 @@ class RecordQuery(graphene.ObjectType):
         filter_data: List[Dict[str, Any]],
         limit: Optional[int] = 20,
         offset: Optional[int] = 0,
+        cursor: Optional[str] = None,
+        count_mode: Optional[str] = None,
+        profile: Optional[bool] = False,
+        facets: Optional[bool] = False,
     ) -> ExtendedSearch:
         auth.check_demo_access(info)
         auth.check_project_access(info, project_id)
+        if profile:
+            auth.check_admin_access(info)
         user_id = auth.get_user_by_info(info).id
         return manager.get_records_by_extended_search(
-            project_id, user_id, filter_data, limit, offset
+            project_id,
+            user_id,
+            filter_data,
+            limit,
+            offset,
+            cursor,
+            count_mode,
+            profile,
+            facets,
         )
 
     def resolve_search_records_by_similarity(
-        self, info, project_id: str, embedding_id: str, record_id: str
+        self,
+        info,
+        project_id: str,
+        embedding_id: str,
+        record_id: str,
+        limit: int = 100,
+        offset: int = 0,
+        cursor: Optional[str] = None,
     ) -> ExtendedSearch:
         auth.check_demo_access(info)
         auth.check_project_access(info, project_id)
         user_id = auth.get_user_by_info(info).id
         return manager.get_records_by_similarity_search(
-            project_id, user_id, embedding_id, record_id
+            project_id, user_id, embedding_id, record_id, limit, offset, cursor
         )
 
     def resolve_tokenize_record(self, info, record_id: str) -> TokenizedRecord:
@@ -610,8 +610,14 @@ class ExtendedSearch(graphene.ObjectType):
     query_limit = graphene.Int()
     query_offset = graphene.Int()
     full_count = graphene.Int()
+    full_count_approximate = graphene.Boolean()
     session_id = graphene.UUID()
     record_list = graphene.List(ExtendedRecord)
+    next_cursor = graphene.String()
+    # only set for profiled searches of admins
+    profile = graphene.JSONString()
+    # only set if requested, label, source and annotator counts of the filtered records
+    facets = graphene.JSONString()
 
 
 class ToolTip(graphene.ObjectType):
@@ -646,6 +652,12 @@ class UserSession(SQLAlchemyObjectType):
     id = graphene.ID(source="id", required=True)
 
 
+class UserSessionWindow(graphene.ObjectType):
+    window_index = graphene.Int()
+    record_ids = graphene.List(graphene.ID)
+    has_next = graphene.Boolean()
+
+
 class ProjectSize(graphene.ObjectType):
     order = graphene.Int()
     table = graphene.String()
@@ -718,6 +730,17 @@ class ServiceVersionResult(graphene.ObjectType):
     link = graphene.String()
 
 
+class JobQueueStats(graphene.ObjectType):
+    job_class = graphene.String()
+    concurrency = graphene.Int()
+    queued = graphene.Int()
+    delayed = graphene.Int()
+    running = graphene.Int()
+    failed = graphene.Int()
+    oldest_wait_seconds = graphene.Float()
+    avg_wait_seconds = graphene.Float()
+
+
 class ModelProviderInfoResult(graphene.ObjectType):
     name = graphene.String()
     revision = graphene.String()
@@ -0,0 +1,307 @@
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from service.job_queue.job_queue_enum import JobClass, JobPriority, JobState
+from util import db_connection
+
+# concurrency is per gateway replica and can be overwritten with e.g. JOB_CONCURRENCY_PAYLOAD
+# retry_delay is in seconds and doubles with every attempt
+JOB_CLASS_CONFIG = {
+    JobClass.PAYLOAD: {"concurrency": 4, "max_attempts": 1, "retry_delay": 0},
+    JobClass.WEAK_SUPERVISION: {"concurrency": 2, "max_attempts": 1, "retry_delay": 0},
+    JobClass.TOKENIZATION: {"concurrency": 4, "max_attempts": 3, "retry_delay": 10},
+    JobClass.EMBEDDING: {"concurrency": 2, "max_attempts": 1, "retry_delay": 0},
+    JobClass.ZERO_SHOT: {"concurrency": 1, "max_attempts": 1, "retry_delay": 0},
+    JobClass.DOC_OCK: {"concurrency": 2, "max_attempts": 3, "retry_delay": 30},
+    JobClass.USER_ACTIVITY: {"concurrency": 1, "max_attempts": 5, "retry_delay": 60},
+    JobClass.SEARCH_INDEX: {"concurrency": 1, "max_attempts": 3, "retry_delay": 30},
+    JobClass.DATA_SLICE: {"concurrency": 2, "max_attempts": 3, "retry_delay": 30},
+}
+# running jobs are kept alive by the heartbeat of their replica, jobs of a replica that died are picked up again after the lease ran out
+LEASE_SECONDS = 120
+
+__wake_events = {job_class: threading.Event() for job_class in JobClass}
+
+
+def enqueue(
+    job_class: JobClass,
+    target: Callable,
+    *args: Any,
+    priority: JobPriority = JobPriority.NORMAL,
+    delay: int = 0,
+    on_failure: Optional[Callable] = None,
+) -> str:
+    """
+    Persists a call of target(*args) to be executed by a worker of the job class.
+    The target needs to be a module level function and the arguments json serializable
+    since the job might be executed by another gateway replica, e.g. ids are passed as str.
+    Other arguments raise instead of reaching the target in another form.
+    on_failure(*args) is called once the job failed for good, also if its worker died,
+    so e.g. the state of the object the job works on doesn't stay running.
+    """
+    job_id = str(uuid.uuid4())
+    db_connection.execute(
+        """
+        INSERT INTO job_queue (id, job_class, function, on_failure, args, priority, state, attempts, max_attempts, created_at, available_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, 0, %s, now(), now() + make_interval(secs => %s))
+        """,
+        (
+            job_id,
+            job_class.value,
+            __function_name(target),
+            __function_name(on_failure) if on_failure else None,
+            json.dumps(args),
+            priority.value,
+            JobState.QUEUED.value,
+            JOB_CLASS_CONFIG[job_class]["max_attempts"],
+            delay,
+        ),
+    )
+    if delay == 0:
+        __wake_events[job_class].set()
+    return job_id
+
+
+def enqueue_scheduled(job_class: JobClass, target: Callable, interval: int) -> None:
+    """
+    Enqueues target() to run after the interval (in seconds) unless it's queued or running
+    already. Called on the heartbeat of every replica, so it runs about once per interval.
+    """
+    function = __function_name(target)
+    with db_connection.transaction() as cursor:
+        # replicas check at the same time, the lock keeps them from enqueuing it twice
+        cursor.execute(
+            "SELECT pg_advisory_xact_lock(hashtext('job_queue'), hashtext(%s))",
+            (function,),
+        )
+        cursor.execute(
+            """
+            INSERT INTO job_queue (id, job_class, function, args, priority, state, attempts, max_attempts, created_at, available_at)
+            SELECT %s, %s, %s, '[]', %s, %s, 0, %s, now(), now() + make_interval(secs => %s)
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM job_queue
+                WHERE function = %s AND state IN (%s, %s)
+            )
+            """,
+            (
+                str(uuid.uuid4()),
+                job_class.value,
+                function,
+                JobPriority.LOW.value,
+                JobState.QUEUED.value,
+                JOB_CLASS_CONFIG[job_class]["max_attempts"],
+                interval,
+                function,
+                JobState.QUEUED.value,
+                JobState.RUNNING.value,
+            ),
+        )
+
+
+def claim(job_class: JobClass, worker_id: str) -> Optional[Dict[str, Any]]:
+    rows = db_connection.execute(
+        """
+        UPDATE job_queue
+        SET state = %s, attempts = attempts + 1, started_at = now(), locked_by = %s, locked_until = now() + make_interval(secs => %s)
+        WHERE id = (
+            SELECT id
+            FROM job_queue
+            WHERE job_class = %s AND state = %s AND available_at <= now()
+            ORDER BY priority DESC, available_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, function, on_failure, args, attempts, max_attempts, EXTRACT(EPOCH FROM started_at - available_at)
+        """,
+        (
+            JobState.RUNNING.value,
+            worker_id,
+            LEASE_SECONDS,
+            job_class.value,
+            JobState.QUEUED.value,
+        ),
+        fetch=True,
+    )
+    if not rows:
+        return None
+    job_id, function, on_failure, args, attempts, max_attempts, waited = rows[0]
+    return {
+        "id": str(job_id),
+        "job_class": job_class,
+        "function": function,
+        "on_failure": on_failure,
+        "args": args or [],
+        "attempts": attempts,
+        "max_attempts": max_attempts,
+        "waited": float(waited),
+    }
+
+
+def finish(job_id: str) -> None:
+    db_connection.execute(
+        """
+        UPDATE job_queue
+        SET state = %s, finished_at = now(), locked_by = NULL, locked_until = NULL
+        WHERE id = %s
+        """,
+        (JobState.FINISHED.value, job_id),
+    )
+
+
+def fail(job: Dict[str, Any], error: str) -> bool:
+    """
+    Returns if the job failed for good, otherwise it's retried later on.
+    """
+    if job["attempts"] < job["max_attempts"]:
+        delay = JOB_CLASS_CONFIG[job["job_class"]]["retry_delay"] * 2 ** (
+            job["attempts"] - 1
+        )
+        db_connection.execute(
+            """
+            UPDATE job_queue
+            SET state = %s, available_at = now() + make_interval(secs => %s), locked_by = NULL, locked_until = NULL, last_error = %s
+            WHERE id = %s
+            """,
+            (JobState.QUEUED.value, delay, error, job["id"]),
+        )
+        return False
+    db_connection.execute(
+        """
+        UPDATE job_queue
+        SET state = %s, finished_at = now(), locked_by = NULL, locked_until = NULL, last_error = %s
+        WHERE id = %s
+        """,
+        (JobState.FAILED.value, error, job["id"]),
+    )
+    return True
+
+
+def extend_leases(worker_id: str) -> None:
+    db_connection.execute(
+        """
+        UPDATE job_queue
+        SET locked_until = now() + make_interval(secs => %s)
+        WHERE locked_by = %s AND state = %s
+        """,
+        (LEASE_SECONDS, worker_id, JobState.RUNNING.value),
+    )
+
+
+def release_expired_leases() -> List[Dict[str, Any]]:
+    """
+    Returns the jobs that failed for good since they ran out of attempts.
+    """
+    rows = db_connection.execute(
+        """
+        UPDATE job_queue
+        SET
+            state = CASE WHEN attempts < max_attempts THEN %s ELSE %s END,
+            finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE now() END,
+            available_at = now(),
+            locked_by = NULL,
+            locked_until = NULL,
+            last_error = 'Lease expired, the worker stopped responding'
+        WHERE state = %s AND locked_until < now()
+        RETURNING id, job_class, function, on_failure, args, state
+        """,
+        (JobState.QUEUED.value, JobState.FAILED.value, JobState.RUNNING.value),
+        fetch=True,
+    )
+    return [
+        {
+            "id": str(job_id),
+            "job_class": JobClass(job_class),
+            "function": function,
+            "on_failure": on_failure,
+            "args": args or [],
+        }
+        for job_id, job_class, function, on_failure, args, state in rows
+        if state == JobState.FAILED.value
+    ]
+
+
+def prune(finished_hours: int = 24, failed_hours: int = 24 * 7) -> None:
+    db_connection.execute(
+        """
+        DELETE FROM job_queue
+        WHERE (state = %s AND finished_at < now() - make_interval(hours => %s))
+        OR (state = %s AND finished_at < now() - make_interval(hours => %s))
+        """,
+        (
+            JobState.FINISHED.value,
+            finished_hours,
+            JobState.FAILED.value,
+            failed_hours,
+        ),
+    )
+
+
+def get_stats() -> List[Dict[str, Any]]:
+    rows = db_connection.execute(
+        """
+        SELECT
+            job_class,
+            COUNT(*) FILTER (WHERE state = %s AND available_at <= now()),
+            COUNT(*) FILTER (WHERE state = %s AND available_at > now()),
+            COUNT(*) FILTER (WHERE state = %s),
+            COUNT(*) FILTER (WHERE state = %s),
+            COALESCE(EXTRACT(EPOCH FROM MAX(now() - available_at) FILTER (WHERE state = %s AND available_at <= now())), 0),
+            COALESCE(EXTRACT(EPOCH FROM AVG(started_at - available_at) FILTER (WHERE started_at > now() - interval '1 hour')), 0)
+        FROM job_queue
+        GROUP BY job_class
+        """,
+        (
+            JobState.QUEUED.value,
+            JobState.QUEUED.value,
+            JobState.RUNNING.value,
+            JobState.FAILED.value,
+            JobState.QUEUED.value,
+        ),
+        fetch=True,
+    )
+    by_class = {row[0]: row for row in rows}
+    stats = []
+    for job_class in JobClass:
+        row = by_class.get(job_class.value, (job_class.value, 0, 0, 0, 0, 0, 0))
+        stats.append(
+            {
+                "job_class": job_class.value,
+                "concurrency": get_concurrency(job_class),
+                "queued": row[1],
+                "delayed": row[2],
+                "running": row[3],
+                "failed": row[4],
+                "oldest_wait_seconds": float(row[5]),
+                "avg_wait_seconds": float(row[6]),
+            }
+        )
+    return stats
+
+
+def get_concurrency(job_class: JobClass) -> int:
+    return int(
+        os.getenv(
+            f"JOB_CONCURRENCY_{job_class.value}",
+            JOB_CLASS_CONFIG[job_class]["concurrency"],
+        )
+    )
+
+
+def wait_for_jobs(job_class: JobClass, timeout: float) -> None:
+    # jobs enqueued by this replica wake the workers directly, others are found by polling
+    wake_event = __wake_events[job_class]
+    wake_event.wait(timeout)
+    wake_event.clear()
+
+
+def wake_all() -> None:
+    for wake_event in __wake_events.values():
+        wake_event.set()
+
+
+def __function_name(function: Callable) -> str:
+    return f"{function.__module__}:{function.__name__}"
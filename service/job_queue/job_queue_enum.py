@@ -0,0 +1,26 @@
+from enum import Enum
+
+
+class JobClass(Enum):
+    PAYLOAD = "PAYLOAD"
+    WEAK_SUPERVISION = "WEAK_SUPERVISION"
+    TOKENIZATION = "TOKENIZATION"
+    EMBEDDING = "EMBEDDING"
+    ZERO_SHOT = "ZERO_SHOT"
+    DOC_OCK = "DOC_OCK"
+    USER_ACTIVITY = "USER_ACTIVITY"
+    SEARCH_INDEX = "SEARCH_INDEX"
+    DATA_SLICE = "DATA_SLICE"
+
+
+class JobState(Enum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    FINISHED = "FINISHED"
+    FAILED = "FAILED"
+
+
+class JobPriority(Enum):
+    LOW = 0
+    NORMAL = 50
+    HIGH = 100
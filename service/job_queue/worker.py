@@ -0,0 +1,138 @@
+import importlib
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+import pytz
+
+from db.business_objects import general
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass
+from service.search import search_cache
+from util import daemon
+
+# replicas that should only serve requests can set JOB_QUEUE_WORKERS=0
+WORKERS_ENABLED = os.getenv("JOB_QUEUE_WORKERS", "1") != "0"
+POLL_INTERVAL = 2
+HEARTBEAT_INTERVAL = 30
+PRUNE_INTERVAL = 3600
+# jobs without arguments that are enqueued once per interval (in seconds) across all replicas
+SCHEDULED_JOBS = [
+    (
+        JobClass.SEARCH_INDEX,
+        search_cache.compact_changes,
+        search_cache.COMPACT_INTERVAL,
+    ),
+]
+# waits above this are logged since they point to a too small worker pool
+WAIT_WARNING_SECONDS = 60
+
+__tz = pytz.timezone("Europe/Berlin")
+__worker_id = f"{socket.gethostname()}:{os.getpid()}"
+__stop = threading.Event()
+__started = False
+
+
+def start() -> None:
+    global __started
+    if not WORKERS_ENABLED or __started:
+        return
+    __started = True
+    __stop.clear()
+    for job_class in JobClass:
+        for _ in range(job_queue.get_concurrency(job_class)):
+            daemon.run(__work, job_class)
+    daemon.run(__maintain)
+
+
+def stop() -> None:
+    # running jobs aren't interrupted, if the process exits before they finish their lease runs out and they are retried
+    global __started
+    __stop.set()
+    job_queue.wake_all()
+    __started = False
+
+
+def __work(job_class: JobClass) -> None:
+    while not __stop.is_set():
+        try:
+            job = job_queue.claim(job_class, __worker_id)
+        except Exception:
+            print(traceback.format_exc(), flush=True)
+            __stop.wait(POLL_INTERVAL)
+            continue
+        if not job:
+            job_queue.wait_for_jobs(job_class, POLL_INTERVAL)
+            continue
+        try:
+            __run_job(job)
+        except Exception:
+            # queue not reachable, the job is picked up again once its lease ran out
+            print(traceback.format_exc(), flush=True)
+
+
+def __run_job(job: Dict[str, Any]) -> None:
+    if job["waited"] > WAIT_WARNING_SECONDS:
+        print(
+            __log_prefix()
+            + f" {job['job_class'].value} job {job['function']} waited {job['waited']:.0f}s in queue",
+            flush=True,
+        )
+    failed = False
+    ctx_token = general.get_ctx_token()
+    try:
+        __resolve(job["function"])(*job["args"])
+    except Exception:
+        error = traceback.format_exc()
+        print(error, flush=True)
+        general.rollback()
+        failed = job_queue.fail(job, error)
+    else:
+        job_queue.finish(job["id"])
+    finally:
+        general.reset_ctx_token(ctx_token, True)
+    if failed:
+        __run_failure_hook(job)
+
+
+def __maintain() -> None:
+    seconds_since_prune = PRUNE_INTERVAL
+    while not __stop.wait(HEARTBEAT_INTERVAL):
+        try:
+            job_queue.extend_leases(__worker_id)
+            for job_class, target, interval in SCHEDULED_JOBS:
+                job_queue.enqueue_scheduled(job_class, target, interval)
+            for job in job_queue.release_expired_leases():
+                # the replica that ran the job is gone, so its failure hook runs here
+                __run_failure_hook(job)
+            seconds_since_prune += HEARTBEAT_INTERVAL
+            if seconds_since_prune >= PRUNE_INTERVAL:
+                job_queue.prune()
+                seconds_since_prune = 0
+        except Exception:
+            print(traceback.format_exc(), flush=True)
+
+
+def __run_failure_hook(job: Dict[str, Any]) -> None:
+    if not job["on_failure"]:
+        return
+    ctx_token = general.get_ctx_token()
+    try:
+        __resolve(job["on_failure"])(*job["args"])
+    except Exception:
+        print(traceback.format_exc(), flush=True)
+        general.rollback()
+    finally:
+        general.reset_ctx_token(ctx_token, True)
+
+
+def __resolve(function: str) -> Callable:
+    module_name, function_name = function.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def __log_prefix() -> str:
+    return datetime.now(__tz).strftime("%Y-%m-%dT%H:%M:%S")
@@ -1,26 +1,37 @@
-from dataclasses import dataclass
-import zlib
-from typing import Tuple, Dict, List, Any, Optional, Union
+from dataclasses import dataclass, replace
+import os
+import hashlib
+from typing import Tuple, Dict, List, Any, Optional
 
-from exceptions.exceptions import TooManyRecordsForStaticSliceException
 from graphql_api import types
 from graphql_api.types import ExtendedSearch
 from db import UserSessions
-from util.notification import create_notification
 from db.enums import (
-    NotificationType,
+    DataTypes,
+    LabelSource,
     SliceTypes,
     Tablenames,
     RecordCategory,
 )
 from .search_enum import (
     FilterDataDictKeys,
+    SearchCountMode,
     SearchQueryTemplate,
 )
+from . import (
+    search_cache,
+    search_index,
+    search_keyset,
+    search_profile,
+    search_session,
+    search_statement,
+)
+from .search_keyset import SortKey
+from .search_statement import QueryParams
 from .search_helper import (
     build_order_by_column,
-    build_order_by_record_data,
     build_order_column_record_data,
+    build_order_prefix_record_data,
     build_query_template,
     build_order_by_table_select,
     get_query_template,
@@ -43,21 +54,75 @@ class UserSessionData:
     count_sql_statement: str
     last_count: int
     created_by: str
-    random_seed: float
+    # random orders are part of the statement, only older sessions still have a seed
+    random_seed: Optional[float] = None
 
 
-__seed_number = None
+# used for searches that don't request a count mode
+COUNT_MODE = SearchCountMode[
+    os.getenv("SEARCH_COUNT_MODE", SearchCountMode.COMBINED.value)
+]
+# smaller estimates are replaced by the exact count, the planner is too far off for them
+ESTIMATE_MIN_ROWS = int(os.getenv("SEARCH_ESTIMATE_MIN_ROWS", 100000))
+FULL_COUNT_COLUMN = "search_full_count"
+FACETS_COLUMN = "search_facets"
 
 
-def generate_data_slice_record_associations_insert_statement(
-    project_id: str, filter_parsed: List[Dict[str, Any]], data_slice_id: str
-) -> str:
-    sql_select = generate_select_sql(project_id, filter_parsed, 0, 0, True)
-    sql_with_slice_column = __add_data_slice_id_and_project_id_column(
-        sql_select, data_slice_id, project_id
+def generate_data_slice_record_associations_chunk_statement(
+    project_id: str,
+    filter_data: List[Dict[str, Any]],
+    data_slice_id: str,
+    run_id: str,
+    chunk_size: int,
+    after_record_id: Optional[str] = None,
+) -> Tuple[str, QueryParams]:
+    """
+    Inserts the next matching records in record id order and returns the size and last
+    record id of the chunk, so large slices are built in short transactions.
+    Records are only inserted while the run is the current one of the slice.
+    """
+    params = QueryParams(project_id)
+    sort_keys = search_keyset.with_tiebreak([])
+    cursor_values = [str(after_record_id)] if after_record_id else None
+    if len(filter_data) == 0:
+        condition = ""
+        if cursor_values is not None:
+            condition = "AND " + search_keyset.build_condition(
+                sort_keys, cursor_values, params
+            )
+        chunk_sql = f"""
+        SELECT r.project_id, r.id record_id{search_keyset.build_select(sort_keys, params)}
+        FROM record r
+        WHERE r.project_id = {params.project_id}
+        AND r.category = '{RecordCategory.SCALE.value}'
+        {condition}
+        {search_keyset.build_order_by(sort_keys)}
+        """
+        chunk_sql = __add_limit_and_offset(chunk_sql, chunk_size, 0, params)
+    else:
+        chunk_sql = __build_inner_query(
+            filter_data, params, chunk_size, 0, sort_keys, cursor_values
+        )
+    data_slice_id = params.add(data_slice_id, "UUID")
+    # the lock keeps a newer run from starting until the chunk is committed
+    sql = f"""
+    WITH chunk AS ( {chunk_sql} ),
+    current_run AS (
+        SELECT 1
+        FROM data_slice_materialization
+        WHERE data_slice_id = {data_slice_id} AND run_id = {params.add(run_id, 'UUID')}
+        FOR SHARE
+    ),
+    inserted AS (
+        INSERT INTO {Tablenames.DATA_SLICE_RECORD_ASSOCIATION.value} (data_slice_id, record_id, project_id)
+        SELECT {data_slice_id}, chunk.record_id, chunk.project_id
+        FROM chunk, current_run
+        ON CONFLICT (data_slice_id, record_id) DO NOTHING
     )
-    sql_insert_statement = __add_insert_into_dsra_statement(sql_with_slice_column)
-    return sql_insert_statement
+    SELECT COUNT(*) chunk_size, (array_agg(chunk.record_id ORDER BY chunk.record_id DESC))[1] last_record_id
+    FROM chunk
+    """
+    return sql, params
 
 
 def resolve_records_by_static_slice(
@@ -67,61 +132,140 @@ def resolve_records_by_static_slice(
     order_by: Dict[str, str],
     limit: int,
     offset: int,
+    cursor: Optional[str] = None,
+    profile: bool = False,
 ) -> ExtendedSearch:
-    global __seed_number
-    local_seed = None
-    order_by_add = None
     select_add = None
     from_add = None
 
     slice = data_slice.get(project_id, slice_id, True)
     if not slice:
         raise ValueError(f"Can't find slice with id {slice_id} in project.")
+    search_profile_item = search_profile.SearchProfile(
+        __build_static_slice_shape(slice.slice_type, order_by), profile
+    )
+    params = QueryParams(project_id)
 
     if slice.slice_type == SliceTypes.STATIC_OUTLIER.value:
-        order_by_add = "ORDER BY outlier_score DESC"
+        sort_keys = search_keyset.with_tiebreak([SortKey("dsra.outlier_score", "DESC")])
         select_add = ", outlier_score"
     else:
+        sort_keys = __get_sort_keys([order_by] if order_by else [], project_id)
         if order_by:
-            order_by_add = __build_order_by(order_by, project_id)
-            select_add, from_add = __build_order_by_subquery(order_by, project_id)
+            from_add = __build_order_by_subquery(order_by, params)
+
+    cursor_values = None
+    if cursor:
+        cursor_values = search_keyset.decode_cursor(cursor, sort_keys)
+        offset = 0
+
+    with search_profile_item.phase("build"):
+        sql = __basic_query(
+            params,
+            limit,
+            offset,
+            sort_keys,
+            slice_id,
+            select_add,
+            from_add,
+            cursor_values,
+        )
+        count_params = QueryParams(project_id)
+        count_sql = __count_static_slice(slice_id, count_params)
+    with search_profile_item.phase("count"):
+        count = search_statement.execute_count(count_sql, count_params)
+
+    extended_search = ExtendedSearch(
+        sql=search_statement.render(sql, params),
+        query_limit=limit,
+        query_offset=offset,
+        full_count=count,
+    )
+    with search_profile_item.phase("page"):
+        extended_search.record_list = search_statement.execute_all(sql, params)
+    extended_search.next_cursor = search_keyset.build_next_cursor(
+        sort_keys, extended_search.record_list, limit
+    )
+    search_profile_item.add_plan("count", count_sql, count_params)
+    search_profile_item.add_plan("page", sql, params)
 
+    with search_profile_item.phase("session"):
+        id_params = QueryParams(project_id)
+        select_statement = __select_record_data(
+            id_params, sort_keys, slice_id, select_add, from_add
+        )
+        id_sql_statement = __build_final_query(
+            select_statement, id_params, False, True, sort_keys
+        )
+        id_sql_statement += search_keyset.build_order_by(sort_keys)
+        user_session_data = __create_static_user_session_object(
+            project_id,
+            user_id,
+            search_statement.render(id_sql_statement, id_params),
+            search_statement.render(count_sql, count_params),
+            count,
+        )
+        extended_search.session_id = __write_user_session_entry(user_session_data)
+    profile_result = search_profile_item.finish()
+    if profile:
+        extended_search.profile = profile_result
+    return extended_search
+
+
+def resolve_records_by_id_list(
+    user_id: str,
+    project_id: str,
+    record_ids: List[str],
+    limit: int,
+    offset: int,
+    cursor: Optional[str] = None,
+) -> ExtendedSearch:
+    """
+    Records in the order of the given ids, e.g. the neighbours of a similarity search.
+    The page and the labeling session are ordered by the position within the list.
+    """
+    sort_keys = search_keyset.with_tiebreak([SortKey("id_list.position", "ASC")])
+    cursor_values = None
+    if cursor:
+        cursor_values = search_keyset.decode_cursor(cursor, sort_keys)
+        offset = 0
+
+    params = QueryParams(project_id)
     sql = __basic_query(
-        project_id,
+        params,
         limit,
         offset,
-        slice_id,
-        order_by_add,
-        select_add,
-        from_add,
+        sort_keys,
+        cursor_values=cursor_values,
+        record_ids=record_ids,
     )
-    count_sql = __count_dsra(slice_id)
-    count = general.execute_first(count_sql)[0]
+    count_params = QueryParams(project_id)
+    count_sql = __count_id_list(record_ids, count_params)
+    count = search_statement.execute_count(count_sql, count_params)
 
     extended_search = ExtendedSearch(
-        sql=sql,
+        sql=search_statement.render(sql, params),
         query_limit=limit,
         query_offset=offset,
         full_count=count,
     )
-    if __seed_number:
-        local_seed = __seed_number
-        __seed_number = None
-        general.execute(f"SELECT setseed({local_seed});")
-
-    extended_search.record_list = [record for record in general.execute_all(sql)]
+    extended_search.record_list = search_statement.execute_all(sql, params)
+    extended_search.next_cursor = search_keyset.build_next_cursor(
+        sort_keys, extended_search.record_list, limit
+    )
 
-    select_statement = __select_record_data(
-        project_id, slice_id, order_by_add, select_add, from_add
+    id_params = QueryParams(project_id)
+    select_statement = __select_record_data(id_params, sort_keys, record_ids=record_ids)
+    id_sql_statement = __build_final_query(
+        select_statement, id_params, False, True, sort_keys
     )
-    id_sql_statement = __build_final_query(select_statement, project_id, False, True)
+    id_sql_statement += search_keyset.build_order_by(sort_keys)
     user_session_data = __create_static_user_session_object(
         project_id,
         user_id,
-        id_sql_statement,
-        count_sql,
+        search_statement.render(id_sql_statement, id_params),
+        search_statement.render(count_sql, count_params),
         count,
-        local_seed,
     )
     extended_search.session_id = __write_user_session_entry(user_session_data)
     return extended_search
@@ -133,52 +277,159 @@ def resolve_extended_search(
     filter_data: List[Dict[str, Any]],
     limit: int,
     offset: int,
+    cursor: Optional[str] = None,
+    count_mode: Optional[str] = None,
+    profile: bool = False,
+    facets: bool = False,
 ) -> ExtendedSearch:
-    global __seed_number
-    local_seed = None
-
-    __ensure_text(filter_data)
-    sql_statement_count = generate_count_sql(project_id, filter_data)
-
-    count = general.execute_distinct_count(sql_statement_count)
-
-    sql_statement_normal = generate_select_sql(project_id, filter_data, limit, offset)
-
-    extended_search = ExtendedSearch(
-        sql=sql_statement_normal,
-        query_limit=limit,
-        query_offset=offset,
-        full_count=count,
-    )
-    if __seed_number:
-        local_seed = __seed_number
-        __seed_number = None
-        general.execute(f"SELECT setseed({local_seed});")
-    extended_search.record_list = [
-        record for record in general.execute_all(sql_statement_normal)
-    ]
-
-    user_session_data = __create_default_user_session_object(
-        project_id, user_id, filter_data, sql_statement_count, count, local_seed
+    """
+    With profile set, the cache is skipped and the result contains the timings per phase
+    and the executed plans. Timings of executed searches are always kept per filter shape.
+    With facets set, the label, source and annotator counts of the filtered records are added.
+    """
+    cache_key = search_cache.build_key(
+        filter_data, limit, offset, cursor, count_mode, facets
     )
+    data_version = search_cache.get_data_version(project_id)
+    cached = None
+    if not profile:
+        cached = search_cache.get(project_id, cache_key, data_version)
+    search_profile_item = None
+    if cached:
+        search_result, user_session_data = cached
+    else:
+        search_profile_item = search_profile.SearchProfile(
+            search_profile.build_shape(filter_data), profile
+        )
+        search_result, user_session_data = __execute_extended_search(
+            project_id,
+            user_id,
+            filter_data,
+            limit,
+            offset,
+            cursor,
+            count_mode,
+            search_profile_item,
+            facets,
+        )
+        search_cache.put(
+            project_id, cache_key, data_version, (search_result, user_session_data)
+        )
 
-    extended_search.session_id = __write_user_session_entry(user_session_data)
+    # the session belongs to the requesting user, even if the result was cached for another one
+    extended_search = ExtendedSearch(**search_result)
+    if search_profile_item:
+        with search_profile_item.phase("session"):
+            extended_search.session_id = __write_user_session_entry(
+                replace(user_session_data, created_by=user_id)
+            )
+        profile_result = search_profile_item.finish()
+        if profile:
+            extended_search.profile = profile_result
+    else:
+        extended_search.session_id = __write_user_session_entry(
+            replace(user_session_data, created_by=user_id)
+        )
     return extended_search
 
 
-def __ensure_text(filter_data: List[Union[str, Dict[str, Any]]]) -> None:
-    for idx, element in enumerate(filter_data):
-        if isinstance(element, str):
-            filter_data[idx] = element.replace("'", "''")
-            continue
-        if isinstance(element, dict):
-            for key in element:
-                if isinstance(element[key], str):
-                    element[key] = element[key].replace("'", "''")
-                    continue
-                if isinstance(element[key], list):
-                    __ensure_text(element[key])
-                    continue
+def __execute_extended_search(
+    project_id: str,
+    user_id: str,
+    filter_data: List[Dict[str, Any]],
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+    count_mode: Optional[str],
+    search_profile_item: search_profile.SearchProfile,
+    facets: bool,
+) -> Tuple[Dict[str, Any], UserSessionData]:
+    with search_profile_item.phase("build"):
+        sort_keys = __get_sort_keys(filter_data, project_id)
+        cursor_values = None
+        if cursor:
+            cursor_values = search_keyset.decode_cursor(cursor, sort_keys)
+            offset = 0
+
+        count_mode = __get_count_mode(count_mode)
+        if facets:
+            # the filtered records are collected for the facets, counting them as well is free
+            count_mode = SearchCountMode.COMBINED
+        sql_statement_count, count_params = generate_count_sql(project_id, filter_data)
+    count = None
+    count_approximate = False
+    with search_profile_item.phase("count"):
+        if count_mode == SearchCountMode.ESTIMATED:
+            estimate = search_statement.estimate_count(
+                *generate_estimate_sql(project_id, filter_data)
+            )
+            if estimate >= ESTIMATE_MIN_ROWS:
+                count = estimate
+                count_approximate = True
+            else:
+                count_mode = SearchCountMode.COMBINED
+        elif count_mode == SearchCountMode.SEPARATE:
+            count = search_statement.execute_count(sql_statement_count, count_params)
+
+    with search_profile_item.phase("build"):
+        sql_statement_normal, params = generate_select_sql(
+            project_id,
+            filter_data,
+            limit,
+            offset,
+            False,
+            sort_keys,
+            cursor_values,
+            count_mode == SearchCountMode.COMBINED,
+            facets,
+        )
+
+    with search_profile_item.phase("page"):
+        record_list = search_statement.execute_all(sql_statement_normal, params)
+    facet_counts = None
+    if record_list:
+        if count is None:
+            count = record_list[0]._mapping[FULL_COUNT_COLUMN]
+        if facets:
+            facet_counts = __to_facets(record_list[0]._mapping[FACETS_COLUMN])
+    elif count is None:
+        # the page is empty, e.g. an offset behind the last record
+        with search_profile_item.phase("count"):
+            if facets:
+                facet_sql, facet_params = generate_facet_sql(project_id, filter_data)
+                count, facet_rows = search_statement.execute_all(
+                    facet_sql, facet_params
+                )[0]
+                facet_counts = __to_facets(facet_rows)
+            else:
+                count = search_statement.execute_count(
+                    sql_statement_count, count_params
+                )
+    if count_mode == SearchCountMode.SEPARATE:
+        search_profile_item.add_plan("count", sql_statement_count, count_params)
+    search_profile_item.add_plan("page", sql_statement_normal, params)
+
+    search_result = {
+        "sql": search_statement.render(sql_statement_normal, params),
+        "query_limit": limit,
+        "query_offset": offset,
+        "full_count": count,
+        "full_count_approximate": count_approximate,
+        "record_list": record_list,
+        "next_cursor": search_keyset.build_next_cursor(sort_keys, record_list, limit),
+        "facets": facet_counts,
+    }
+
+    with search_profile_item.phase("session"):
+        user_session_data = __create_default_user_session_object(
+            project_id,
+            user_id,
+            filter_data,
+            sort_keys,
+            search_statement.render(sql_statement_count, count_params),
+            -1 if count_approximate else count,
+        )
+    return search_result, user_session_data
 
 
 def resolve_labeling_session(
@@ -195,41 +446,23 @@ def resolve_labeling_session(
 def collect_user_session_record_ids(
     user_session: UserSessions, project_id: str
 ) -> None:
-    # currently fixed values. In the future this might be changed to a dynamic value
-    limit = 1000
-    offset = 0
-
-    # create_notification(
-    #     NotificationType.COLLECTING_SESSION_DATA, user_session.created_by, project_id,
-    # )
-
-    current_count = general.execute_distinct_count(user_session.count_sql_statement)
-    if current_count != user_session.last_count and user_session.last_count != -1:
-        create_notification(
-            NotificationType.SESSION_RECORD_AMOUNT_CHANGED,
-            user_session.created_by,
-            project_id,
-        )
-    user_session.last_count = current_count
-
-    if current_count > limit:
-        create_notification(
-            NotificationType.SESSION_INFO,
-            user_session.created_by,
-            project_id,
-            limit,
-        )
-
-    update_query = __build_record_session_update_query(
-        user_session.id_sql_statement, limit, offset, user_session.id
+    # only the first window is stored on the session, the next ones follow on request
+    user_session.session_record_ids = search_session.open_session(
+        user_session, project_id
     )
-    if user_session.random_seed:
-        general.execute(f"SELECT setseed({user_session.random_seed});")
-    general.execute(update_query)
     user_session.temp_session = False
     general.commit()
 
 
+def get_labeling_session_window(
+    project_id: str, user_id: str, session_id: str, window_index: int
+) -> Optional[Dict[str, Any]]:
+    user_session = __collect_user_session_data_from_db(project_id, session_id, user_id)
+    if not user_session.session_record_ids:
+        collect_user_session_record_ids(user_session, project_id)
+    return search_session.get_window(project_id, user_session.id, window_index)
+
+
 def __collect_user_session_data_from_db(
     project_id: str, session_id: str, user_id: str
 ) -> UserSessions:
@@ -248,30 +481,27 @@ def __create_default_user_session_object(
     project_id: str,
     user_id: str,
     filter_data: List[Dict[str, Any]],
+    sort_keys: List[SortKey],
     count_sql_statement: str,
     last_count: int,
-    random_seed: int,
 ) -> UserSessionData:
     id_sql_statement = ""
+    params = QueryParams(project_id)
 
     if len(filter_data) == 0:
-        id_sql_statement = __basic_id_query(project_id)
+        id_sql_statement = __basic_id_query(params, sort_keys)
     else:
-        inner_sql = __build_inner_query(filter_data, project_id, 0, 0, False)
-        id_sql_statement = __build_final_query(inner_sql, project_id, False, True)
-        order_extention = __get_order_by(filter_data, project_id)
-
-        if order_extention != "":
-            id_sql_statement += order_extention
-        else:
-            id_sql_statement += "ORDER BY db_order"
+        inner_sql = __build_inner_query(filter_data, params, 0, 0, sort_keys)
+        id_sql_statement = __build_final_query(
+            inner_sql, params, False, True, sort_keys
+        )
+        id_sql_statement += search_keyset.build_order_by(sort_keys)
     return UserSessionData(
         project_id,
-        id_sql_statement,
+        search_statement.render(id_sql_statement, params),
         count_sql_statement,
         last_count,
         user_id,
-        random_seed,
     )
 
 
@@ -281,7 +511,6 @@ def __create_static_user_session_object(
     id_sql_statement: str,
     count_sql_statement: str,
     last_count: int,
-    random_seed: int,
 ) -> UserSessionData:
     return UserSessionData(
         project_id,
@@ -289,7 +518,6 @@ def __create_static_user_session_object(
         count_sql_statement,
         last_count,
         user_id,
-        random_seed,
     )
 
 
@@ -299,19 +527,95 @@ def __write_user_session_entry(user_session_data: UserSessionData) -> str:
     return session.id
 
 
-def generate_count_sql(project_id: str, filter_data: List[Dict[str, Any]]) -> str:
+def generate_count_sql(
+    project_id: str, filter_data: List[Dict[str, Any]]
+) -> Tuple[str, QueryParams]:
+    params = QueryParams(project_id)
+    if len(filter_data) == 0:
+        return __basic_count_query(params), params
+    # no limit or offset since we want to count all
+    inner_sql = __build_inner_query(filter_data, params, 0, 0, None)
+    final_sql = __build_final_query(inner_sql, params, True, False)
+    return final_sql, params
+
 
+def generate_estimate_sql(
+    project_id: str, filter_data: List[Dict[str, Any]]
+) -> Tuple[str, QueryParams]:
+    params = QueryParams(project_id)
     if len(filter_data) == 0:
-        return f"""
-        SELECT COUNT(*) distinct_count
-        FROM record
-        WHERE project_id = '{project_id}'
-        AND category = '{RecordCategory.SCALE.value}'
+        return (
+            f"""
+        SELECT r.id
+        FROM record r
+        WHERE r.project_id = {params.project_id}
+        AND r.category = '{RecordCategory.SCALE.value}'
+        """,
+            params,
+        )
+    return __build_base_query(filter_data, params, None), params
+
+
+def generate_facet_sql(
+    project_id: str, filter_data: List[Dict[str, Any]]
+) -> Tuple[str, QueryParams]:
+    """
+    Count and facets without the page, for searches whose page is empty.
+    """
+    params = QueryParams(project_id)
+    if len(filter_data) == 0:
+        base_sql = __basic_id_base_query(params)
+    else:
+        base_sql = __build_base_query(filter_data, params, None)
+    return (
+        f"""
+        WITH search_base AS ( {base_sql} )
+        SELECT search_count.{FULL_COUNT_COLUMN}, search_facets.{FACETS_COLUMN}
+        FROM (
+            SELECT COUNT(*) {FULL_COUNT_COLUMN}
+            FROM search_base
+        ) search_count
+        CROSS JOIN ( {__build_facets(params)} ) search_facets
+        """,
+        params,
+    )
+
+
+def __build_facets(params: QueryParams) -> str:
+    # reads the search_base of the surrounding statement, so the filtered records are
+    # collected once for the page, the count and the facets
+    return f"""
+        WITH facet_rla AS (
+            SELECT rla.record_id, rla.labeling_task_label_id, rla.source_type, rla.source_id, rla.created_by
+            FROM search_base b
+            INNER JOIN record_label_association rla
+                ON rla.project_id = {params.project_id} AND rla.record_id = b.record_id
+        )
+        SELECT json_agg(json_build_array(facet, facet_key, facet_source, facet_count)) {FACETS_COLUMN}
+        FROM (
+            SELECT 'LABEL' facet, labeling_task_label_id::TEXT facet_key, source_type facet_source, COUNT(DISTINCT record_id) facet_count
+            FROM facet_rla
+            GROUP BY labeling_task_label_id, source_type
+            UNION ALL
+            SELECT 'SOURCE', source_type || COALESCE(':' || source_id::TEXT, ''), NULL, COUNT(DISTINCT record_id)
+            FROM facet_rla
+            GROUP BY source_type, source_id
+            UNION ALL
+            SELECT 'ANNOTATOR', created_by::TEXT, NULL, COUNT(DISTINCT record_id)
+            FROM facet_rla
+            WHERE source_type = '{LabelSource.MANUAL.value}' AND created_by IS NOT NULL
+            GROUP BY created_by
+        ) facet_rows
+        """
+
+
+def __basic_id_base_query(params: QueryParams) -> str:
+    return f"""
+        SELECT r.id record_id
+        FROM record r
+        WHERE r.project_id = {params.project_id}
+        AND r.category = '{RecordCategory.SCALE.value}'
         """
-    # no limit or offset since we want to count all
-    inner_sql = __build_inner_query(filter_data, project_id, 0, 0, True)
-    final_sql = __build_final_query(inner_sql, project_id, True, False)
-    return final_sql
 
 
 def generate_select_sql(
@@ -320,68 +624,123 @@ def generate_select_sql(
     limit,
     offset,
     for_id: Optional[bool] = False,
-) -> str:
-
+    sort_keys: Optional[List[SortKey]] = None,
+    cursor_values: Optional[List[Any]] = None,
+    with_count: Optional[bool] = False,
+    with_facets: Optional[bool] = False,
+) -> Tuple[str, QueryParams]:
+    # facets are only collected together with the count
+    params = QueryParams(project_id)
+    if sort_keys is None:
+        sort_keys = __get_sort_keys(filter_data, project_id)
     if len(filter_data) == 0:
-        return __basic_query(project_id, limit, offset)
-
-    inner_sql = __build_inner_query(filter_data, project_id, limit, offset, False)
-    final_sql = __build_final_query(inner_sql, project_id, False, for_id)
-
-    order_extention = __get_order_by(filter_data, project_id)
+        sql = __basic_query(
+            params,
+            limit,
+            offset,
+            sort_keys,
+            cursor_values=cursor_values,
+            with_count=with_count,
+            with_facets=with_facets,
+        )
+        return sql, params
 
-    if order_extention != "":
-        final_sql += order_extention
+    if with_count:
+        base_sql = __build_base_query(filter_data, params, sort_keys, ordered=False)
+        inner_sql = __build_counted_page(
+            base_sql, sort_keys, cursor_values, limit, offset, params, with_facets
+        )
     else:
-        final_sql += "ORDER BY db_order"
-    return final_sql
+        inner_sql = __build_inner_query(
+            filter_data, params, limit, offset, sort_keys, cursor_values
+        )
+    final_sql = __build_final_query(inner_sql, params, False, for_id)
+    final_sql += search_keyset.build_order_by(sort_keys)
+    return final_sql, params
 
 
 def __build_inner_query(
     filter_data: List[Dict[str, Any]],
-    project_id: str,
+    params: QueryParams,
     limit: int,
     offset: int,
-    for_count: bool,
+    sort_keys: Optional[List[SortKey]],
+    cursor_values: Optional[List[Any]] = None,
 ) -> str:
-    sql = __build_base_query(filter_data, project_id, for_count)
-    sql = __add_limit_and_offset(sql, limit, offset)
+    sql = __build_base_query(filter_data, params, sort_keys, cursor_values)
+    sql = __add_limit_and_offset(sql, limit, offset, params)
     return sql
 
 
+def __build_counted_page(
+    base_sql: str,
+    sort_keys: List[SortKey],
+    cursor_values: Optional[List[Any]],
+    limit: int,
+    offset: int,
+    params: QueryParams,
+    with_facets: bool = False,
+) -> str:
+    # the filtered records are collected once and used for the page, the count and the facets
+    alias_keys = search_keyset.as_aliases(sort_keys)
+    condition = None
+    if cursor_values is not None:
+        condition = search_keyset.build_condition(alias_keys, cursor_values, params)
+    page_sql = search_keyset.build_window(
+        "SELECT * FROM search_base", alias_keys, condition
+    )
+    page_sql = __add_limit_and_offset(page_sql, limit, offset, params)
+    facet_column, facet_join = "", ""
+    if with_facets:
+        facet_column = f", search_facets.{FACETS_COLUMN}"
+        facet_join = f"CROSS JOIN ( {__build_facets(params)} ) search_facets"
+    return f"""
+        WITH search_base AS ( {base_sql} )
+        SELECT page.*, search_count.{FULL_COUNT_COLUMN}{facet_column}
+        FROM ( {page_sql} ) page
+        CROSS JOIN (
+            SELECT COUNT(*) {FULL_COUNT_COLUMN}
+            FROM search_base
+        ) search_count
+        {facet_join}
+        """
+
+
 def __build_base_query(
-    filter_data: List[Dict[str, Any]], project_id: str, for_count: bool
+    filter_data: List[Dict[str, Any]],
+    params: QueryParams,
+    sort_keys: Optional[List[SortKey]],
+    cursor_values: Optional[List[Any]] = None,
+    ordered: bool = True,
 ) -> str:
+    # without sort keys the query is only counted
     select_add = ""
     from_add = ""
     where_add = ""
-    if for_count:
-        order_by_add = ""
-    else:
-        order_by_add = __get_order_by(filter_data, project_id)
+    order_by_add = ""
 
-    where_add = __build_where_add(filter_data)
+    where_add = __build_where_add(filter_data, params)
 
     tmp_selection_add, tmp_from_add = __build_subquery_data(
-        filter_data, project_id, "WHITELIST"
+        filter_data, params, "WHITELIST"
     )
     select_add += tmp_selection_add
     from_add += tmp_from_add
 
     tmp_where_add, tmp_from_add = __build_subquery_data(
-        filter_data, project_id, "BLACKLIST"
+        filter_data, params, "BLACKLIST"
     )
     where_add += tmp_where_add
     from_add += tmp_from_add
 
-    if order_by_add != "":
-        tmp_selection_add, tmp_from_add = __get_order_by_subquery(
-            filter_data, project_id
-        )
-        select_add += tmp_selection_add
-        from_add += tmp_from_add
-    else:
-        select_add += ", ROW_NUMBER() OVER() db_order"
+    if sort_keys:
+        select_add += search_keyset.build_select(sort_keys, params)
+        from_add += __get_order_by_subquery(filter_data, params)
+        if ordered:
+            order_by_add = search_keyset.build_order_by(sort_keys)
+        if cursor_values is not None:
+            condition = search_keyset.build_condition(sort_keys, cursor_values, params)
+            where_add += f"\n    AND {condition}"
 
     # final build
     base_sql = get_query_template(SearchQueryTemplate.BASE_QUERY)
@@ -390,7 +749,7 @@ def __build_base_query(
     base_sql = base_sql.replace("@@WHERE_ADD@@", where_add)
     base_sql = base_sql.replace("@@ORDER_BY_ADD@@", order_by_add)
 
-    base_sql = base_sql.replace("@@PROJECT_ID@@", project_id)
+    base_sql = base_sql.replace("@@PROJECT_ID@@", params.project_id)
 
     # format a bit
     base_sql = base_sql.replace("\n\n", "\n")
@@ -400,7 +759,7 @@ def __build_base_query(
 
 
 def __build_subquery_data(
-    filter_data: List[Dict[str, Any]], project_id: str, type_key: str
+    filter_data: List[Dict[str, Any]], params: QueryParams, type_key: str
 ) -> Tuple[str, str]:
     c = 1
     select_add = ""
@@ -410,7 +769,7 @@ def __build_subquery_data(
     queries = __get_subqueries(filter_data, type_key)
     for query in queries:
         alias = type_key[0] + "L_" + str(c)
-        query_text = __build_subquery(query, project_id, 1)
+        query_text = __build_subquery(query, params, 1)
         if type_key == "WHITELIST":
             select_add += f", {alias}.*"
             from_add += f"""
@@ -430,7 +789,7 @@ LEFT JOIN ( {query_text} ) {alias}
 
 
 def __build_subquery(
-    query_data: List[Dict[str, Any]], project_id: str, depth: int
+    query_data: List[Dict[str, Any]], params: QueryParams, depth: int
 ) -> str:
 
     final_query = ""
@@ -442,7 +801,7 @@ def __build_subquery(
         tmp_query = build_query_template(
             query_template_key,
             filter_element[FilterDataDictKeys.VALUES.value],
-            project_id,
+            params,
         )
         if final_query != "":
             final_query += "\nUNION "
@@ -454,24 +813,26 @@ def __build_subquery(
 
 
 def __build_where_add(
-    filter_data: List[Dict[str, Any]], outer: Optional[bool] = True
+    filter_data: List[Dict[str, Any]],
+    params: QueryParams,
+    outer: Optional[bool] = True,
 ) -> str:
     current_condition = ""
     for filter_element in filter_data:
         ret = ""
         if FilterDataDictKeys.OPERATOR.value in filter_element:
-            ret = build_search_condition(filter_element)
+            ret = build_search_condition(filter_element, params)
 
         if FilterDataDictKeys.FILTER.value in filter_element:
             ret = __build_where_add(
-                filter_element[FilterDataDictKeys.FILTER.value], False
+                filter_element[FilterDataDictKeys.FILTER.value], params, False
             )
             if ret != "" and ret[0] != "(":
                 ret = f"( {ret} )"
         if ret != "" and filter_element[FilterDataDictKeys.NEGATION.value]:
             ret = f" NOT ( {ret} )"
         if ret != "" and filter_element[FilterDataDictKeys.RELATION.value] != "NONE":
-            ret = f" {filter_element[FilterDataDictKeys.RELATION.value]} {ret} "
+            ret = f" {__build_relation(filter_element)} {ret} "
         current_condition += ret
 
     if current_condition != "" and outer:
@@ -491,32 +852,26 @@ def __get_subqueries(filter_data: List[Dict[str, Any]], type_key: str) -> List[A
 
 
 def __get_order_by_subquery(
-    filter_data: List[Dict[str, Any]], project_id: str
-) -> Tuple[str, str]:
+    filter_data: List[Dict[str, Any]], params: QueryParams
+) -> str:
     for filter_element in filter_data:
         if FilterDataDictKeys.ORDER_BY.value in filter_element:
-            return __build_order_by_subquery(filter_element, project_id)
-    return "", ""
+            return __build_order_by_subquery(filter_element, params)
+    return ""
 
 
 def __build_order_by_subquery(
-    filter_element: Dict[str, str], project_id: str
-) -> Tuple[str, str]:
+    filter_element: Dict[str, str], params: QueryParams
+) -> str:
     order_subqueries = []
-    random_requested = False
-    select_append = ""
     for column, direction in zip(
         filter_element[FilterDataDictKeys.ORDER_BY.value],
         filter_element[FilterDataDictKeys.ORDER_DIRECTION.value],
     ):
         if column == "RANDOM":
-            random_requested = True
             continue
         tmp = build_order_by_table_select(column, direction)
-        if tmp == "RECORD":
-            data_type = attribute.get_data_type(project_id, column.split("@")[1])
-            select_append += ", " + build_order_column_record_data(column, data_type)
-        elif tmp:
+        if tmp and tmp != "RECORD":
             order_subqueries.append(tmp)
 
     order_subqueries = sorted(order_subqueries, key=lambda i: i["TABLE"])
@@ -528,6 +883,7 @@ def __build_order_by_subquery(
         if order_subquery["TABLE"] != table and table != "" and sql_columns != "":
             template = get_query_template(order_subquery["TEMPLATE_KEY"])
             template = template.replace("@@ORDER_COLUMNS@@", sql_columns)
+            template = template.replace("@@PROJECT_ID@@", params.project_id)
             return_query += template
             table = order_subquery["TABLE"]
             sql_columns = ""
@@ -535,54 +891,72 @@ def __build_order_by_subquery(
         if sql_columns != "":
             sql_columns += ", "
         sql_columns += order_subquery["COL_TEXT"]
-        select_append += ", " + order_subquery["SELECT_APPEND"]
 
     if sql_columns != "":
         template = get_query_template(order_subquery["TEMPLATE_KEY"])
         template = template.replace("@@ORDER_COLUMNS@@", sql_columns)
+        template = template.replace("@@PROJECT_ID@@", params.project_id)
         return_query += template
 
-    if random_requested:
-        select_append += ", RANDOM() rnd_order"
-
-    return select_append, return_query
+    return return_query
 
 
-def __get_order_by(filter_data: List[Dict[str, str]], project_id: str) -> str:
-
+def __get_sort_keys(
+    filter_data: List[Dict[str, Any]], project_id: str
+) -> List[SortKey]:
     for filter_element in filter_data:
         if FilterDataDictKeys.ORDER_BY.value in filter_element:
-            return __build_order_by(filter_element, project_id)
-    return ""
-
+            return __build_sort_keys(filter_element, project_id)
+    return search_keyset.with_tiebreak([])
 
-def __build_order_by(filter_element: Dict[str, str], project_id: str) -> str:
-    global __seed_number
-
-    order_statement = ""
 
+def __build_sort_keys(filter_element: Dict[str, str], project_id: str) -> List[SortKey]:
+    sort_keys = []
+    ordered_attributes = search_index.get_indexed_attributes(
+        project_id, search_index.ORDER
+    )
     for column, direction in zip(
         filter_element[FilterDataDictKeys.ORDER_BY.value],
         filter_element[FilterDataDictKeys.ORDER_DIRECTION.value],
     ):
-        if order_statement != "":
-            order_statement += ", "
-        if "@" in column:
-            order_statement += build_order_by_record_data(column, direction)
-        elif column == "RANDOM":
-            __seed_number = __string_to_postgres_seed(direction)
-            order_statement += "rnd_order"
+        # for random the direction holds the seed
+        order_direction = "ASC" if direction == "ASC" else "DESC"
+        if column == "RANDOM":
+            sort_keys.append(__build_random_order_key(direction))
+        elif "@" in column:
+            attribute_name = column.split("@")[1]
+            data_type = attribute.get_data_type(project_id, attribute_name)
+            if (
+                data_type == DataTypes.TEXT.value
+                and attribute_name in ordered_attributes
+            ):
+                # the order index holds the prefix, the whole text only breaks its ties
+                sort_keys.append(
+                    SortKey(
+                        build_order_prefix_record_data(
+                            column, search_index.ORDER_TEXT_PREFIX_LENGTH
+                        ),
+                        order_direction,
+                    )
+                )
+            sort_keys.append(
+                SortKey(
+                    build_order_column_record_data(column, data_type), order_direction
+                )
+            )
         else:
-            order_statement += build_order_by_column(column, direction)
-
-    if order_statement != "":
-        return f"""ORDER BY {order_statement}"""
-
-    return order_statement
+            sort_keys.append(
+                SortKey(build_order_by_column(column, direction), order_direction)
+            )
+    return search_keyset.with_tiebreak(sort_keys)
 
 
 def __build_final_query(
-    inner_select: str, project_id: str, for_count: bool, for_id: bool
+    inner_select: str,
+    params: QueryParams,
+    for_count: bool,
+    for_id: bool,
+    sort_keys: Optional[List[SortKey]] = None,
 ) -> str:
 
     if for_count:
@@ -592,8 +966,15 @@ def __build_final_query(
         """
     else:
         if for_id:
+            # sort keys are exposed for stored statements so they can be windowed later on
+            key_columns = ""
+            if sort_keys:
+                key_columns = "".join(
+                    f", id_grabber.{search_keyset.alias(idx, sort_key)}"
+                    for idx, sort_key in enumerate(sort_keys)
+                )
             return f"""
-        SELECT id_grabber.record_id
+        SELECT id_grabber.record_id{key_columns}
         FROM ( {inner_select} ) id_grabber
         """
         else:
@@ -606,133 +987,203 @@ def __build_final_query(
         LEFT JOIN (
             SELECT project_id data_pID, record_id data_rID, json_agg(row_to_json(record_label_association)) rla_data
             FROM record_label_association
-            WHERE project_id = '{project_id}'
+            WHERE project_id = {params.project_id}
             GROUP BY project_id, record_id
         ) data_grabber
             ON id_grabber.record_id = data_grabber.data_rID 
             AND id_grabber.project_id = data_grabber.data_pID
-        WHERE r.project_id = '{project_id}'
+        WHERE r.project_id = {params.project_id}
         """
 
 
-def __build_record_session_update_query(
-    inner_select: str, limit: int, offset: int, session_id: str
-) -> str:
-    if limit != 0:
-        inner_select += f"\n LIMIT {limit}"
-        if offset != 0:
-            inner_select += f" OFFSET {offset}"
-
-    return f"""
-UPDATE user_sessions SET session_record_ids = (SELECT json_agg(record_id) 
-FROM ( {inner_select} ) r) WHERE id = '{session_id}' """
-
-
 def __basic_query(
-    project_id: str,
+    params: QueryParams,
     limit: int,
     offset: int,
+    sort_keys: List[SortKey],
     slice_id: Optional[str] = None,
-    order_by: Optional[str] = None,
     select_add: Optional[str] = None,
     from_add: Optional[str] = None,
+    cursor_values: Optional[List[Any]] = None,
+    with_count: Optional[bool] = False,
+    record_ids: Optional[List[str]] = None,
+    with_facets: Optional[bool] = False,
 ) -> str:
 
-    sql = __select_record_data(project_id, slice_id, order_by, select_add, from_add)
-    sql = __add_limit_and_offset(sql, limit, offset)
-    sql = __select_full_extended_search(project_id, sql, order_by)
+    sql = __select_record_data(
+        params, sort_keys, slice_id, select_add, from_add, cursor_values, record_ids
+    )
+    sql = __add_limit_and_offset(sql, limit, offset, params)
+    if with_count:
+        # without filters the count is cheap, the records don't need to be collected for it
+        facet_column, facet_join = "", ""
+        if with_facets:
+            facet_column = f", search_facets.{FACETS_COLUMN}"
+            facet_join = f"""CROSS JOIN (
+            WITH search_base AS ( {__basic_id_base_query(params)} )
+            SELECT * FROM ( {__build_facets(params)} ) facets
+        ) search_facets"""
+        sql = f"""
+        SELECT page.*, ( {__basic_count_query(params)} ) {FULL_COUNT_COLUMN}{facet_column}
+        FROM ( {sql} ) page
+        {facet_join}
+        """
+    sql = __select_full_extended_search(params, sql, sort_keys)
     return sql
 
 
-def __select_full_extended_search(project_id: str, sql: str, order_by: str) -> str:
-    if not order_by:
-        order_by = "ORDER BY db_order"
+def __select_full_extended_search(
+    params: QueryParams, sql: str, sort_keys: List[SortKey]
+) -> str:
     return f"""
     SELECT r.*,data_grabber.rla_data
     FROM ({sql}) r
     LEFT JOIN (
         SELECT project_id data_pID, record_id data_rID, json_agg(row_to_json(record_label_association)) rla_data
         FROM record_label_association
-        WHERE project_id = '{project_id}'
+        WHERE project_id = {params.project_id}
         GROUP BY project_id, record_id
     ) data_grabber
         ON r.id = data_grabber.data_rID 
         AND r.project_id = data_grabber.data_pID
-    {order_by}
+    {search_keyset.build_order_by(sort_keys)}
     """
 
 
 def __select_record_data(
-    project_id: str,
+    params: QueryParams,
+    sort_keys: List[SortKey],
     slice_id: Optional[str] = None,
-    order_by: Optional[str] = None,
     select_add: Optional[str] = None,
     from_add: Optional[str] = None,
+    cursor_values: Optional[List[Any]] = None,
+    record_ids: Optional[List[str]] = None,
 ) -> str:
-    if not order_by:
-        order_by = "ORDER BY db_order"
     if not select_add:
-        select_add = ", ROW_NUMBER() OVER() db_order"
+        select_add = ""
+    select_add += search_keyset.build_select(sort_keys, params)
     sql = f"""
         SELECT r.*, r.id as record_id {select_add}
         FROM record r
         """
     if slice_id:
-        sql += __join_dsra_on_slice_id(project_id, slice_id)
+        sql += __join_dsra_on_slice_id(params, slice_id)
+    if record_ids is not None:
+        sql += __join_id_list(params, record_ids)
     if from_add:
         sql += from_add
-    sql += f"WHERE r.project_id = '{project_id}' "
-    if not slice_id:
+    sql += f"WHERE r.project_id = {params.project_id} "
+    # id lists are already restricted, like filtered searches they aren't limited to scale records
+    if not slice_id and record_ids is None:
         sql += f"AND r.category = '{RecordCategory.SCALE.value}' "
+    if cursor_values is not None:
+        condition = search_keyset.build_condition(sort_keys, cursor_values, params)
+        sql += f"AND {condition} "
 
-    sql += "\n" + order_by
+    sql += "\n" + search_keyset.build_order_by(sort_keys)
     return sql
 
 
-def __basic_id_query(project_id: str) -> str:
+def __basic_id_query(params: QueryParams, sort_keys: List[SortKey]) -> str:
     return f"""
-        SELECT r.id record_id
+        SELECT r.id record_id{search_keyset.build_select(sort_keys, params)}
         FROM record r
-        WHERE r.project_id = '{project_id}'
+        WHERE r.project_id = {params.project_id}
         AND r.category = '{RecordCategory.SCALE.value}'
+        {search_keyset.build_order_by(sort_keys)}
         """
 
 
-def __add_data_slice_id_and_project_id_column(
-    sql: str, data_slice_id: str, project_id: str
-) -> str:
-    return sql.replace(
-        "SELECT id_grabber.record_id",
-        f"SELECT '{data_slice_id}' as data_slice_id, id_grabber.record_id, '{project_id}' as project_id",
-    )
-
-
-def __add_insert_into_dsra_statement(sql: str) -> str:
-    return f"INSERT INTO {Tablenames.DATA_SLICE_RECORD_ASSOCIATION.value}{sql}"
+def __basic_count_query(params: QueryParams) -> str:
+    return f"""
+        SELECT COUNT(*) distinct_count
+        FROM record
+        WHERE project_id = {params.project_id}
+        AND category = '{RecordCategory.SCALE.value}'
+        """
 
 
-def __add_limit_and_offset(sql: str, limit: int, offset: int) -> str:
+def __add_limit_and_offset(
+    sql: str, limit: int, offset: int, params: QueryParams
+) -> str:
     if limit != 0:
-        sql += f"\nLIMIT {limit} "
+        sql += f"\nLIMIT {params.add(limit)} "
     if offset != 0:
-        sql += f"OFFSET {offset} "
+        sql += f"OFFSET {params.add(offset)} "
     return sql
 
 
-def __join_dsra_on_slice_id(project_id: str, slice_id: str) -> str:
+def __join_dsra_on_slice_id(params: QueryParams, slice_id: str) -> str:
     return f"""INNER JOIN data_slice_record_association dsra
-                ON dsra.project_id = '{project_id}' AND dsra.data_slice_id = '{slice_id}' AND r.id = dsra.record_id AND r.project_id = dsra.project_id
+                ON dsra.project_id = {params.project_id} AND dsra.data_slice_id = {params.add(slice_id, 'UUID')} AND r.id = dsra.record_id AND r.project_id = dsra.project_id
+                """
+
+
+def __join_id_list(params: QueryParams, record_ids: List[str]) -> str:
+    # the ordinality is the position within the list, bound as one array parameter
+    return f"""INNER JOIN unnest({params.add(list(record_ids), 'UUID[]')}) WITH ORDINALITY id_list(record_id, position)
+                ON r.id = id_list.record_id
                 """
 
 
-def __count_dsra(slice_id: str) -> str:
+def __count_id_list(record_ids: List[str], params: QueryParams) -> str:
     return f"""
         SELECT COUNT(*) distinct_count
-        FROM data_slice_record_association dsra
-        WHERE dsra.data_slice_id = '{slice_id}'
+        FROM record r
+        {__join_id_list(params, record_ids)}
+        WHERE r.project_id = {params.project_id}
+        """
+
+
+def __count_static_slice(slice_id: str, params: QueryParams) -> str:
+    # maintained by trigger on the associations, counting them is linear in the slice size
+    return f"""
+        SELECT COALESCE(MAX(ds.count), 0) distinct_count
+        FROM data_slice ds
+        WHERE ds.project_id = {params.project_id}
+        AND ds.id = {params.add(slice_id, 'UUID')}
         """
 
 
-def __string_to_postgres_seed(seed_str: str) -> float:
-    adler = zlib.adler32(bytes(seed_str, "utf-8"))
-    return (adler / 0xFFFFFFFF) - 0.5
+def __build_static_slice_shape(slice_type: str, order_by: Dict[str, Any]) -> str:
+    shape = f"STATIC_SLICE[{slice_type}]"
+    if order_by and FilterDataDictKeys.ORDER_BY.value in order_by:
+        shape += " " + search_profile.build_shape([order_by])
+    return shape
+
+
+def __build_relation(filter_element: Dict[str, Any]) -> str:
+    relation = filter_element[FilterDataDictKeys.RELATION.value]
+    if relation not in ["AND", "OR"]:
+        raise ValueError(f"unknown filter relation: {relation}")
+    return relation
+
+
+def __to_facets(rows: Optional[List[Any]]) -> Dict[str, Dict[str, Any]]:
+    # labels are split by source type, sources are keyed by type and id
+    facets = {"labels": {}, "sources": {}, "annotators": {}}
+    for facet, key, source, count in rows or []:
+        if facet == "LABEL":
+            facets["labels"].setdefault(key, {})[source] = count
+        elif facet == "SOURCE":
+            facets["sources"][key] = count
+        else:
+            facets["annotators"][key] = count
+    return facets
+
+
+def __get_count_mode(count_mode: Optional[str]) -> SearchCountMode:
+    if not count_mode:
+        return COUNT_MODE
+    if count_mode not in SearchCountMode.__members__:
+        raise ValueError(f"unknown count mode: {count_mode}")
+    return SearchCountMode[count_mode]
+
+
+def __build_random_order_key(seed_str: str) -> SortKey:
+    # the order follows from the record id and the seed alone, so no session state is needed
+    # and the order can be paged with a cursor like any other
+    seed = hashlib.sha1(bytes(seed_str, "utf-8")).hexdigest()[:16]
+    return SortKey(
+        "md5(r.id::TEXT || CAST(%(random_seed)s AS TEXT))", "ASC", {"random_seed": seed}
+    )
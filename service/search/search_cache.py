@@ -0,0 +1,113 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from util import db_connection
+
+USE_CACHE = os.getenv("SEARCH_CACHE", "1") != "0"
+# entries of all projects, least recently used ones are dropped first
+MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 1000))
+# seconds between the compactions of the changes into the data versions
+COMPACT_INTERVAL = int(os.getenv("SEARCH_CACHE_COMPACT_INTERVAL", 30))
+
+__entries = OrderedDict()
+__lock = threading.Lock()
+__statistics = {"hits": 0, "misses": 0, "outdated": 0}
+
+
+def build_key(
+    filter_data: List[Dict[str, Any]],
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+    count_mode: Optional[str],
+    facets: bool = False,
+) -> str:
+    # filter elements are dicts, the key order of the frontend doesn't matter
+    return json.dumps(
+        [filter_data, limit, offset, cursor, count_mode, facets],
+        sort_keys=True,
+        default=str,
+    )
+
+
+def get_data_version(project_id: str) -> Tuple[int, bool]:
+    """
+    Database triggers append a change on every write to records, label associations and
+    attributes, a scheduled job compacts them into the version of the project. Results
+    aren't cached while changes are pending, so a transaction that commits late is covered.
+    """
+    rows = db_connection.execute(
+        """
+        SELECT
+            COALESCE((SELECT version FROM search_data_version WHERE project_id = %(project_id)s), 0),
+            EXISTS (SELECT 1 FROM search_data_change WHERE project_id = %(project_id)s)
+        """,
+        {"project_id": project_id},
+        fetch=True,
+    )
+    version, has_changes = rows[0]
+    return version, has_changes
+
+
+def compact_changes() -> None:
+    """
+    Adds the pending changes of all projects to their version. Changes that commit during
+    the compaction aren't visible yet and stay for the next one.
+    """
+    db_connection.execute(
+        """
+        WITH removed AS (
+            DELETE FROM search_data_change
+            RETURNING project_id
+        )
+        INSERT INTO search_data_version (project_id, version)
+        SELECT project_id, COUNT(*)
+        FROM removed
+        GROUP BY project_id
+        ON CONFLICT (project_id) DO UPDATE
+        SET version = search_data_version.version + EXCLUDED.version
+        """
+    )
+
+
+def get(project_id: str, key: str, data_version: Tuple[int, bool]) -> Optional[Any]:
+    if not USE_CACHE or data_version[1]:
+        return None
+    with __lock:
+        entry = __entries.get((project_id, key))
+        if not entry:
+            __statistics["misses"] += 1
+            return None
+        if entry[0] != data_version:
+            __statistics["outdated"] += 1
+            del __entries[(project_id, key)]
+            return None
+        __statistics["hits"] += 1
+        __entries.move_to_end((project_id, key))
+        return entry[1]
+
+
+def put(project_id: str, key: str, data_version: Tuple[int, bool], value: Any) -> None:
+    """
+    The data version has to be read before the search was executed, so changes during
+    the execution lead to a miss on the next lookup.
+    """
+    if not USE_CACHE or data_version[1]:
+        return
+    with __lock:
+        __entries[(project_id, key)] = (data_version, value)
+        __entries.move_to_end((project_id, key))
+        while len(__entries) > MAX_ENTRIES:
+            __entries.popitem(last=False)
+
+
+def get_statistics() -> Dict[str, Any]:
+    with __lock:
+        statistics = dict(__statistics)
+        statistics["entries"] = len(__entries)
+    lookups = statistics["hits"] + statistics["misses"] + statistics["outdated"]
+    statistics["hit_rate"] = statistics["hits"] / lookups if lookups else 0.0
+    return statistics
@@ -74,3 +74,9 @@ class SearchQueryTemplate(Enum):
     )
     SUBQUERY_RLA_DIFFERENT_IS_EXTRACTION = "SUBQUERY_RLA_DIFFERENT_IS_EXTRACTION"
     ORDER_RLA = "ORDER_RLA"
+
+
+class SearchCountMode(Enum):
+    SEPARATE = "SEPARATE"  # count and page are separate statements
+    COMBINED = "COMBINED"  # one statement returns the page and the full count
+    ESTIMATED = "ESTIMATED"  # planner estimate for large results, exact otherwise
@@ -1,3 +1,4 @@
+import os
 from typing import Dict, Any, List, Union
 
 from .search_enum import (
@@ -8,50 +9,61 @@ from .search_enum import (
     SearchQueryTemplate,
     SearchTargetTables,
 )
-from db.enums import LabelSource
+from .search_statement import QueryParams
 
+# from this size on IN filters are joined against the unnested array instead of
+# comparing every row with every array element (e.g. thousands of similar records)
+IN_JOIN_MIN_VALUES = int(os.getenv("SEARCH_IN_JOIN_MIN_VALUES", 1000))
 
-def build_search_condition_value(target: SearchOperators, value) -> str:
+
+def build_search_condition_value(
+    target: SearchOperators, value: Any, params: QueryParams, cast: str
+) -> str:
     if target in __lookup_operator:
         operator = __lookup_operator[target]
         if target == SearchOperators.IN:
-            all_in_values = ""
-            for v in value:
-                part = v
-                if isinstance(v, str):
-                    part = "'" + part + "'"
-                if all_in_values != "":
-                    all_in_values += ", " + part
-                else:
-                    all_in_values = part
-            return operator.replace("@@VALUES@@", all_in_values)
+            values = params.add(list(value), cast + "[]")
+            if len(value) >= IN_JOIN_MIN_VALUES:
+                return f" IN (SELECT unnest({values}))"
+            return operator.replace("@@VALUES@@", values)
         else:
-            if target not in __lookup_operator_has_quotes and isinstance(value, str):
-                value = "'" + value + "'"
-            return operator.replace("@@VALUE@@", value)
+            if target in __lookup_operator_pattern:
+                value = __lookup_operator_pattern[target].replace(
+                    "@@VALUE@@", str(value)
+                )
+                cast = "TEXT"
+            return operator.replace("@@VALUE@@", params.add(value, cast))
     else:
         raise ValueError(target.value + " no operator info")
 
 
-def build_search_condition(filter_element: Dict[str, str]) -> str:
+def build_search_condition(
+    filter_element: Dict[str, str],
+    params: QueryParams,
+) -> str:
     table = SearchTargetTables[filter_element[FilterDataDictKeys.TARGET_TABLE.value]]
     column = SearchColumn[filter_element[FilterDataDictKeys.TARGET_COLUMN.value]]
     column_text = build_search_column_text(filter_element)
     operator = SearchOperators[filter_element[FilterDataDictKeys.OPERATOR.value]]
+    cast = __lookup_column_cast.get(column, "TEXT")
 
     if operator == SearchOperators.IN:
         if table == SearchTargetTables.RECORD and column == SearchColumn.DATA:
             filter_values = filter_element[FilterDataDictKeys.VALUES.value][1:]
         else:
             filter_values = filter_element[FilterDataDictKeys.VALUES.value]
-        return column_text + build_search_condition_value(operator, filter_values)
+        return column_text + build_search_condition_value(
+            operator, filter_values, params, cast
+        )
     else:
         if table == SearchTargetTables.RECORD and column == SearchColumn.DATA:
             filter_value = filter_element[FilterDataDictKeys.VALUES.value][1]
         else:
             filter_value = filter_element[FilterDataDictKeys.VALUES.value][0]
 
-        return column_text + build_search_condition_value(operator, filter_value)
+        return column_text + build_search_condition_value(
+            operator, filter_value, params, cast
+        )
 
 
 def build_search_column_text(filter_element: Dict[str, str]) -> str:
@@ -61,31 +73,35 @@ def build_search_column_text(filter_element: Dict[str, str]) -> str:
     column = SearchColumn[filter_element[FilterDataDictKeys.TARGET_COLUMN.value]]
 
     if table == SearchTargetTables.RECORD and column == SearchColumn.DATA:
-        col_str = f"{table_alias}.\"data\" ->> '{filter_element[FilterDataDictKeys.VALUES.value][0]}'::TEXT"
+        # the attribute name is part of the query shape, not a parameter
+        json_field = quote_literal(filter_element[FilterDataDictKeys.VALUES.value][0])
+        col_str = f'{table_alias}."data" ->> {json_field}::TEXT'
     else:
         col_str = f"{table_alias}.{column.value}"
     return col_str
 
 
+# percent signs are doubled since the query text is formatted with its parameters
+def quote_literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''").replace("%", "%%") + "'"
+
+
+def quote_identifier(value: str) -> str:
+    return '"' + str(value).replace('"', '""').replace("%", "%%") + '"'
+
+
 def build_order_column_record_data(order_by_col_text: str, data_type: str) -> str:
     json_field = order_by_col_text.split("@")[1]
 
-    text = f"r.\"data\" ->> '{json_field}'"
+    text = f'r."data" ->> {quote_literal(json_field)}'
     if data_type == "INTEGER" or data_type == "FLOAT":
         text = f"CAST({text} AS {data_type})"
-
-    text += f' "order_{json_field}"'
     return text
 
 
-def build_order_by_record_data(order_by_col_text: str, direction: str) -> str:
+def build_order_prefix_record_data(order_by_col_text: str, length: int) -> str:
     json_field = order_by_col_text.split("@")[1]
-    text = f'"order_{json_field}"'
-    if direction == "ASC":
-        text = f"{text} {direction} NULLS FIRST"
-    else:
-        text = f"{text} {direction} NULLS LAST"
-    return text
+    return f'LEFT(r."data" ->> {quote_literal(json_field)}, {length})'
 
 
 def build_order_by_column(order_by_col_text: str, direction: str) -> str:
@@ -94,20 +110,14 @@ def build_order_by_column(order_by_col_text: str, direction: str) -> str:
     column = __lookup_order_by_column[order_by_col].value
 
     if __lookup_order_by_table[order_by_col] == SearchTargetTables.RECORD:
-        if direction == "ASC":
-            text = f"r.{column} {direction} NULLS FIRST"
-        else:
-            text = f"r.{column} {direction} NULLS LAST"
-    else:
-        if direction == "ASC":
-            text = f"min_{column} {direction} NULLS FIRST"
-        else:
-            text = f"max_{column} {direction} NULLS LAST"
-    return text
+        return f"r.{column}"
+    if direction == "ASC":
+        return f"order_rla.min_{column}"
+    return f"order_rla.max_{column}"
 
 
 def build_query_template(
-    target: SearchQueryTemplate, filter_values: List[Any], project_id: str
+    target: SearchQueryTemplate, filter_values: List[Any], params: QueryParams
 ) -> str:
     template = get_query_template(target)
     if target in [
@@ -115,38 +125,31 @@ def build_query_template(
         SearchQueryTemplate.SUBQUERY_RLA_LABEL,
         SearchQueryTemplate.SUBQUERY_RLA_NO_LABEL,
     ]:
-        template = template.replace("@@SOURCE_TYPE@@", filter_values[0])
-        in_values = ""
-        for v in filter_values[1:]:
-            part = v
-            if isinstance(v, str):
-                part = "'" + part + "'"
-            if in_values != "":
-                in_values += ", "
-            in_values += part
-        template = template.replace("@@IN_VALUES@@", in_values)
+        template = template.replace(
+            "@@SOURCE_TYPE@@", params.add(filter_values[0], "TEXT")
+        )
+        template = template.replace(
+            "@@IN_VALUES@@", params.add(list(filter_values[1:]), "UUID[]")
+        )
     elif target == SearchQueryTemplate.SUBQUERY_RLA_CREATED_BY:
-        in_values = "'" + "', '".join(filter_values) + "'"
-        template = template.replace("@@IN_VALUES@@", in_values)
+        template = template.replace(
+            "@@IN_VALUES@@", params.add(list(filter_values), "UUID[]")
+        )
     elif target in [
         SearchQueryTemplate.SUBQUERY_RLA_DIFFERENT_IS_CLASSIFICATION,
         SearchQueryTemplate.SUBQUERY_RLA_DIFFERENT_IS_EXTRACTION,
     ]:
-        template = template.replace("@@LABELING_TASK_ID@@", filter_values[0])
+        template = template.replace(
+            "@@LABELING_TASK_ID@@", params.add(filter_values[0], "UUID")
+        )
     elif target in [
         SearchQueryTemplate.SUBQUERY_RLA_CONFIDENCE,
         SearchQueryTemplate.SUBQUERY_CALLBACK_CONFIDENCE,
     ]:
         lower, upper = filter_values
-        if isinstance(lower, str):
-            lower = "'" + lower + "'"
-            upper = "'" + upper + "'"
-        else:
-            lower = str(lower)
-            upper = str(upper)
-        template = template.replace("@@VALUE1@@", lower)
-        template = template.replace("@@VALUE2@@", upper)
-    template = template.replace("@@PROJECT_ID@@", project_id)
+        template = template.replace("@@VALUE1@@", params.add(lower, "FLOAT"))
+        template = template.replace("@@VALUE2@@", params.add(upper, "FLOAT"))
+    template = template.replace("@@PROJECT_ID@@", params.project_id)
     return template
 
 
@@ -175,7 +178,11 @@ def build_order_by_table_select(
         col_text = ""
         alias = ""
         if column == SearchColumn.CONFIDENCE.value:
-            column = f"CASE WHEN source_type IN ('{LabelSource.WEAK_SUPERVISION.value}', '{LabelSource.MODEL_CALLBACK.value}') THEN confidence ELSE null END"
+            # pre-aggregated per labeling task, LEAST/GREATEST skip the missing source type
+            if direction == "ASC":
+                column = "LEAST(s.ws_min_confidence, s.mc_min_confidence)"
+            else:
+                column = "GREATEST(s.ws_max_confidence, s.mc_max_confidence)"
             alias = "min_confidence" if direction == "ASC" else "max_confidence"
         if direction == "ASC":
             if alias == "":
@@ -197,16 +204,26 @@ def build_order_by_table_select(
 
 __lookup_operator = {
     SearchOperators.EQUAL: " = @@VALUE@@",
-    SearchOperators.CONTAINS: " ILIKE '%@@VALUE@@%'",
-    SearchOperators.BEGINS_WITH: " ILIKE '@@VALUE@@%'",
-    SearchOperators.ENDS_WITH: " ILIKE '%@@VALUE@@'",
-    SearchOperators.IN: " IN (@@VALUES@@)",
+    SearchOperators.CONTAINS: " ILIKE @@VALUE@@",
+    SearchOperators.BEGINS_WITH: " ILIKE @@VALUE@@",
+    SearchOperators.ENDS_WITH: " ILIKE @@VALUE@@",
+    SearchOperators.IN: " = ANY(@@VALUES@@)",
 }
 
-__lookup_operator_has_quotes = {
-    SearchOperators.CONTAINS: True,
-    SearchOperators.BEGINS_WITH: True,
-    SearchOperators.ENDS_WITH: True,
+# wildcards are part of the value so the query text doesn't depend on it
+__lookup_operator_pattern = {
+    SearchOperators.CONTAINS: "%@@VALUE@@%",
+    SearchOperators.BEGINS_WITH: "@@VALUE@@%",
+    SearchOperators.ENDS_WITH: "%@@VALUE@@",
+}
+
+# values are cast to the column type, columns not listed are compared as text
+__lookup_column_cast = {
+    SearchColumn.ID: "UUID",
+    SearchColumn.CREATED_AT: "TIMESTAMP",
+    SearchColumn.LABELING_TASK_LABEL_ID: "UUID",
+    SearchColumn.SOURCE_ID: "UUID",
+    SearchColumn.CONFIDENCE: "FLOAT",
 }
 
 
@@ -235,16 +252,16 @@ __lookup_query_templates = {
 SELECT r.project_id, r.id record_id @@SELECT_ADD@@
 FROM record r
 @@FROM_ADD@@
-WHERE r.project_id = '@@PROJECT_ID@@'
+WHERE r.project_id = @@PROJECT_ID@@
 @@WHERE_ADD@@
 @@ORDER_BY_ADD@@ 
 """,
     SearchQueryTemplate.SUBQUERY_RLA_LABEL: """
 SELECT rla.project_id pID, rla.record_id rID
 FROM record_label_association rla
-WHERE rla.project_id = '@@PROJECT_ID@@'
-    AND rla.source_type = '@@SOURCE_TYPE@@'
-    AND rla.labeling_task_label_id IN (@@IN_VALUES@@)
+WHERE rla.project_id = @@PROJECT_ID@@
+    AND rla.source_type = @@SOURCE_TYPE@@
+    AND rla.labeling_task_label_id = ANY(@@IN_VALUES@@)
 GROUP BY rla.project_id, rla.record_id """,
     SearchQueryTemplate.SUBQUERY_RLA_NO_LABEL: """
 SELECT r.project_id pID, r.id rID
@@ -252,82 +269,56 @@ FROM record r
 LEFT JOIN record_label_association rla
     ON r.project_id = rla.project_id 
     AND r.id = rla.record_id 
-    AND rla.source_type = '@@SOURCE_TYPE@@'
-    AND rla.labeling_task_label_id IN (@@IN_VALUES@@)
-WHERE r.project_id = '@@PROJECT_ID@@' AND rla.id IS NULL """,
+    AND rla.source_type = @@SOURCE_TYPE@@
+    AND rla.labeling_task_label_id = ANY(@@IN_VALUES@@)
+WHERE r.project_id = @@PROJECT_ID@@ AND rla.id IS NULL """,
     SearchQueryTemplate.SUBQUERY_RLA_INFORMATION_SOURCE: """
 SELECT rla.project_id pID, rla.record_id rID
 FROM record_label_association rla
-WHERE rla.project_id = '@@PROJECT_ID@@'
-    AND rla.source_type = '@@SOURCE_TYPE@@'
-    AND rla.source_id IN (@@IN_VALUES@@)
+WHERE rla.project_id = @@PROJECT_ID@@
+    AND rla.source_type = @@SOURCE_TYPE@@
+    AND rla.source_id = ANY(@@IN_VALUES@@)
 GROUP BY rla.project_id, rla.record_id """,
     SearchQueryTemplate.SUBQUERY_RLA_CREATED_BY: """
 SELECT rla.project_id pID, rla.record_id rID
 FROM record_label_association rla
-WHERE rla.project_id = '@@PROJECT_ID@@'
+WHERE rla.project_id = @@PROJECT_ID@@
     AND rla.source_type = 'MANUAL'
-    AND rla.created_by IN (@@IN_VALUES@@)
+    AND rla.created_by = ANY(@@IN_VALUES@@)
 GROUP BY rla.project_id, rla.record_id """,
     SearchQueryTemplate.SUBQUERY_RLA_CONFIDENCE: """
-SELECT rla.project_id pID, rla.record_id rID
-FROM record_label_association rla
-WHERE rla.project_id = '@@PROJECT_ID@@'
-    AND rla.source_type = 'WEAK_SUPERVISION'
-    AND rla.confidence BETWEEN @@VALUE1@@ AND @@VALUE2@@ 
-GROUP BY rla.project_id, rla.record_id """,
+SELECT s.project_id pID, s.record_id rID
+FROM record_label_summary s
+WHERE s.project_id = @@PROJECT_ID@@
+    AND s.ws_min_confidence <= @@VALUE2@@
+    AND s.ws_max_confidence >= @@VALUE1@@
+    AND EXISTS (SELECT 1 FROM unnest(s.ws_confidences) c WHERE c BETWEEN @@VALUE1@@ AND @@VALUE2@@)
+GROUP BY s.project_id, s.record_id """,
     SearchQueryTemplate.SUBQUERY_CALLBACK_CONFIDENCE: """
-SELECT rla.project_id pID, rla.record_id rID
-FROM record_label_association rla
-WHERE rla.project_id = '@@PROJECT_ID@@'
-    AND rla.source_type = 'MODEL_CALLBACK'
-    AND rla.confidence BETWEEN @@VALUE1@@ AND @@VALUE2@@ 
-GROUP BY rla.project_id, rla.record_id """,
+SELECT s.project_id pID, s.record_id rID
+FROM record_label_summary s
+WHERE s.project_id = @@PROJECT_ID@@
+    AND s.mc_min_confidence <= @@VALUE2@@
+    AND s.mc_max_confidence >= @@VALUE1@@
+    AND EXISTS (SELECT 1 FROM unnest(s.mc_confidences) c WHERE c BETWEEN @@VALUE1@@ AND @@VALUE2@@)
+GROUP BY s.project_id, s.record_id """,
     SearchQueryTemplate.ORDER_RLA: """
 LEFT JOIN (
-    SELECT rla.project_id pID, rla.record_id rID, @@ORDER_COLUMNS@@
-    FROM record_label_association rla
-    GROUP BY rla.project_id, rla.record_id ) order_rla
+    SELECT s.project_id pID, s.record_id rID, @@ORDER_COLUMNS@@
+    FROM record_label_summary s
+    WHERE s.project_id = @@PROJECT_ID@@
+    GROUP BY s.project_id, s.record_id ) order_rla
     ON r.project_id = order_rla.pID AND r.id = order_rla.rID """,
     SearchQueryTemplate.SUBQUERY_RLA_DIFFERENT_IS_CLASSIFICATION: """
-SELECT project_id pID, record_id rID, COUNT(*) different_versions, SUM(full_count) full_count
-FROM (
-	SELECT rla.record_id,rla.project_id, rla.labeling_task_label_id, COUNT(*) full_count
-	FROM record_label_association rla
-	INNER JOIN labeling_task_label ltl
-		ON rla.labeling_task_label_id = ltl.id AND rla.project_id = ltl.project_id
-	WHERE rla.project_id = '@@PROJECT_ID@@' 
-	AND ltl.labeling_task_id = '@@LABELING_TASK_ID@@' 
-	AND rla.source_type = 'INFORMATION_SOURCE'
-	AND rla.return_type = 'RETURN'
-	GROUP BY rla.record_id,rla.project_id, rla.labeling_task_label_id ) base_select
-GROUP BY record_id, project_id
-HAVING COUNT(*) >1 """,
+SELECT s.project_id pID, s.record_id rID, s.is_label_versions different_versions, s.is_label_count full_count
+FROM record_label_summary s
+WHERE s.project_id = @@PROJECT_ID@@
+    AND s.labeling_task_id = @@LABELING_TASK_ID@@
+    AND s.is_label_versions > 1 """,
     SearchQueryTemplate.SUBQUERY_RLA_DIFFERENT_IS_EXTRACTION: """
-SELECT project_id pID, record_id rID, COUNT(*) different_versions, SUM(full_count) full_count
-FROM (
-	SELECT rla.record_id,rla.project_id, rlat.label,COUNT(*) full_count
-	FROM record_label_association rla
-	INNER JOIN (
-		SELECT rla.id, rla.labeling_task_label_id ||'-' || array_agg(rlat.token_index ORDER BY rlat.token_index)::TEXT as label
-		FROM record_label_association rla
-		INNER JOIN record_label_association_token rlat
-			ON rla.id = rlat.record_label_association_id
-		WHERE rla.project_id = '@@PROJECT_ID@@' 
-			AND rla.source_type = 'INFORMATION_SOURCE'
-			AND rla.return_type = 'YIELD'
-		GROUP BY rla.id, rla.labeling_task_label_id
-	) rlat
-		ON rla.id = rlat.id
-	INNER JOIN labeling_task_label ltl
-		ON rla.labeling_task_label_id = ltl.id AND rla.project_id = ltl.project_id
-	WHERE rla.project_id = '@@PROJECT_ID@@' 
-	AND ltl.labeling_task_id = '@@LABELING_TASK_ID@@' 
-	AND rla.source_type = 'INFORMATION_SOURCE'
-	AND rla.return_type = 'YIELD'
-	GROUP BY rla.record_id,rla.project_id, rlat.label ) base_select
-GROUP BY record_id, project_id
-HAVING COUNT(*) >1
-
-""",
+SELECT s.project_id pID, s.record_id rID, s.is_label_versions different_versions, s.is_label_count full_count
+FROM record_label_summary s
+WHERE s.project_id = @@PROJECT_ID@@
+    AND s.labeling_task_id = @@LABELING_TASK_ID@@
+    AND s.is_label_versions > 1 """,
 }
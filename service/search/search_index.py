@@ -0,0 +1,196 @@
+import hashlib
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from typing import Any, Iterator, Set
+
+from db.enums import AttributeState, DataTypes
+from util import db_connection
+
+TRIGRAM = "TRIGRAM"
+ORDER = "ORDER"
+# text attributes are ordered by a prefix first, whole texts can exceed the size of index entries
+ORDER_TEXT_PREFIX_LENGTH = 256
+# the builder only adds index hints, outdated entries don't change search results
+INDEXED_ATTRIBUTES_TTL = 30
+# seconds until an index that is built or dropped by another job is checked again
+INDEX_LOCK_RETRY_INTERVAL = 1
+
+__indexed_attributes = {}
+__indexed_attributes_lock = threading.Lock()
+__usable_states = [
+    AttributeState.UPLOADED.value,
+    AttributeState.USABLE.value,
+    AttributeState.AUTOMATICALLY_CREATED.value,
+]
+__order_data_types = [
+    DataTypes.INTEGER.value,
+    DataTypes.FLOAT.value,
+    DataTypes.TEXT.value,
+]
+
+
+def sync_project(project_id: str) -> None:
+    """
+    Registers the project at the search indexes of its attributes and releases the outdated ones.
+    Indexes are shared by all projects with an attribute of the same name and type, they lead
+    with the project id, so a generic plan of the parameterized search can use them.
+    Runs as job since the indexes are built concurrently and can take a while.
+    """
+    project_id = str(uuid.UUID(project_id))
+    wanted = {}
+    for attribute_id, attribute_name, data_type in db_connection.execute(
+        """
+        SELECT id::TEXT, name, data_type
+        FROM attribute
+        WHERE project_id = %s AND data_type = ANY(%s) AND state = ANY(%s)
+        """,
+        (project_id, __order_data_types, __usable_states),
+        fetch=True,
+    ):
+        if data_type == DataTypes.TEXT.value:
+            index_name = __index_name(attribute_name, TRIGRAM)
+            wanted[index_name] = (
+                attribute_id,
+                attribute_name,
+                TRIGRAM,
+                f"USING gin (project_id, (data ->> {__literal(attribute_name)}) gin_trgm_ops)",
+            )
+        # the data type is part of the name, a changed type results in a new index
+        index_name = __index_name(f"{attribute_name}:{data_type}", ORDER)
+        wanted[index_name] = (
+            attribute_id,
+            attribute_name,
+            ORDER,
+            f"USING btree (project_id, ({__order_expression(attribute_name, data_type)}) NULLS FIRST, id)",
+        )
+
+    existing = {
+        index_name
+        for (index_name,) in db_connection.execute(
+            "SELECT index_name FROM search_index WHERE project_id = %s AND index_type = ANY(%s)",
+            (project_id, [TRIGRAM, ORDER]),
+            fetch=True,
+        )
+    }
+    for index_name in existing - set(wanted):
+        __release_index(index_name, project_id)
+    for index_name in set(wanted) - existing:
+        __acquire_index(index_name, project_id, *wanted[index_name])
+    __forget(project_id)
+
+
+def drop_project(project_id: str) -> None:
+    for (index_name,) in db_connection.execute(
+        "SELECT index_name FROM search_index WHERE project_id = %s",
+        (project_id,),
+        fetch=True,
+    ):
+        __release_index(index_name, project_id)
+    __forget(project_id)
+
+
+def get_indexed_attributes(project_id: str, index_type: str) -> Set[str]:
+    now = time.time()
+    with __indexed_attributes_lock:
+        cached = __indexed_attributes.get(project_id)
+    if not cached or now - cached[0] > INDEXED_ATTRIBUTES_TTL:
+        try:
+            rows = db_connection.execute(
+                "SELECT attribute_name, index_type FROM search_index WHERE project_id = %s",
+                (project_id,),
+                fetch=True,
+            )
+        except Exception:
+            # the search works without index hints
+            print(traceback.format_exc(), flush=True)
+            rows = []
+        by_type = {}
+        for attribute_name, row_index_type in rows:
+            by_type.setdefault(row_index_type, set()).add(attribute_name)
+        cached = (now, by_type)
+        with __indexed_attributes_lock:
+            __indexed_attributes[project_id] = cached
+    return cached[1].get(index_type, set())
+
+
+def __acquire_index(
+    index_name: str,
+    project_id: str,
+    attribute_id: str,
+    attribute_name: str,
+    index_type: str,
+    definition: str,
+) -> None:
+    with db_connection.autocommit() as cursor, __index_lock(cursor, index_name):
+        try:
+            cursor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name}" ON record {definition}'
+            )
+        except Exception:
+            # a failed concurrent build leaves an invalid index behind
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+            raise
+        cursor.execute(
+            """
+            INSERT INTO search_index (index_name, project_id, attribute_id, attribute_name, index_type, created_at)
+            VALUES (%s, %s, %s, %s, %s, now())
+            ON CONFLICT (index_name, project_id) DO NOTHING
+            """,
+            (index_name, project_id, attribute_id, attribute_name, index_type),
+        )
+
+
+def __release_index(index_name: str, project_id: str) -> None:
+    # the index is dropped once the last project using it is released
+    with db_connection.autocommit() as cursor, __index_lock(cursor, index_name):
+        cursor.execute(
+            "DELETE FROM search_index WHERE index_name = %s AND project_id = %s",
+            (index_name, project_id),
+        )
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM search_index WHERE index_name = %s)",
+            (index_name,),
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"')
+
+
+@contextmanager
+def __index_lock(cursor: Any, index_name: str) -> Iterator[None]:
+    # only tried, a waiting lock call holds a snapshot the concurrent index builds wait for
+    while True:
+        cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (index_name,))
+        if cursor.fetchone()[0]:
+            break
+        time.sleep(INDEX_LOCK_RETRY_INTERVAL)
+    try:
+        yield
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (index_name,))
+
+
+def __forget(project_id: str) -> None:
+    with __indexed_attributes_lock:
+        __indexed_attributes.pop(project_id, None)
+
+
+def __index_name(attribute_name: str, index_type: str) -> str:
+    # names are limited to 63 characters, a rename results in a new index
+    digest = hashlib.sha1(attribute_name.encode("utf-8")).hexdigest()[:24]
+    return f"search_{index_type.lower()}_{digest}"
+
+
+def __order_expression(attribute_name: str, data_type: str) -> str:
+    # needs to match the sort expressions of the search builder, otherwise the index isn't used
+    text = f"data ->> {__literal(attribute_name)}"
+    if data_type == DataTypes.TEXT.value:
+        return f"LEFT({text}, {ORDER_TEXT_PREFIX_LENGTH})"
+    return f"CAST({text} AS {data_type})"
+
+
+def __literal(value: str) -> str:
+    # index definitions can't have parameters
+    return "'" + value.replace("'", "''") + "'"
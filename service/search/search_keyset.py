@@ -0,0 +1,186 @@
+import base64
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from .search_statement import QueryParams
+
+TIEBREAK_EXPRESSION = "r.id"
+
+__alias = re.compile(r"\bkeyset_(\d+)_([a-z]+)\b")
+
+
+@dataclass
+class SortKey:
+    """
+    One column of the search order. The expression is valid in the scope of the base query
+    (record r and its joins), in the result the value is exposed under the key alias.
+    Values of named placeholders in the expression are bound wherever it is used.
+    """
+
+    expression: str
+    direction: str
+    values: Dict[str, Any] = field(default_factory=dict)
+
+
+def with_tiebreak(sort_keys: List[SortKey]) -> List[SortKey]:
+    # the record id makes the order total, otherwise equal values could be skipped between pages
+    # it follows the direction of the last key, so descending orders can scan the
+    # (expression, id) order indexes backwards
+    if sort_keys and sort_keys[-1].expression == TIEBREAK_EXPRESSION:
+        return sort_keys
+    direction = sort_keys[-1].direction if sort_keys else "ASC"
+    return sort_keys + [SortKey(TIEBREAK_EXPRESSION, direction)]
+
+
+def alias(idx: int, sort_key: SortKey) -> str:
+    return f"keyset_{idx}_{sort_key.direction.lower()}"
+
+
+def build_select(sort_keys: List[SortKey], params: QueryParams) -> str:
+    for sort_key in sort_keys:
+        params.bind(sort_key.values)
+    return "".join(
+        f", {sort_key.expression} {alias(idx, sort_key)}"
+        for idx, sort_key in enumerate(sort_keys)
+    )
+
+
+def build_order_by(sort_keys: List[SortKey]) -> str:
+    columns = []
+    for idx, sort_key in enumerate(sort_keys):
+        if sort_key.direction == "ASC":
+            columns.append(f"{alias(idx, sort_key)} ASC NULLS FIRST")
+        else:
+            columns.append(f"{alias(idx, sort_key)} DESC NULLS LAST")
+    return "ORDER BY " + ", ".join(columns)
+
+
+def build_condition(
+    sort_keys: List[SortKey], values: List[Any], params: QueryParams
+) -> str:
+    """
+    Condition for the rows after the given key values in the order of build_order_by.
+    Nulls come first for ascending and last for descending keys.
+    """
+    alternatives = []
+    equal_parts = []
+    for sort_key, value in zip(sort_keys, values):
+        params.bind(sort_key.values)
+        column = sort_key.expression
+        after = None
+        if value is None:
+            if sort_key.direction == "ASC":
+                after = f"{column} IS NOT NULL"
+            equal = f"{column} IS NULL"
+        else:
+            placeholder = params.add(value)
+            if sort_key.direction == "ASC":
+                after = f"{column} > {placeholder}"
+            else:
+                after = f"({column} < {placeholder} OR {column} IS NULL)"
+            equal = f"{column} = {placeholder}"
+        if after:
+            alternatives.append("(" + " AND ".join(equal_parts + [after]) + ")")
+        equal_parts.append(equal)
+    if not alternatives:
+        return "FALSE"
+    return "(" + " OR ".join(alternatives) + ")"
+
+
+def as_aliases(sort_keys: List[SortKey]) -> List[SortKey]:
+    # for statements around the one selecting the keys, the expressions aren't visible there
+    return [
+        SortKey(alias(idx, sort_key), sort_key.direction)
+        for idx, sort_key in enumerate(sort_keys)
+    ]
+
+
+def build_window(sql: str, sort_keys: List[SortKey], condition: Optional[str]) -> str:
+    """
+    Wraps a stored statement that exposes its sort keys, the key expressions need to be the aliases.
+    """
+    where = f"WHERE {condition}" if condition else ""
+    return f"""
+SELECT * FROM ( {sql} ) keyset_window
+{where}
+{build_order_by(sort_keys)}"""
+
+
+def parse_keys(sql: str) -> List[SortKey]:
+    """
+    Reads the exposed sort keys of a stored statement. Statements without keys or older ones
+    ordered by random() can't be windowed, an empty list is returned for them.
+    """
+    directions = {}
+    for match in __alias.finditer(sql):
+        directions[int(match.group(1))] = match.group(2)
+    if sorted(directions) != list(range(len(directions))):
+        return []
+    sort_keys = []
+    for idx in range(len(directions)):
+        direction = directions[idx]
+        if direction not in ["asc", "desc"]:
+            return []
+        sort_keys.append(SortKey(f"keyset_{idx}_{direction}", direction.upper()))
+    return sort_keys
+
+
+def build_next_cursor(
+    sort_keys: List[SortKey], rows: List[Any], limit: int
+) -> Optional[str]:
+    if not limit or len(rows) < limit:
+        return None
+    mapping = rows[-1]._mapping
+    return encode_cursor(
+        sort_keys,
+        [mapping[alias(idx, sort_key)] for idx, sort_key in enumerate(sort_keys)],
+    )
+
+
+def encode_cursor(sort_keys: List[SortKey], values: List[Any]) -> str:
+    payload = json.dumps(
+        {"k": __fingerprint(sort_keys), "v": [__to_json_value(v) for v in values]}
+    )
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor: str, sort_keys: List[SortKey]) -> List[Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+        fingerprint = payload["k"]
+        values = payload["v"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid search cursor.")
+    if (
+        fingerprint != __fingerprint(sort_keys)
+        or not isinstance(values, list)
+        or len(values) != len(sort_keys)
+    ):
+        raise ValueError("Search cursor doesn't match the order of the search.")
+    for value in values:
+        if value is not None and (
+            isinstance(value, bool) or not isinstance(value, (str, int, float))
+        ):
+            raise ValueError("Invalid search cursor.")
+    return values
+
+
+def __fingerprint(sort_keys: List[SortKey]) -> str:
+    text = "|".join(
+        f"{sort_key.expression} {sort_key.direction} {sorted(sort_key.values.items())}"
+        for sort_key in sort_keys
+    )
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def __to_json_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # uuids and decimals, the database casts the text back on comparison
+    return str(value)
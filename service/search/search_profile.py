@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from .search_enum import FilterDataDictKeys
+from .search_statement import QueryParams
+from . import search_statement
+
+# upper bounds of the histogram buckets in milliseconds
+BUCKETS = [10, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+# shapes of all projects, least recently used ones are dropped first
+MAX_SHAPES = 500
+
+__histograms = OrderedDict()
+__lock = threading.Lock()
+
+
+class SearchProfile:
+    """
+    Collects the timings of one search. The plans are only collected when explain is set,
+    they execute the statements a second time.
+    """
+
+    def __init__(self, shape: str, explain: bool = False) -> None:
+        self.shape = shape
+        self.explain = explain
+        self.timings: Dict[str, float] = {}
+        self.plans: Dict[str, Any] = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (
+                self.timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+            )
+
+    def add_plan(self, name: str, sql: str, params: QueryParams) -> None:
+        if self.explain:
+            self.plans[name] = search_statement.explain_analyze(sql, params)
+
+    def finish(self) -> Dict[str, Any]:
+        self.timings["total"] = (time.perf_counter() - self.started) * 1000
+        record(self.shape, self.timings["total"])
+        result = {
+            "shape": self.shape,
+            "timings_ms": {
+                name: round(value, 2) for name, value in self.timings.items()
+            },
+            "plans": self.plans,
+        }
+        if self.explain:
+            print(
+                "search profile: "
+                + json.dumps({"shape": self.shape, "timings_ms": result["timings_ms"]}),
+                flush=True,
+            )
+        return result
+
+
+def build_shape(filter_data: List[Dict[str, Any]]) -> str:
+    """
+    The filter structure without values and attribute names, so searches that need the
+    same indexes share one shape.
+    """
+    parts = []
+    for filter_element in filter_data:
+        part = ""
+        if FilterDataDictKeys.OPERATOR.value in filter_element:
+            part = (
+                filter_element[FilterDataDictKeys.TARGET_TABLE.value]
+                + "."
+                + filter_element[FilterDataDictKeys.TARGET_COLUMN.value]
+                + ":"
+                + filter_element[FilterDataDictKeys.OPERATOR.value]
+            )
+        elif FilterDataDictKeys.FILTER.value in filter_element:
+            part = (
+                "(" + build_shape(filter_element[FilterDataDictKeys.FILTER.value]) + ")"
+            )
+        elif FilterDataDictKeys.SUBQUERIES.value in filter_element:
+            templates = sorted(
+                subquery[FilterDataDictKeys.QUERY_TEMPLATE.value]
+                for subquery in filter_element[FilterDataDictKeys.SUBQUERIES.value]
+            )
+            part = (
+                filter_element[FilterDataDictKeys.SUBQUERY_TYPE.value]
+                + "["
+                + ",".join(templates)
+                + "]"
+            )
+        elif FilterDataDictKeys.ORDER_BY.value in filter_element:
+            part = (
+                "ORDER["
+                + ",".join(
+                    build_order_shape(column)
+                    for column in filter_element[FilterDataDictKeys.ORDER_BY.value]
+                )
+                + "]"
+            )
+        if not part:
+            continue
+        if filter_element.get(FilterDataDictKeys.NEGATION.value):
+            part = "NOT " + part
+        relation = filter_element.get(FilterDataDictKeys.RELATION.value)
+        if parts and relation in ["AND", "OR"]:
+            part = relation + " " + part
+        parts.append(part)
+    return " ".join(parts) or "ALL"
+
+
+def build_order_shape(column: str) -> str:
+    if "@" in column:
+        return "RECORD_DATA"
+    return column
+
+
+def record(shape: str, milliseconds: float) -> None:
+    with __lock:
+        histogram = __histograms.get(shape)
+        if not histogram:
+            histogram = {
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "buckets": [0] * (len(BUCKETS) + 1),
+            }
+            __histograms[shape] = histogram
+        __histograms.move_to_end(shape)
+        histogram["count"] += 1
+        histogram["total_ms"] += milliseconds
+        histogram["max_ms"] = max(histogram["max_ms"], milliseconds)
+        bucket = len(BUCKETS)
+        for idx, bound in enumerate(BUCKETS):
+            if milliseconds <= bound:
+                bucket = idx
+                break
+        histogram["buckets"][bucket] += 1
+        while len(__histograms) > MAX_SHAPES:
+            __histograms.popitem(last=False)
+
+
+def get_statistics() -> List[Dict[str, Any]]:
+    """
+    Histogram per filter shape, the shapes with the most time spent come first.
+    """
+    with __lock:
+        histograms = [
+            (shape, dict(histogram, buckets=list(histogram["buckets"])))
+            for shape, histogram in __histograms.items()
+        ]
+    labels = [f"<={bound}" for bound in BUCKETS] + [f">{BUCKETS[-1]}"]
+    statistics = [
+        {
+            "shape": shape,
+            "count": histogram["count"],
+            "total_ms": round(histogram["total_ms"], 2),
+            "avg_ms": round(histogram["total_ms"] / histogram["count"], 2),
+            "max_ms": round(histogram["max_ms"], 2),
+            "buckets": dict(zip(labels, histogram["buckets"])),
+        }
+        for shape, histogram in histograms
+    ]
+    statistics.sort(key=lambda entry: entry["total_ms"], reverse=True)
+    return statistics
@@ -0,0 +1,282 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from db import UserSessions
+from db.business_objects import general
+from db.enums import NotificationType
+from util import daemon, db_connection
+from util.notification import create_notification
+from . import search_keyset, search_statement
+from .search_statement import QueryParams
+
+# record ids collected per window, the next window is prefetched once one is handed out
+WINDOW_SIZE = int(os.getenv("SESSION_WINDOW_SIZE", 1000))
+
+__prefetching = set()
+__lock = threading.Lock()
+
+
+def open_session(user_session: UserSessions, project_id: str) -> List[str]:
+    """
+    Collects the first window of a session. The count check and the next window run in
+    the background, so opening a session only costs one window.
+    """
+    project_id, session_id = str(project_id), str(user_session.id)
+    window = __collect_window(
+        project_id,
+        session_id,
+        0,
+        user_session.id_sql_statement,
+        user_session.random_seed,
+    )
+    daemon.run(
+        __check_count,
+        project_id,
+        session_id,
+        str(user_session.created_by),
+        user_session.count_sql_statement,
+        user_session.last_count,
+    )
+    if window["has_next"]:
+        __prefetch(project_id, session_id, 1)
+    return window["record_ids"]
+
+
+def get_window(
+    project_id: str, session_id: str, window_index: int
+) -> Optional[Dict[str, Any]]:
+    project_id, session_id = str(project_id), str(session_id)
+    session = __get_session(project_id, session_id)
+    if not session or window_index < 0:
+        return None
+    id_sql_statement, random_seed = session
+    window = __collect_window(
+        project_id, session_id, window_index, id_sql_statement, random_seed
+    )
+    if window["has_next"]:
+        __prefetch(project_id, session_id, window_index + 1)
+    return window
+
+
+def __prefetch(project_id: str, session_id: str, window_index: int) -> None:
+    key = (session_id, window_index)
+    with __lock:
+        if key in __prefetching:
+            return
+        __prefetching.add(key)
+    daemon.run(__run_prefetch, project_id, session_id, window_index)
+
+
+def __run_prefetch(project_id: str, session_id: str, window_index: int) -> None:
+    try:
+        session = __get_session(project_id, session_id)
+        if session:
+            __collect_window(project_id, session_id, window_index, *session)
+    except Exception as e:
+        # the window is collected again once it's requested
+        print(f"session window prefetch failed: {e}", flush=True)
+    finally:
+        with __lock:
+            __prefetching.discard((session_id, window_index))
+
+
+def __collect_window(
+    project_id: str,
+    session_id: str,
+    window_index: int,
+    id_sql_statement: str,
+    random_seed: Optional[float],
+) -> Dict[str, Any]:
+    stored = __load_window(session_id, window_index)
+    if stored:
+        return stored
+
+    # stored statements expose their sort keys, so windows continue after a cursor
+    sort_keys = search_keyset.parse_keys(id_sql_statement)
+    if not sort_keys:
+        # sessions stored with a random() order can't be seeked, their seed keeps the order stable
+        return __store_window(
+            session_id,
+            window_index,
+            None,
+            id_sql_statement
+            + f"\nLIMIT {WINDOW_SIZE} OFFSET {window_index * WINDOW_SIZE}",
+            None,
+            random_seed,
+        )
+
+    start_index, cursor = 0, None
+    if window_index > 0:
+        previous = __load_previous_window(session_id, window_index)
+        if previous:
+            start_index, cursor, has_next = previous
+            if not has_next:
+                return __empty_window(window_index)
+    window = None
+    for idx in range(start_index, window_index + 1):
+        condition = None
+        if cursor:
+            params = QueryParams(project_id)
+            condition = search_statement.render(
+                search_keyset.build_condition(
+                    sort_keys, search_keyset.decode_cursor(cursor, sort_keys), params
+                ),
+                params,
+            )
+        sql = search_keyset.build_window(id_sql_statement, sort_keys, condition)
+        window = __store_window(
+            session_id, idx, cursor, sql + f"\nLIMIT {WINDOW_SIZE}", sort_keys
+        )
+        cursor = window["next_cursor"]
+        if not window["has_next"] and idx < window_index:
+            return __empty_window(window_index)
+    return window
+
+
+def __store_window(
+    session_id: str,
+    window_index: int,
+    cursor: Optional[str],
+    sql: str,
+    sort_keys: Optional[List[search_keyset.SortKey]],
+    random_seed: Optional[float] = None,
+) -> Dict[str, Any]:
+    columns, rows = __fetch(sql, random_seed)
+    record_ids = [str(row[columns.index("record_id")]) for row in rows]
+    has_next = len(rows) == WINDOW_SIZE
+    next_cursor = None
+    if sort_keys and has_next:
+        next_cursor = search_keyset.encode_cursor(
+            sort_keys,
+            [
+                rows[-1][columns.index(search_keyset.alias(idx, sort_key))]
+                for idx, sort_key in enumerate(sort_keys)
+            ],
+        )
+    # a window collected in parallel is identical, the first one stays
+    db_connection.execute(
+        """
+        INSERT INTO user_session_window (session_id, window_index, cursor, record_ids, next_cursor, has_next, created_at)
+        VALUES (%s, %s, %s, %s::json, %s, %s, now())
+        ON CONFLICT (session_id, window_index) DO NOTHING
+        """,
+        (
+            session_id,
+            window_index,
+            cursor,
+            json.dumps(record_ids),
+            next_cursor,
+            has_next,
+        ),
+    )
+    return {
+        "window_index": window_index,
+        "record_ids": record_ids,
+        "next_cursor": next_cursor,
+        "has_next": has_next,
+    }
+
+
+def __empty_window(window_index: int) -> Dict[str, Any]:
+    return {
+        "window_index": window_index,
+        "record_ids": [],
+        "next_cursor": None,
+        "has_next": False,
+    }
+
+
+def __load_window(session_id: str, window_index: int) -> Optional[Dict[str, Any]]:
+    rows = db_connection.execute(
+        """
+        SELECT record_ids, next_cursor, has_next
+        FROM user_session_window
+        WHERE session_id = %s AND window_index = %s
+        """,
+        (session_id, window_index),
+        fetch=True,
+    )
+    if not rows:
+        return None
+    record_ids, next_cursor, has_next = rows[0]
+    return {
+        "window_index": window_index,
+        "record_ids": record_ids or [],
+        "next_cursor": next_cursor,
+        "has_next": has_next,
+    }
+
+
+def __load_previous_window(
+    session_id: str, window_index: int
+) -> Optional[Tuple[int, Optional[str], bool]]:
+    # the closest stored window, everything after it is collected in order
+    rows = db_connection.execute(
+        """
+        SELECT window_index, next_cursor, has_next
+        FROM user_session_window
+        WHERE session_id = %s AND window_index < %s
+        ORDER BY window_index DESC
+        LIMIT 1
+        """,
+        (session_id, window_index),
+        fetch=True,
+    )
+    if not rows:
+        return None
+    previous_index, next_cursor, has_next = rows[0]
+    return previous_index + 1, next_cursor, has_next
+
+
+def __get_session(
+    project_id: str, session_id: str
+) -> Optional[Tuple[str, Optional[float]]]:
+    rows = db_connection.execute(
+        "SELECT id_sql_statement, random_seed FROM user_sessions WHERE project_id = %s AND id = %s",
+        (project_id, session_id),
+        fetch=True,
+    )
+    if not rows:
+        return None
+    return rows[0]
+
+
+def __check_count(
+    project_id: str,
+    session_id: str,
+    user_id: str,
+    count_sql_statement: str,
+    last_count: Optional[int],
+) -> None:
+    ctx_token = general.get_ctx_token()
+    try:
+        _, rows = __fetch(count_sql_statement)
+        current_count = rows[0][0] if rows else 0
+        db_connection.execute(
+            "UPDATE user_sessions SET last_count = %s WHERE id = %s",
+            (current_count, session_id),
+        )
+        if last_count not in [None, -1] and current_count != last_count:
+            create_notification(
+                NotificationType.SESSION_RECORD_AMOUNT_CHANGED, user_id, project_id
+            )
+        # huddles and the session ids on the frontend only cover the first window
+        if current_count > WINDOW_SIZE:
+            create_notification(
+                NotificationType.SESSION_INFO, user_id, project_id, WINDOW_SIZE
+            )
+    finally:
+        general.reset_ctx_token(ctx_token, True)
+
+
+def __fetch(
+    sql: str, random_seed: Optional[float] = None
+) -> Tuple[List[str], List[Any]]:
+    # stored statements are rendered already, they run without parameters
+    with db_connection.transaction() as cursor:
+        if random_seed:
+            cursor.execute("SELECT setseed(%s)", (random_seed,))
+        cursor.execute(sql)
+        return [column[0] for column in cursor.description], cursor.fetchall()
@@ -0,0 +1,216 @@
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass, JobPriority
+from util import db_connection, notification
+from . import search, search_statement
+
+# every chunk is inserted in its own transaction, so locks are only held for one chunk
+CHUNK_SIZE = int(os.getenv("STATIC_SLICE_CHUNK_SIZE", 5000))
+
+QUEUED = "QUEUED"
+RUNNING = "RUNNING"
+FINISHED = "FINISHED"
+FAILED = "FAILED"
+
+
+def materialize(
+    project_id: str, data_slice_id: str, in_background: bool = True
+) -> None:
+    """
+    (Re)builds the record associations of a static slice from its stored filter.
+    A newer run replaces a running one, which stops after its current chunk.
+    """
+    project_id, data_slice_id = str(project_id), str(data_slice_id)
+    run_id = str(uuid.uuid4())
+    db_connection.execute(
+        """
+        INSERT INTO data_slice_materialization (data_slice_id, project_id, run_id, state, materialized, updated_at)
+        VALUES (%s, %s, %s, %s, 0, now())
+        ON CONFLICT (data_slice_id) DO UPDATE
+        SET run_id = EXCLUDED.run_id, state = EXCLUDED.state, total = NULL, materialized = 0,
+            error = NULL, started_at = NULL, finished_at = NULL, updated_at = now()
+        """,
+        (data_slice_id, project_id, run_id, QUEUED),
+    )
+    if in_background:
+        job_queue.enqueue(
+            JobClass.DATA_SLICE,
+            run_materialization,
+            project_id,
+            data_slice_id,
+            run_id,
+            priority=JobPriority.NORMAL,
+        )
+    else:
+        run_materialization(project_id, data_slice_id, run_id)
+
+
+def run_materialization(project_id: str, data_slice_id: str, run_id: str) -> None:
+    filter_data = __get_filter_data(project_id, data_slice_id)
+    if filter_data is None or not __set_state(data_slice_id, run_id, RUNNING):
+        return
+    try:
+        __delete_associations(data_slice_id, run_id)
+        count_sql, count_params = search.generate_count_sql(project_id, filter_data)
+        total = search_statement.execute_count(count_sql, count_params)
+        db_connection.execute(
+            "UPDATE data_slice_materialization SET total = %s, updated_at = now() WHERE data_slice_id = %s AND run_id = %s",
+            (total, data_slice_id, run_id),
+        )
+
+        materialized = 0
+        after_record_id = None
+        while True:
+            (
+                sql,
+                params,
+            ) = search.generate_data_slice_record_associations_chunk_statement(
+                project_id,
+                filter_data,
+                data_slice_id,
+                run_id,
+                CHUNK_SIZE,
+                after_record_id,
+            )
+            chunk_size, after_record_id = search_statement.execute_all(sql, params)[0]
+            materialized += chunk_size
+            if not __update_progress(data_slice_id, run_id, materialized):
+                return
+            __send_progress(project_id, data_slice_id, materialized, total)
+            if chunk_size < CHUNK_SIZE:
+                break
+    except Exception as e:
+        __set_state(data_slice_id, run_id, FAILED, str(e))
+        raise
+
+    if __set_state(data_slice_id, run_id, FINISHED):
+        notification.send_organization_update(
+            project_id, f"data_slice_updated:{data_slice_id}"
+        )
+
+
+def get_state(project_id: str, data_slice_id: str) -> Optional[Dict[str, Any]]:
+    rows = db_connection.execute(
+        """
+        SELECT state, total, materialized, error
+        FROM data_slice_materialization
+        WHERE project_id = %s AND data_slice_id = %s
+        """,
+        (project_id, data_slice_id),
+        fetch=True,
+    )
+    if not rows:
+        return None
+    state, total, materialized, error = rows[0]
+    return {
+        "state": state,
+        "total": total,
+        "materialized": materialized,
+        "progress": __progress(materialized, total),
+        "error": error,
+    }
+
+
+def __get_filter_data(
+    project_id: str, data_slice_id: str
+) -> Optional[List[Dict[str, Any]]]:
+    rows = db_connection.execute(
+        "SELECT filter_data FROM data_slice WHERE project_id = %s AND id = %s",
+        (project_id, data_slice_id),
+        fetch=True,
+    )
+    if not rows:
+        return None
+    return rows[0][0] or []
+
+
+def __delete_associations(data_slice_id: str, run_id: str) -> None:
+    # the old associations are removed in chunks as well, the count follows by trigger.
+    # like the inserted chunks, only the current run deletes and holds off newer ones meanwhile
+    while True:
+        deleted = db_connection.execute(
+            """
+            WITH current_run AS (
+                SELECT 1
+                FROM data_slice_materialization
+                WHERE data_slice_id = %(data_slice_id)s AND run_id = %(run_id)s
+                FOR SHARE
+            )
+            DELETE FROM data_slice_record_association
+            WHERE data_slice_id = %(data_slice_id)s
+            AND EXISTS (SELECT 1 FROM current_run)
+            AND record_id IN (
+                SELECT record_id
+                FROM data_slice_record_association
+                WHERE data_slice_id = %(data_slice_id)s
+                LIMIT %(limit)s
+            )
+            RETURNING 1
+            """,
+            {"data_slice_id": data_slice_id, "run_id": run_id, "limit": CHUNK_SIZE},
+            fetch=True,
+        )
+        if len(deleted) < CHUNK_SIZE:
+            return
+
+
+def __set_state(
+    data_slice_id: str, run_id: str, state: str, error: Optional[str] = None
+) -> bool:
+    return bool(
+        db_connection.execute(
+            """
+            UPDATE data_slice_materialization
+            SET state = %s, error = %s, updated_at = now(),
+                started_at = CASE WHEN %s = %s THEN now() ELSE started_at END,
+                finished_at = CASE WHEN %s IN (%s, %s) THEN now() ELSE finished_at END
+            WHERE data_slice_id = %s AND run_id = %s
+            RETURNING 1
+            """,
+            (
+                state,
+                error,
+                state,
+                RUNNING,
+                state,
+                FINISHED,
+                FAILED,
+                data_slice_id,
+                run_id,
+            ),
+            fetch=True,
+        )
+    )
+
+
+def __update_progress(data_slice_id: str, run_id: str, materialized: int) -> bool:
+    return bool(
+        db_connection.execute(
+            """
+            UPDATE data_slice_materialization
+            SET materialized = %s, updated_at = now()
+            WHERE data_slice_id = %s AND run_id = %s
+            RETURNING 1
+            """,
+            (materialized, data_slice_id, run_id),
+            fetch=True,
+        )
+    )
+
+
+def __send_progress(
+    project_id: str, data_slice_id: str, materialized: int, total: int
+) -> None:
+    notification.send_organization_update(
+        project_id,
+        f"data_slice_progress:{data_slice_id}:{__progress(materialized, total)}",
+    )
+
+
+def __progress(materialized: int, total: Optional[int]) -> float:
+    if not total:
+        return 0.0
+    return round(min(materialized / total, 1.0) * 100, 2)
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from db.business_objects import general
+
+# can be disabled for connection poolers that don't keep server side state (e.g. pgbouncer in transaction mode)
+USE_PREPARED_STATEMENTS = os.getenv("SEARCH_PREPARED_STATEMENTS", "1") != "0"
+# prepared statements are kept per database connection, above this they are deallocated
+MAX_PREPARED_PER_CONNECTION = int(os.getenv("SEARCH_MAX_PREPARED_STATEMENTS", 200))
+MAX_CACHED_SHAPES = 1000
+PREPARED_INFO_KEY = "search_prepared_statements"
+
+__shapes = OrderedDict()
+__shapes_lock = threading.Lock()
+__placeholder = re.compile(r"%\((\w+)\)s")
+__rendered = re.compile(r"%\((\w+)\)s|%%")
+
+
+class QueryParams:
+    """
+    Collects the values of a search query while it is built. The query text only contains
+    placeholders, so searches with the same filter structure result in the same query shape
+    and share one prepared statement (and its plan) per connection.
+    """
+
+    def __init__(self, project_id: str) -> None:
+        self.values: Dict[str, Any] = {"project_id": project_id}
+        self.project_id = "CAST(%(project_id)s AS UUID)"
+
+    def bind(self, values: Dict[str, Any]) -> None:
+        # named values, for expressions that are built once and used in several statements
+        self.values.update(values)
+
+    def add(self, value: Any, cast: Optional[str] = None) -> str:
+        name = f"p{len(self.values)}"
+        self.values[name] = value
+        placeholder = f"%({name})s"
+        if cast:
+            return f"CAST({placeholder} AS {cast})"
+        return placeholder
+
+
+def execute(sql: str, params: QueryParams) -> None:
+    __run(sql, params, lambda result: None)
+
+
+def execute_all(sql: str, params: QueryParams) -> List[Any]:
+    return __run(sql, params, lambda result: result.all())
+
+
+def execute_count(sql: str, params: QueryParams) -> int:
+    return __run(sql, params, lambda result: result.first()[0])
+
+
+def estimate_count(sql: str, params: QueryParams) -> int:
+    """
+    Row estimate of the planner, the statement itself isn't executed.
+    """
+    return __run(
+        "EXPLAIN (FORMAT JSON) " + sql,
+        params,
+        lambda result: __read_plan_rows(result.first()[0]),
+        prepare=False,
+    )
+
+
+def explain_analyze(sql: str, params: QueryParams) -> Any:
+    """
+    Executes the statement and returns its plan with actual rows, timings and buffers.
+    """
+    return __run(
+        "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql,
+        params,
+        lambda result: __read_plan(result.first()[0]),
+        prepare=False,
+    )
+
+
+def render(sql: str, params: QueryParams) -> str:
+    """
+    Inlines the values, used for statements that are stored and executed later on.
+    Built without a connection, the result is only valid with standard_conforming_strings.
+    """
+    values = params.values
+
+    def to_literal(match: Any) -> str:
+        if match.group(0) == "%%":
+            return "%"
+        return __to_literal(__to_argument(values[match.group(1)]))
+
+    return __rendered.sub(to_literal, sql)
+
+
+def __run(
+    sql: str,
+    params: QueryParams,
+    fetch: Any,
+    prepare: bool = True,
+) -> Any:
+    connection = general.get_bind().connect()
+    try:
+        with connection.begin():
+            if prepare and USE_PREPARED_STATEMENTS:
+                result = __execute_prepared(connection, sql, params)
+            else:
+                result = connection.exec_driver_sql(sql, __to_arguments(params.values))
+            return fetch(result)
+    except Exception:
+        # the prepared statements of the connection are unknown now, it's replaced by the pool
+        connection.invalidate()
+        raise
+    finally:
+        connection.close()
+
+
+def __execute_prepared(connection: Any, sql: str, params: QueryParams) -> Any:
+    statement_name, names, shape = __get_shape(sql)
+    prepared = connection.info.setdefault(PREPARED_INFO_KEY, set())
+    if statement_name not in prepared:
+        if len(prepared) >= MAX_PREPARED_PER_CONNECTION:
+            connection.exec_driver_sql("DEALLOCATE ALL")
+            prepared.clear()
+        # executed without parameters, so the text isn't formatted again
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(f"PREPARE {statement_name} AS {shape}")
+        finally:
+            cursor.close()
+        prepared.add(statement_name)
+    if not names:
+        return connection.exec_driver_sql(f"EXECUTE {statement_name}")
+    arguments = ", ".join(f"%({name})s" for name in names)
+    return connection.exec_driver_sql(
+        f"EXECUTE {statement_name} ({arguments})",
+        {name: __to_argument(params.values[name]) for name in names},
+    )
+
+
+def __read_plan_rows(plan: Any) -> int:
+    return int(__read_plan(plan)[0]["Plan"]["Plan Rows"])
+
+
+def __read_plan(plan: Any) -> Any:
+    if isinstance(plan, str):
+        return json.loads(plan)
+    return plan
+
+
+def __get_shape(sql: str) -> Tuple[str, List[str], str]:
+    with __shapes_lock:
+        if sql in __shapes:
+            __shapes.move_to_end(sql)
+            return __shapes[sql]
+
+    names = []
+
+    def to_positional(match: Any) -> str:
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    shape = __placeholder.sub(to_positional, sql).replace("%%", "%")
+    statement_name = "search_" + hashlib.sha1(shape.encode("utf-8")).hexdigest()[:24]
+    with __shapes_lock:
+        __shapes[sql] = (statement_name, names, shape)
+        while len(__shapes) > MAX_CACHED_SHAPES:
+            __shapes.popitem(last=False)
+    return statement_name, names, shape
+
+
+def __to_arguments(values: Dict[str, Any]) -> Dict[str, Any]:
+    return {name: __to_argument(value) for name, value in values.items()}
+
+
+def __to_argument(value: Any) -> Any:
+    # arrays are passed as untyped literals, so they are coerced to the parameter type.
+    # a single literal instead of one expression per element keeps large id lists cheap to parse
+    if isinstance(value, (list, tuple, set)):
+        return "{" + ",".join(__to_array_element(v) for v in value) + "}"
+    return value
+
+
+def __to_literal(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, int) or (isinstance(value, float) and math.isfinite(value)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def __to_array_element(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
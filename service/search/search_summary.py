@@ -0,0 +1,36 @@
+import uuid
+
+from util import db_connection
+
+# records summarized per transaction, the project is locked for writers meanwhile
+REFRESH_BATCH_SIZE = 5000
+
+
+def refresh_project(project_id: str) -> None:
+    """
+    Computes the label summary of all records of the project again, e.g. to backfill it.
+    Runs as job in batches, every batch commits on its own. Label writes refresh the
+    summary of their records themselves once their transaction commits.
+    """
+    project_id = str(uuid.UUID(project_id))
+    last_record_id = str(uuid.UUID(int=0))
+    while True:
+        with db_connection.transaction() as cursor:
+            cursor.execute(
+                """
+                SELECT id::TEXT
+                FROM record
+                WHERE project_id = %s AND id > %s
+                ORDER BY id
+                LIMIT %s
+                """,
+                (project_id, last_record_id, REFRESH_BATCH_SIZE),
+            )
+            record_ids = [record_id for (record_id,) in cursor.fetchall()]
+            if not record_ids:
+                return
+            cursor.execute(
+                "SELECT refresh_record_label_summary(%s::UUID, %s::UUID[])",
+                (project_id, record_ids),
+            )
+        last_record_id = record_ids[-1]
@@ -0,0 +1,71 @@
+import pytest
+
+from util.json_stream import iter_json_object_items
+
+
+def split(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_yields_items_in_order():
+    text = '{"a": 1, "b": [1, 2], "c": {"d": "e"}}'
+    assert list(iter_json_object_items([text])) == [
+        ("a", 1),
+        ("b", [1, 2]),
+        ("c", {"d": "e"}),
+    ]
+
+
+def test_empty_object():
+    assert list(iter_json_object_items([" { } "])) == []
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_chunk_borders_inside_values(size):
+    text = '{"record-1": 12345.678, "record-2": "a, b} c", "key:3": [true, null]}'
+    assert list(iter_json_object_items(split(text, size))) == [
+        ("record-1", 12345.678),
+        ("record-2", "a, b} c"),
+        ("key:3", [True, None]),
+    ]
+
+
+def test_skips_empty_chunks():
+    assert list(iter_json_object_items(["", '{"a"', "", ": 1}", ""])) == [("a", 1)]
+
+
+def test_rejects_trailing_comma():
+    with pytest.raises(ValueError):
+        list(iter_json_object_items(['{"a": 1, }']))
+
+
+def test_rejects_leading_comma():
+    with pytest.raises(ValueError):
+        list(iter_json_object_items(['{, "a": 1}']))
+
+
+def test_rejects_missing_comma():
+    with pytest.raises(ValueError):
+        list(iter_json_object_items(['{"a": 1 "b": 2}']))
+
+
+def test_rejects_missing_colon():
+    with pytest.raises(ValueError):
+        list(iter_json_object_items(['{"a" 1}']))
+
+
+def test_rejects_non_object():
+    with pytest.raises(ValueError):
+        list(iter_json_object_items(["[1, 2]"]))
+
+
+def test_rejects_truncated_stream():
+    items = iter_json_object_items(split('{"a": 1, "b": 2', 4))
+    assert next(items) == ("a", 1)
+    with pytest.raises(ValueError):
+        next(items)
+
+
+def test_rejects_empty_stream():
+    with pytest.raises(ValueError):
+        list(iter_json_object_items([]))
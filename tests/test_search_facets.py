@@ -0,0 +1,32 @@
+import pglast
+import pytest
+
+from service.search import search
+from service.search.search_statement import render
+
+PROJECT_ID = "00000000-0000-0000-0000-000000000001"
+FILTER_DATA = [
+    {
+        "RELATION": "NONE",
+        "NEGATION": False,
+        "TARGET_TABLE": "RECORD",
+        "TARGET_COLUMN": "DATA",
+        "OPERATOR": "CONTAINS",
+        "VALUES": ["text", "abc"],
+    }
+]
+
+
+@pytest.mark.parametrize("filter_data", [[], FILTER_DATA])
+def test_page_with_facets_parses(filter_data):
+    sql, params = search.generate_select_sql(
+        PROJECT_ID, filter_data, 20, 0, False, None, None, True, True
+    )
+    assert search.FACETS_COLUMN in sql
+    pglast.parse_sql(render(sql, params))
+
+
+@pytest.mark.parametrize("filter_data", [[], FILTER_DATA])
+def test_facets_without_page_parse(filter_data):
+    sql, params = search.generate_facet_sql(PROJECT_ID, filter_data)
+    pglast.parse_sql(render(sql, params))
@@ -0,0 +1,127 @@
+import pytest
+
+from service.search.search_enum import SearchOperators
+from service.search.search_helper import (
+    IN_JOIN_MIN_VALUES,
+    build_search_condition,
+    build_search_condition_value,
+    quote_literal,
+)
+from service.search.search_statement import QueryParams, render
+
+PROJECT_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def test_parameters_are_numbered():
+    params = QueryParams(PROJECT_ID)
+    assert params.add("a") == "%(p1)s"
+    assert params.add(2, "INTEGER") == "CAST(%(p2)s AS INTEGER)"
+    assert params.values == {"project_id": PROJECT_ID, "p1": "a", "p2": 2}
+
+
+def test_equal_binds_value_with_cast():
+    params = QueryParams(PROJECT_ID)
+    condition = build_search_condition_value(
+        SearchOperators.EQUAL, "x'; DROP TABLE record; --", params, "TEXT"
+    )
+    assert condition == " = CAST(%(p1)s AS TEXT)"
+    assert params.values["p1"] == "x'; DROP TABLE record; --"
+
+
+@pytest.mark.parametrize(
+    "operator, expected",
+    [
+        (SearchOperators.CONTAINS, "%50%%"),
+        (SearchOperators.BEGINS_WITH, "50%%"),
+        (SearchOperators.ENDS_WITH, "%50%"),
+    ],
+)
+def test_pattern_is_part_of_the_value(operator, expected):
+    params = QueryParams(PROJECT_ID)
+    condition = build_search_condition_value(operator, "50%", params, "FLOAT")
+    # patterns always compare text, whatever the column type
+    assert condition == " ILIKE CAST(%(p1)s AS TEXT)"
+    assert params.values["p1"] == expected
+
+
+def test_in_binds_one_array():
+    params = QueryParams(PROJECT_ID)
+    condition = build_search_condition_value(
+        SearchOperators.IN, ("a", "b"), params, "UUID"
+    )
+    assert condition == " = ANY(CAST(%(p1)s AS UUID[]))"
+    assert params.values["p1"] == ["a", "b"]
+
+
+def test_large_in_joins_unnested_array():
+    params = QueryParams(PROJECT_ID)
+    values = [str(i) for i in range(IN_JOIN_MIN_VALUES)]
+    condition = build_search_condition_value(SearchOperators.IN, values, params, "TEXT")
+    assert condition == " IN (SELECT unnest(CAST(%(p1)s AS TEXT[])))"
+    assert params.values["p1"] == values
+
+
+def test_empty_in_binds_empty_array():
+    params = QueryParams(PROJECT_ID)
+    condition = build_search_condition_value(SearchOperators.IN, [], params, "TEXT")
+    assert condition == " = ANY(CAST(%(p1)s AS TEXT[]))"
+    assert params.values["p1"] == []
+
+
+def test_record_data_condition():
+    params = QueryParams(PROJECT_ID)
+    condition = build_search_condition(
+        {
+            "TARGET_TABLE": "RECORD",
+            "TARGET_COLUMN": "DATA",
+            "OPERATOR": "IN",
+            "VALUES": ["it's", "a", "b"],
+        },
+        params,
+    )
+    # the attribute name is quoted into the text, the values are bound
+    assert condition == ("r.\"data\" ->> 'it''s'::TEXT = ANY(CAST(%(p1)s AS TEXT[]))")
+    assert params.values["p1"] == ["a", "b"]
+
+
+def test_pattern_condition_is_bound():
+    params = QueryParams(PROJECT_ID)
+    condition = build_search_condition(
+        {
+            "TARGET_TABLE": "RECORD",
+            "TARGET_COLUMN": "DATA",
+            "OPERATOR": "CONTAINS",
+            "VALUES": ["text", "abc"],
+        },
+        params,
+    )
+    # the project id is bound too, the shared indexes lead with it
+    assert PROJECT_ID not in condition
+    assert params.values["p1"] == "%abc%"
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("text", "'text'"), ("it's", "'it''s'"), ("100%", "'100%%'"), (1, "'1'")],
+)
+def test_quote_literal(value, expected):
+    assert quote_literal(value) == expected
+
+
+def test_render_inlines_values():
+    params = QueryParams(PROJECT_ID)
+    ids = params.add(["a", "b"], "UUID[]")
+    pattern = params.add("%it's%", "TEXT")
+    empty = params.add(None)
+    number = params.add(1.5)
+    sql = (
+        f"SELECT * FROM record r WHERE r.project_id = {params.project_id}"
+        f" AND r.id = ANY({ids}) AND r.data ->> 'x' ILIKE {pattern}"
+        f" AND r.data ->> '100%%' = {empty} AND r.category = {number}"
+    )
+    assert render(sql, params) == (
+        f"SELECT * FROM record r WHERE r.project_id = CAST('{PROJECT_ID}' AS UUID)"
+        """ AND r.id = ANY(CAST('{"a","b"}' AS UUID[]))"""
+        " AND r.data ->> 'x' ILIKE CAST('%it''s%' AS TEXT)"
+        " AND r.data ->> '100%' = NULL AND r.category = 1.5"
+    )
@@ -0,0 +1,125 @@
+import pytest
+
+from service.search.search_keyset import (
+    SortKey,
+    build_select,
+    build_condition,
+    decode_cursor,
+    encode_cursor,
+    parse_keys,
+    with_tiebreak,
+)
+from service.search.search_statement import QueryParams
+
+PROJECT_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def test_condition_ascending():
+    params = QueryParams(PROJECT_ID)
+    condition = build_condition([SortKey("a", "ASC")], [5], params)
+    assert condition == "((a > %(p1)s))"
+    assert params.values["p1"] == 5
+
+
+def test_condition_descending_includes_nulls():
+    params = QueryParams(PROJECT_ID)
+    condition = build_condition([SortKey("a", "DESC")], [5], params)
+    assert condition == "(((a < %(p1)s OR a IS NULL)))"
+
+
+def test_condition_multiple_keys():
+    params = QueryParams(PROJECT_ID)
+    condition = build_condition(
+        [SortKey("a", "DESC"), SortKey("r.id", "DESC")], ["x", "id-1"], params
+    )
+    assert condition == (
+        "(((a < %(p1)s OR a IS NULL))"
+        " OR (a = %(p1)s AND (r.id < %(p2)s OR r.id IS NULL)))"
+    )
+    assert params.values["p1"] == "x"
+    assert params.values["p2"] == "id-1"
+
+
+def test_condition_null_ascending():
+    params = QueryParams(PROJECT_ID)
+    condition = build_condition(
+        [SortKey("a", "ASC"), SortKey("r.id", "ASC")], [None, "id-1"], params
+    )
+    assert condition == "((a IS NOT NULL) OR (a IS NULL AND r.id > %(p1)s))"
+    assert list(params.values) == ["project_id", "p1"]
+
+
+def test_condition_null_descending():
+    # nulls are last for descending keys, only the tiebreak can continue
+    params = QueryParams(PROJECT_ID)
+    condition = build_condition(
+        [SortKey("a", "DESC"), SortKey("r.id", "DESC")], [None, "id-1"], params
+    )
+    assert condition == "((a IS NULL AND (r.id < %(p1)s OR r.id IS NULL)))"
+
+
+def test_condition_without_alternatives():
+    params = QueryParams(PROJECT_ID)
+    assert build_condition([SortKey("a", "DESC")], [None], params) == "FALSE"
+    assert build_condition([], [], params) == "FALSE"
+
+
+def test_tiebreak_follows_last_direction():
+    assert with_tiebreak([]) == [SortKey("r.id", "ASC")]
+    assert with_tiebreak([SortKey("a", "DESC")]) == [
+        SortKey("a", "DESC"),
+        SortKey("r.id", "DESC"),
+    ]
+    keys = [SortKey("r.id", "ASC")]
+    assert with_tiebreak(keys) == keys
+
+
+def test_cursor_round_trip():
+    keys = [SortKey("a", "ASC"), SortKey("r.id", "ASC")]
+    values = [None, "id-1"]
+    assert decode_cursor(encode_cursor(keys, values), keys) == values
+
+
+def test_cursor_of_other_order():
+    cursor = encode_cursor([SortKey("a", "ASC")], [1])
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, [SortKey("a", "DESC")])
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64", "e30="])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, [SortKey("a", "ASC")])
+
+
+def test_parse_keys():
+    sql = "SELECT r.id record_id, x keyset_0_desc, r.id keyset_1_desc FROM record r"
+    assert parse_keys(sql) == [
+        SortKey("keyset_0_desc", "DESC"),
+        SortKey("keyset_1_desc", "DESC"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT r.id record_id FROM record r ORDER BY random()",
+        "SELECT x keyset_1_asc FROM record r",
+        "SELECT x keyset_0_up FROM record r",
+    ],
+)
+def test_parse_keys_without_valid_keys(sql):
+    assert parse_keys(sql) == []
+
+
+def test_values_of_keys_are_bound():
+    params = QueryParams(PROJECT_ID)
+    keys = [SortKey("md5(r.id::TEXT || %(seed)s)", "ASC", {"seed": "abc"})]
+    assert build_select(keys, params) == ", md5(r.id::TEXT || %(seed)s) keyset_0_asc"
+    assert params.values["seed"] == "abc"
+
+
+def test_cursor_of_other_key_values():
+    cursor = encode_cursor([SortKey("a", "ASC", {"seed": "abc"})], [1])
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, [SortKey("a", "ASC", {"seed": "def"})])
@@ -0,0 +1,46 @@
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional
+
+from db.business_objects import general
+
+
+@contextmanager
+def transaction() -> Iterator[Any]:
+    """
+    Yields a cursor of an own connection, so the statements don't interfere with the
+    session of the caller. Committed if the block succeeds, rolled back otherwise.
+    """
+    connection = general.get_bind().raw_connection()
+    try:
+        cursor = connection.cursor()
+        yield cursor
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def execute(sql: str, params: Any = None, fetch: bool = False) -> Optional[List[Any]]:
+    with transaction() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall() if fetch else None
+
+
+@contextmanager
+def autocommit() -> Iterator[Any]:
+    """
+    Yields a cursor of an own connection in autocommit mode, e.g. concurrent index builds
+    can't run inside a transaction block.
+    """
+    connection = general.get_bind().raw_connection()
+    try:
+        connection.set_session(autocommit=True)
+        try:
+            yield connection.cursor()
+        finally:
+            connection.set_session(autocommit=False)
+    finally:
+        connection.close()
+
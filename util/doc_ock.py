@@ -1,10 +1,11 @@
 import inspect
 import os
-import traceback
-from typing import Dict, Union
+from typing import Any, Dict, Union
 from controller.misc import config_service
 from db import models, events
-from util import daemon, service_requests
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass, JobPriority
+from util import service_requests
 from controller.auth import kratos
 from util.user_activity import add_user_activity_entry
 
@@ -23,23 +24,26 @@ def register_user(user: models.User):
 
 def post_event(user: models.User, event: events.Event):
     caller_dict = __get_caller_data()
-    daemon.run(__post_thread, user, event, caller_dict)
-
-
-def __post_thread(
-    user: models.User, event: events.Event, caller_dict: Dict[str, Union[str, int]]
-):
-    try:
-        url = f"{os.getenv('DOC_OCK')}/track/{user.id}/{event.event_name()}"
-        event.IsManaged = config_service.get_config_value("is_managed")
-        add_user_activity_entry(
-            str(user.id),
-            {"eventName": event.event_name(), **event.__dict__},
-            caller_dict,
-        )
-        service_requests.post_call_or_raise(url, event.__dict__)
-    except Exception:
-        print(traceback.format_exc(), flush=True)
+    event.IsManaged = config_service.get_config_value("is_managed")
+    add_user_activity_entry(
+        str(user.id),
+        {"eventName": event.event_name(), **event.__dict__},
+        caller_dict,
+    )
+    job_queue.enqueue(
+        JobClass.DOC_OCK,
+        __post_event,
+        str(user.id),
+        event.event_name(),
+        event.__dict__,
+        priority=JobPriority.LOW,
+    )
+
+
+def __post_event(user_id: str, event_name: str, event_data: Dict[str, Any]):
+    # raises so the job is retried if doc ock isn't reachable
+    url = f"{os.getenv('DOC_OCK')}/track/{user_id}/{event_name}"
+    service_requests.post_call_or_raise(url, event_data)
 
 
 def __get_caller_data() -> Dict[str, Union[str, int]]:
@@ -0,0 +1,408 @@
+import codecs
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import docker
+from docker.utils.socket import frames_iter
+
+from util import daemon
+
+client = docker.from_env()
+
+# workers kept per image and project, 0 disables the pool and every run uses a cold container
+# workers never run code of another project, so user code can't see other tenants' files or processes
+POOL_SIZE = int(os.getenv("EXEC_ENV_POOL_SIZE", 2))
+# recycling policy, a worker is replaced after this many jobs or seconds
+MAX_JOBS_PER_WORKER = int(os.getenv("EXEC_ENV_POOL_MAX_JOBS", 50))
+MAX_WORKER_AGE = int(os.getenv("EXEC_ENV_POOL_MAX_AGE", 3600))
+# idle workers of projects that stopped running code are stopped after this many seconds
+MAX_IDLE_TIME = int(os.getenv("EXEC_ENV_POOL_MAX_IDLE", 600))
+# exec env containers of this gateway, warm and cold ones. runs wait for a free one,
+# idle workers of other projects are stopped to make room
+MAX_CONTAINERS = int(os.getenv("EXEC_ENV_MAX_CONTAINERS", 16))
+POOL_LABEL = "refinery-exec-env-pool"
+# files created after this marker are removed between jobs
+START_MARKER = "/tmp/.exec-env-pool-start"
+# output without line breaks is yielded in pieces of this size instead of being buffered
+MAX_PENDING_LOG_CHARS = 64 * 1024
+
+PoolKey = Tuple[str, str]
+
+__idle: Dict[PoolKey, List["ExecEnvWorker"]] = {}
+__slots: Dict[PoolKey, int] = {}
+__image_configs: Dict[str, Tuple[List[str], str]] = {}
+__lock = threading.Lock()
+__running = threading.Event()
+__containers = threading.Semaphore(MAX_CONTAINERS)
+
+# main process of a worker container. it loads the imports of the image's entrypoint
+# script once and forks a child per job that runs the script with the job's arguments.
+# jobs are read from stdin as json lines, the output of a job ends with its token and exit code
+DISPATCHER = r"""
+import ast, json, os, runpy, sys, traceback
+
+entrypoint = json.loads(sys.argv[1])
+script = None
+if (
+    len(entrypoint) > 1
+    and os.path.basename(entrypoint[0]).startswith("python")
+    and entrypoint[1].endswith(".py")
+):
+    script = os.path.abspath(entrypoint[1])
+    sys.path[0] = os.path.dirname(script)
+    try:
+        with open(script) as file:
+            tree = ast.parse(file.read())
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                for name in node.names:
+                    __import__(name.name)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                __import__(node.module)
+    except Exception:
+        # a job importing the module reports the error in its own output
+        pass
+open(sys.argv[2], "a").close()
+sys.stdout.flush()
+
+for line in sys.stdin:
+    job = json.loads(line)
+    pid = os.fork()
+    if pid == 0:
+        os.setsid()
+        os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+        os.dup2(1, 2)
+        code = 1
+        try:
+            if script:
+                sys.argv = [script] + entrypoint[2:] + job["command"]
+                runpy.run_path(script, run_name="__main__")
+                code = 0
+            else:
+                argv = entrypoint + job["command"]
+                os.execvp(argv[0], argv)
+        except SystemExit as e:
+            if e.code is None or isinstance(e.code, int):
+                code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+        except BaseException:
+            traceback.print_exc()
+        # like a script run, exit handlers and threads of the job are finished first
+        sys.exit(code)
+    _, status = os.waitpid(pid, 0)
+    code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 128 + os.WTERMSIG(status)
+    sys.stdout.write("\n%s %d\n" % (job["token"], code))
+    sys.stdout.flush()
+"""
+
+
+class ExecEnvWorker:
+    """
+    Pre-started exec env container that idles until a job is dispatched.
+    The dispatcher runs as main process of the container and executes the jobs with the
+    entrypoint of the image, so the exec env images don't need to know about the pool.
+    Jobs are sent over the attached stdin, only the docker daemon can reach it.
+    """
+
+    def __init__(self, key: PoolKey, entrypoint: List[str], workdir: str) -> None:
+        self.key = key
+        self.workdir = workdir
+        self.jobs = 0
+        self.created_at = time.time()
+        self.idle_since = self.created_at
+        # images without a python entrypoint still need an interpreter for the dispatcher
+        python = "python3"
+        if entrypoint and os.path.basename(entrypoint[0]).startswith("python"):
+            python = entrypoint[0]
+        self.container = client.containers.run(
+            image=key[0],
+            entrypoint=[python],
+            command=["-u", "-c", DISPATCHER, json.dumps(entrypoint), START_MARKER],
+            stdin_open=True,
+            remove=True,
+            detach=True,
+            network=os.getenv("LF_NETWORK"),
+            labels={POOL_LABEL: socket.gethostname()},
+        )
+        try:
+            self.socket = client.api.attach_socket(
+                self.container.id,
+                params={"stdin": 1, "stdout": 1, "stderr": 1, "stream": 1},
+            )
+            self.frames = frames_iter(self.socket, tty=False)
+        except Exception:
+            self.stop()
+            raise
+
+    def is_healthy(self) -> bool:
+        if (
+            self.jobs >= MAX_JOBS_PER_WORKER
+            or time.time() - self.created_at > MAX_WORKER_AGE
+        ):
+            return False
+        try:
+            self.container.reload()
+        except docker.errors.NotFound:
+            return False
+        return self.container.status == "running"
+
+    def is_idle_expired(self) -> bool:
+        return time.time() - self.idle_since > MAX_IDLE_TIME
+
+    def dispatch(self, command: List[str]) -> Iterator[str]:
+        """
+        Yields the log lines of the job. Afterwards exit_code holds the exit code of the job,
+        it stays None if the dispatcher stopped.
+        """
+        self.jobs += 1
+        self.exit_code = None
+        # the token marks the end of the job's output
+        token = uuid.uuid4().hex
+        self.socket._sock.sendall(
+            (json.dumps({"token": token, "command": command}) + "\n").encode("utf-8")
+        )
+        rest = ""
+        # the line break in front of the token isn't part of the output
+        held_empty_lines = 0
+        # chunks can end inside a multi byte character
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        for _, chunk in self.frames:
+            lines = (rest + decoder.decode(chunk)).split("\n")
+            rest = lines.pop()
+            for line in lines:
+                if line.startswith(token + " "):
+                    yield from [""] * (held_empty_lines - 1)
+                    self.exit_code = int(line[len(token) + 1 :])
+                    return
+                if not line:
+                    held_empty_lines += 1
+                    continue
+                yield from [""] * held_empty_lines
+                held_empty_lines = 0
+                yield line
+            while len(rest) > MAX_PENDING_LOG_CHARS:
+                yield from [""] * held_empty_lines
+                held_empty_lines = 0
+                yield rest[:MAX_PENDING_LOG_CHARS]
+                rest = rest[MAX_PENDING_LOG_CHARS:]
+        if rest:
+            yield rest
+
+    def clean_up(self) -> bool:
+        # leftover processes and files of the last job must not be visible to the next one
+        exec_id = client.api.exec_create(
+            self.container.id,
+            [
+                "sh",
+                "-c",
+                "kill -9 -1 2>/dev/null; "
+                + f"find {self.workdir} /tmp -xdev -newer {START_MARKER} ! -path {START_MARKER} -type f -delete",
+            ],
+            stdout=False,
+            stderr=False,
+        )["Id"]
+        client.api.exec_start(exec_id)
+        return client.api.exec_inspect(exec_id)["ExitCode"] == 0
+
+    def stop(self) -> None:
+        try:
+            self.container.stop(timeout=1)
+        except docker.errors.APIError:
+            pass
+        if getattr(self, "socket", None):
+            self.socket.close()
+
+
+def run(image: str, command: List[str], project_id: str) -> Iterator[str]:
+    """
+    Runs the exec env image with the given command and yields the log lines.
+    A warm worker of the project is used if one is idle, otherwise a cold container is started.
+    """
+    worker = __checkout((image, str(project_id)))
+    if not worker:
+        yield from __run_cold(image, command)
+        return
+
+    healthy = False
+    try:
+        for line in worker.dispatch(command):
+            yield __with_timestamp(line)
+        if worker.exit_code:
+            yield __with_timestamp(f"exec env exited with code {worker.exit_code}")
+        # a failed job can leave the container in any state, the worker is replaced
+        healthy = worker.exit_code == 0
+    finally:
+        __checkin(worker, healthy)
+
+
+def __run_cold(image: str, command: List[str]) -> Iterator[str]:
+    __acquire_container()
+    try:
+        # removed after its exit code is read
+        container = client.containers.run(
+            image=image,
+            command=command,
+            detach=True,
+            network=os.getenv("LF_NETWORK"),
+        )
+        try:
+            for line in container.logs(
+                stream=True, stdout=True, stderr=True, timestamps=True
+            ):
+                yield line.decode("utf-8").strip("\n")
+            exit_code = container.wait()["StatusCode"]
+        finally:
+            container.remove(force=True)
+    finally:
+        __containers.release()
+    if exit_code:
+        yield __with_timestamp(f"exec env exited with code {exit_code}")
+
+
+def warm_up(key: PoolKey) -> None:
+    if POOL_SIZE <= 0:
+        return
+    while __reserve_slot(key):
+        # warm workers don't wait for containers, runs do
+        if not __containers.acquire(blocking=False):
+            __release_slot(key)
+            return
+        try:
+            worker = ExecEnvWorker(key, *__get_image_config(key[0]))
+        except Exception:
+            __containers.release()
+            __release_slot(key)
+            print(traceback.format_exc(), flush=True)
+            return
+        with __lock:
+            __idle.setdefault(key, []).append(worker)
+
+
+def start() -> None:
+    remove_orphaned_workers()
+    __running.set()
+    daemon.run(__stop_idle_workers)
+
+
+def shutdown() -> None:
+    __running.clear()
+    with __lock:
+        workers = [worker for pool in __idle.values() for worker in pool]
+        __idle.clear()
+    for worker in workers:
+        __discard(worker)
+
+
+def remove_orphaned_workers() -> None:
+    # workers of a previous run of this gateway that wasn't shut down cleanly
+    for container in client.containers.list(
+        filters={"label": f"{POOL_LABEL}={socket.gethostname()}"}
+    ):
+        try:
+            container.stop(timeout=1)
+        except docker.errors.APIError:
+            pass
+
+
+def __checkout(key: PoolKey) -> Optional[ExecEnvWorker]:
+    if POOL_SIZE <= 0:
+        return None
+    while True:
+        with __lock:
+            pool = __idle.setdefault(key, [])
+            worker = pool.pop() if pool else None
+        if not worker:
+            # all workers busy or still starting, the caller falls back to a cold container
+            daemon.run(warm_up, key)
+            return None
+        if worker.is_healthy():
+            return worker
+        __discard(worker)
+
+
+def __checkin(worker: ExecEnvWorker, healthy: bool) -> None:
+    try:
+        healthy = healthy and worker.is_healthy() and worker.clean_up()
+    except docker.errors.APIError:
+        healthy = False
+    if healthy:
+        worker.idle_since = time.time()
+        with __lock:
+            __idle.setdefault(worker.key, []).append(worker)
+        return
+    __discard(worker)
+    daemon.run(warm_up, worker.key)
+
+
+def __discard(worker: ExecEnvWorker) -> None:
+    worker.stop()
+    __containers.release()
+    __release_slot(worker.key)
+
+
+def __acquire_container() -> None:
+    while not __containers.acquire(blocking=False):
+        # the longest idle worker makes room, busy ones finish their job first
+        with __lock:
+            idle = [worker for pool in __idle.values() for worker in pool]
+            worker = min(idle, key=lambda item: item.idle_since) if idle else None
+            if worker:
+                __idle[worker.key].remove(worker)
+        if worker:
+            __discard(worker)
+        elif __containers.acquire(timeout=1):
+            return
+
+
+def __stop_idle_workers() -> None:
+    while __running.is_set():
+        time.sleep(60)
+        with __lock:
+            expired = [
+                worker
+                for pool in __idle.values()
+                for worker in pool
+                if worker.is_idle_expired()
+            ]
+            for pool in __idle.values():
+                pool[:] = [worker for worker in pool if worker not in expired]
+        for worker in expired:
+            __discard(worker)
+
+
+def __reserve_slot(key: PoolKey) -> bool:
+    # slots count idle, busy and starting workers of an image and project
+    with __lock:
+        if __slots.get(key, 0) >= POOL_SIZE:
+            return False
+        __slots[key] = __slots.get(key, 0) + 1
+        return True
+
+
+def __release_slot(key: PoolKey) -> None:
+    with __lock:
+        __slots[key] = max(__slots.get(key, 0) - 1, 0)
+
+
+def __get_image_config(image: str) -> Tuple[List[str], str]:
+    # entrypoint to run jobs with and working directory that's cleaned between jobs
+    if image not in __image_configs:
+        config: Any = client.images.get(image).attrs["Config"]
+        entrypoint = config["Entrypoint"]
+        if isinstance(entrypoint, str):
+            entrypoint = [entrypoint]
+        __image_configs[image] = entrypoint or [], config.get("WorkingDir") or "/"
+    return __image_configs[image]
+
+
+def __with_timestamp(line: str) -> str:
+    # same format as docker log timestamps so logs look alike for warm and cold runs
+    return f"{datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')}Z {line}"
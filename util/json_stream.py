@@ -0,0 +1,119 @@
+import json
+from typing import Any, Iterator, Tuple
+
+import requests
+
+from s3 import controller as s3
+
+READ_CHUNK_SIZE = 1024 * 1024
+__decoder = json.JSONDecoder()
+__whitespace = " \t\n\r"
+
+
+def open_object_stream(org_id: str, object_name: str) -> Iterator[str]:
+    # presigned link so the object is read in chunks instead of being materialized by s3.get_object
+    response = requests.get(s3.create_access_link(org_id, object_name), stream=True)
+    if response.status_code != 200:
+        response.close()
+        raise FileNotFoundError(f"Can't read {object_name} from s3")
+    response.encoding = "utf-8"
+    return response.iter_content(chunk_size=READ_CHUNK_SIZE, decode_unicode=True)
+
+
+def iter_object_items(org_id: str, object_name: str) -> Iterator[Tuple[str, Any]]:
+    return iter_json_object_items(open_object_stream(org_id, object_name))
+
+
+def iter_json_object_items(text_chunks: Iterator[str]) -> Iterator[Tuple[str, Any]]:
+    """
+    Incrementally decodes a top level json object and yields its (key, value) pairs.
+    Only the currently decoded entry and the unparsed rest of the last read chunk are held in memory.
+    """
+    text_chunks = iter(text_chunks)
+    buffer = ""
+    pos = 0
+    expect_key = True
+    first_entry = True
+    after_comma = False
+    started = False
+
+    def read_more() -> bool:
+        nonlocal buffer, pos
+        for text in text_chunks:
+            if text:
+                buffer = buffer[pos:] + text
+                pos = 0
+                return True
+        return False
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in __whitespace:
+            pos += 1
+        if pos >= len(buffer):
+            if not read_more():
+                raise ValueError("Unexpected end of json stream")
+            continue
+
+        if not started:
+            if buffer[pos] != "{":
+                raise ValueError("Json stream doesn't contain an object")
+            started = True
+            pos += 1
+            continue
+
+        if expect_key:
+            if buffer[pos] == "}":
+                if after_comma:
+                    raise ValueError(
+                        f"Trailing ',' before position {pos} of json stream"
+                    )
+                return
+            if not first_entry:
+                if buffer[pos] != ",":
+                    raise ValueError(f"Expected ',' at position {pos} of json stream")
+                pos += 1
+                first_entry = True
+                after_comma = True
+                continue
+            key, next_pos = __decode_complete(buffer, pos, ":")
+            if next_pos is None:
+                if not read_more():
+                    raise ValueError("Unexpected end of json stream")
+                continue
+            colon_pos = next_pos
+            while colon_pos < len(buffer) and buffer[colon_pos] in __whitespace:
+                colon_pos += 1
+            if colon_pos >= len(buffer):
+                if not read_more():
+                    raise ValueError("Unexpected end of json stream")
+                continue
+            if buffer[colon_pos] != ":":
+                raise ValueError(f"Expected ':' at position {colon_pos} of json stream")
+            pos = colon_pos + 1
+            expect_key = False
+            after_comma = False
+        else:
+            value, next_pos = __decode_complete(buffer, pos, ",}")
+            if next_pos is None:
+                if not read_more():
+                    raise ValueError("Unexpected end of json stream")
+                continue
+            pos = next_pos
+            expect_key = True
+            first_entry = False
+            yield key, value
+
+
+def __decode_complete(buffer: str, pos: int, delimiters: str) -> Tuple[Any, int]:
+    # a value is only accepted if the next delimiter is already in the buffer
+    # otherwise e.g. a number could be cut in half at the chunk border
+    try:
+        value, end = __decoder.raw_decode(buffer, pos)
+    except json.JSONDecodeError:
+        return None, None
+    follow = end
+    while follow < len(buffer) and buffer[follow] in __whitespace:
+        follow += 1
+    if follow >= len(buffer) or buffer[follow] not in delimiters:
+        return None, None
+    return value, end
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from queue import Empty, Queue
+from typing import Callable, Iterable, List, Optional
+
+from util import daemon, notification
+
+# ring buffer cap, the oldest lines are dropped once a container logged more
+MAX_LINES = int(os.getenv("EXEC_ENV_LOG_MAX_LINES", 5000))
+MAX_LINE_LENGTH = 2000
+PERSIST_INTERVAL = 5
+NOTIFY_INTERVAL = 2
+
+
+class LogStream:
+    """
+    Collects the log lines of a running container with bounded memory. The lines are
+    handed to persist every PERSIST_INTERVAL seconds and a notification with the
+    number of logged lines is sent at most every NOTIFY_INTERVAL seconds so the
+    frontend can fetch the tail while the container is still running.
+    add can be called from several threads, flush only from the one owning the session.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        notification_message: Optional[str] = None,
+        persist: Optional[Callable[[List[str]], None]] = None,
+        max_lines: int = MAX_LINES,
+    ) -> None:
+        self.project_id = project_id
+        self.notification_message = notification_message
+        self.persist = persist
+        self.line_count = 0
+        self.__lines = deque(maxlen=max_lines)
+        self.__lock = threading.Lock()
+        self.__changed = False
+        self.__last_persist = time.time()
+        self.__last_notify = 0.0
+        self.__notified_count = 0
+
+    def add(self, line: str) -> None:
+        if len(line) > MAX_LINE_LENGTH:
+            line = line[:MAX_LINE_LENGTH] + " [truncated]"
+        with self.__lock:
+            self.__lines.append(line)
+            self.line_count += 1
+            self.__changed = True
+
+    def consume(self, lines: Iterable[str]) -> List[str]:
+        # lines are read in another thread so the tail is flushed even while a container is silent
+        queue = Queue(maxsize=MAX_LINES)
+        done = object()
+        errors = []
+
+        def read() -> None:
+            try:
+                for line in lines:
+                    queue.put(line)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                queue.put(done)
+
+        daemon.run(read)
+        while True:
+            try:
+                line = queue.get(timeout=NOTIFY_INTERVAL)
+            except Empty:
+                self.flush()
+                continue
+            if line is done:
+                break
+            self.add(line)
+            self.flush()
+        self.flush(force=True)
+        if errors:
+            raise errors[0]
+        return self.get_lines()
+
+    def flush(self, force: bool = False) -> None:
+        now = time.time()
+        if not self.__changed:
+            return
+        if self.persist and (force or now - self.__last_persist >= PERSIST_INTERVAL):
+            self.__last_persist = now
+            self.__changed = False
+            try:
+                self.persist(self.get_lines())
+            except Exception:
+                # the logs are persisted again with the next flush, the run itself goes on
+                print(traceback.format_exc(), flush=True)
+        if (
+            self.notification_message
+            and self.line_count != self.__notified_count
+            and (force or now - self.__last_notify >= NOTIFY_INTERVAL)
+        ):
+            self.__last_notify = now
+            self.__notified_count = self.line_count
+            notification.send_organization_update(
+                self.project_id, f"{self.notification_message}:{self.line_count}"
+            )
+
+    def get_lines(self) -> List[str]:
+        with self.__lock:
+            lines = list(self.__lines)
+            dropped = self.line_count - len(lines)
+        if dropped > 0:
+            lines.insert(0, f"[{dropped} earlier log lines were dropped]")
+        return lines
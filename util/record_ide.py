@@ -1,7 +1,7 @@
 import os
 from typing import Any, List
 
-from controller.knowledge_base import util as knowledge_base
+from controller.knowledge_base import artifact_cache
 import docker
 from controller.tokenization import manager as tokenization_manager
 import pickle
@@ -13,6 +13,7 @@ import time
 import uuid
 
 from util import daemon
+from util.log_stream import LogStream
 
 client = docker.from_env()
 
@@ -71,12 +72,14 @@ def run_record_ide(
         daemon.run(cancel_container, container_name, container)
         __containers_running[container_name] = True
         container.start()
-        logs_arr = [
+        # the logs are only returned by the query, so there is nothing to notify about
+        log_stream = LogStream(project_id)
+        logs_arr = log_stream.consume(
             line.decode("utf-8").strip("\n")
             for line in container.logs(
                 stream=True, stdout=True, stderr=True, timestamps=False
             )
-        ]
+        )
         logs = "\n".join(logs_arr)
         if logs_arr:
             last_log = logs_arr[-1]
@@ -137,7 +140,7 @@ def pack_record_data(project_id: str, record_id: str) -> str:
 
 
 def pack_knowledge_base(project_id: str) -> str:
-    knowledge_base_source = knowledge_base.build_knowledge_base_from_project(project_id)
+    knowledge_base_source = artifact_cache.get_source(project_id)
     knowledge_base_path = f"{project_id}knowledge_base.p"
     with open(knowledge_base_path, "wb") as file:
         pickle.dump(knowledge_base_source, file)
@@ -1,14 +1,24 @@
+import json
+import os
+import threading
 import time
 from typing import Dict, Union, Any, List
 from graphql_api.types import UserActivityWrapper
 from db.business_objects import user_activity
+from service.job_queue import job_queue
+from service.job_queue.job_queue_enum import JobClass, JobPriority
 from util import daemon
-import os
 from datetime import datetime
-import json
 
+# entries are appended to a local file right away and written in batches to prevent a write per request
 BACKUP_FILE_PATH = "user_activity_backup.tmp"
-__thread_running = False
+# the file a flush works on, entries added meanwhile go to a new backup file
+FLUSHING_FILE_PATH = BACKUP_FILE_PATH + ".flushing"
+FLUSH_INTERVAL = 300
+
+__flush_scheduled = False
+__lock = threading.Lock()
+__flush_lock = threading.Lock()
 
 
 def add_user_activity_entry(
@@ -19,33 +29,64 @@ def add_user_activity_entry(
     else:
         activity.update(caller_dict)
 
-    global __thread_running
-    if not __thread_running:
-        __thread_running = True
-        daemon.run(__start_thread_db_write)
-
-    activity_set = [user_id, activity, datetime.now(), False]
-    __write_backup_file(activity_set)
-
-
-def __write_backup_file(content: Any) -> None:
-    file = open(BACKUP_FILE_PATH, "a+")
-    to_write = [content[0], content[1], "%s" % (content[2]), True]
-    to_write = json.dumps(to_write)
-    file.write(to_write + "\n")
-    file.close()
+    global __flush_scheduled
+    entry = json.dumps([user_id, activity, datetime.now().isoformat()])
+    with __lock:
+        with open(BACKUP_FILE_PATH, "a+") as file:
+            file.write(entry + "\n")
+        schedule_flush = not __flush_scheduled
+        __flush_scheduled = True
+    if schedule_flush:
+        daemon.run(__flush_later)
+
+
+def flush() -> None:
+    # a batch is persisted as one job so any replica can write it. the file is only
+    # removed once the job exists, so entries of a process that died are sent by the next flush
+    global __flush_scheduled
+    with __flush_lock:
+        with __lock:
+            __flush_scheduled = False
+        if os.path.exists(FLUSHING_FILE_PATH):
+            __send_entries(FLUSHING_FILE_PATH)
+        with __lock:
+            if not os.path.exists(BACKUP_FILE_PATH):
+                return
+            os.replace(BACKUP_FILE_PATH, FLUSHING_FILE_PATH)
+        __send_entries(FLUSHING_FILE_PATH)
+
+
+def __flush_later() -> None:
+    time.sleep(FLUSH_INTERVAL)
+    flush()
+
+
+def __send_entries(file_path: str) -> None:
+    entries = []
+    with open(file_path, "r") as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # the last line of a process that died while writing it
+                continue
+    if entries:
+        job_queue.enqueue(
+            JobClass.USER_ACTIVITY,
+            __write_user_activity_entries,
+            entries,
+            priority=JobPriority.LOW,
+        )
+    os.remove(file_path)
 
 
-def __read_backup_file() -> List[Any]:
-    if not os.path.exists(BACKUP_FILE_PATH):
-        return None
-    file = open(BACKUP_FILE_PATH, "r")
-    content = file.read()
-    content = content.split("\n")
-    content = [json.loads(entry) for entry in content if len(entry) > 0]
-    for c in content:
-        c[2] = datetime.strptime(c[2], "%Y-%m-%d %H:%M:%S.%f")
-    return content
+def __write_user_activity_entries(entries: List[List[Any]]) -> None:
+    user_activity.write_user_activity_safe(
+        [
+            [user_id, activity, datetime.fromisoformat(created_at), False]
+            for user_id, activity, created_at in entries
+        ]
+    )
 
 
 def resolve_all_users_activity() -> List[UserActivityWrapper]:
@@ -63,21 +104,3 @@ def resolve_all_users_activity() -> List[UserActivityWrapper]:
     ]
 
     return return_values
-
-
-def __start_thread_db_write() -> None:
-    time.sleep(300)  # only write every 5 min to db to prevent overuse
-
-    if not os.path.exists(BACKUP_FILE_PATH):
-        # for multi container environment
-        return
-    entries_to_add = __read_backup_file()
-    if entries_to_add is None:
-        return
-
-    user_activity.write_user_activity_safe(entries_to_add)
-    # further cleanup
-    if os.path.exists(BACKUP_FILE_PATH):
-        os.remove(BACKUP_FILE_PATH)
-    global __thread_running
-    __thread_running = False